@@ -2,5 +2,7 @@
 from .recommend import router as recommend_router
 from .user import router as user_router
 from .chat import router as chat_router
+from .foods import router as foods_router
+from .admin import router as admin_router
 
-__all__ = ["recommend_router", "user_router", "chat_router"]
+__all__ = ["recommend_router", "user_router", "chat_router", "foods_router", "admin_router"]
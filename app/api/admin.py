@@ -0,0 +1,67 @@
+"""Admin-only profiling API routes."""
+import time
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+from app.config import get_settings
+from app.profiling import SamplingProfiler, check_admin_token, get_profiler
+
+router = APIRouter(prefix="/api/admin", tags=["admin"])
+
+
+async def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """校验分析功能已启用且管理员令牌有效."""
+    if not get_settings().profiling_enabled:
+        raise HTTPException(status_code=404, detail="性能分析未启用")
+    if not check_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="管理员令牌无效")
+
+
+@router.get("/profile", dependencies=[Depends(require_admin)])
+async def profile_status(profiler: SamplingProfiler = Depends(get_profiler)):
+    """获取采样分析器状态."""
+    return profiler.status()
+
+
+@router.post("/profile/start", dependencies=[Depends(require_admin)])
+async def start_profile(
+    seconds: float = Query(30.0, gt=0, description="采样时长 (秒)，到时自动停止"),
+    include_idle: bool = Query(False, description="是否保留空闲等待中的线程栈"),
+    profiler: SamplingProfiler = Depends(get_profiler)
+):
+    """
+    开始采样.
+    
+    上一次采样的结果会被清除; 结果通过 /api/admin/profile/collapsed 下载。
+    """
+    max_seconds = get_settings().profiling_max_seconds
+    if seconds > max_seconds:
+        raise HTTPException(status_code=400, detail=f"采样时长不能超过{max_seconds}秒")
+    try:
+        profiler.start(seconds, include_idle)
+    except RuntimeError:
+        raise HTTPException(status_code=409, detail="采样已在进行中")
+    return profiler.status()
+
+
+@router.post("/profile/stop", dependencies=[Depends(require_admin)])
+async def stop_profile(profiler: SamplingProfiler = Depends(get_profiler)):
+    """提前停止采样."""
+    profiler.stop()
+    return profiler.status()
+
+
+@router.get("/profile/collapsed", dependencies=[Depends(require_admin)])
+async def download_profile(profiler: SamplingProfiler = Depends(get_profiler)):
+    """
+    下载折叠栈格式的采样结果.
+    
+    可直接交给 flamegraph.pl、speedscope 或 inferno 生成火焰图; 采样进行中时返回当前快照。
+    """
+    if not profiler.samples:
+        raise HTTPException(status_code=404, detail="没有采样结果")
+    started = time.strftime("%Y%m%d-%H%M%S", time.localtime(profiler.started_at))
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{started}.collapsed"'}
+    )
@@ -1,8 +1,8 @@
 """Chat API routes for AI conversation."""
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-from app.services import get_deepseek_service
+from app.services import DeepSeekService, get_deepseek_service
 
 router = APIRouter(prefix="/api/chat", tags=["chat"])
 
@@ -19,14 +19,16 @@ class ChatResponse(BaseModel):
 
 
 @router.post("", response_model=ChatResponse)
-async def chat_with_ai(chat: ChatMessage):
+async def chat_with_ai(
+    chat: ChatMessage,
+    service: DeepSeekService = Depends(get_deepseek_service)
+):
     """
     与AI营养师对话.
     
     可以询问关于饮食、营养、健康的任何问题。
     """
     try:
-        service = get_deepseek_service()
         response = await service.chat(
             user_message=chat.message,
             conversation_history=chat.conversation_history
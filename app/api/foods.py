@@ -0,0 +1,175 @@
+"""Food listing and lookup API routes."""
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Set
+from app.config import get_settings
+from app.models import FoodItem
+from app.database import VectorDatabase, get_vector_db
+from app.responses import (
+    IMMUTABLE_CACHE_CONTROL, FastJSONResponse, etag_matches, field_selector, project
+)
+from app.services import RAGService, get_rag_service
+
+router = APIRouter(prefix="/api/foods", tags=["foods"])
+
+
+class FoodLookupRequest(BaseModel):
+    """批量ID查询请求."""
+    ids: List[str] = Field(..., min_length=1, max_length=500, description="食物ID列表")
+
+
+class FoodSearchRequest(BaseModel):
+    """批量搜索请求."""
+    queries: List[str] = Field(..., min_length=1, max_length=20, description="查询列表，例如每个餐次一条")
+    n_results: int = Field(10, ge=1, le=50, description="每条查询返回的数量")
+
+
+class FoodSearchResponse(BaseModel):
+    """批量搜索响应."""
+    results: List[List[FoodItem]] = Field(..., description="与查询顺序一致的结果")
+
+
+class FoodListResponse(BaseModel):
+    """食物列表响应."""
+    version: str = Field(..., description="菜单版本")
+    total: int = Field(..., description="符合条件的食物总数 (搜索时为检索到的数量)")
+    items: List[FoodItem] = Field(..., description="当前页的食物")
+
+
+class MenuVersionResponse(BaseModel):
+    """菜单版本响应."""
+    version: str = Field(..., description="菜单版本，菜单内容变化时改变")
+    count: int = Field(..., description="食物数量")
+
+
+def _menu_headers(version: str, pinned: bool = False) -> Dict[str, str]:
+    """菜单派生响应的缓存头; URL带当前版本 (v=) 的响应内容不会再变，可长期缓存."""
+    max_age = get_settings().menu_cache_max_age
+    return {
+        # Weak: compressed and uncompressed bodies share the tag
+        "ETag": f'W/"menu-{version}"',
+        "Cache-Control": IMMUTABLE_CACHE_CONTROL if pinned else f"public, max-age={max_age}",
+        "X-Menu-Version": version,
+    }
+
+
+@router.get("/version", response_model=MenuVersionResponse)
+async def get_menu_version(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    vector_db: VectorDatabase = Depends(get_vector_db)
+):
+    """
+    获取菜单版本.
+    
+    客户端据此判断缓存的菜单是否过期，并用 v= 参数请求可长期缓存的列表。
+    """
+    try:
+        version = vector_db.menu_version()
+        count = vector_db.count()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取菜单版本失败: {str(e)}")
+    
+    headers = {**_menu_headers(version), "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return MenuVersionResponse(version=version, count=count)
+
+
+@router.get("", response_model=FoodListResponse)
+async def list_foods(
+    response: Response,
+    q: Optional[str] = Query(None, description="语义搜索内容，不填时按ID顺序列出"),
+    canteen: Optional[str] = Query(None, description="食堂"),
+    category: Optional[str] = Query(None, description="类别"),
+    meal: Optional[str] = Query(None, description="供应时段 (早餐/午餐/晚餐)"),
+    limit: int = Query(50, ge=1, le=500),
+    offset: int = Query(0, ge=0),
+    v: Optional[str] = Query(None, description="菜单版本，与当前版本一致时响应可长期缓存"),
+    fields: Optional[Set[str]] = Depends(field_selector(FoodItem)),
+    if_none_match: Optional[str] = Header(None),
+    vector_db: VectorDatabase = Depends(get_vector_db)
+):
+    """
+    列出或搜索食物.
+    
+    响应带菜单版本的ETag，菜单未变化时条件请求返回304; 指定 fields 时只返回这些字段。
+    """
+    try:
+        version = vector_db.menu_version()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取菜单版本失败: {str(e)}")
+    
+    headers = _menu_headers(version, pinned=v == version)
+    if etag_matches(if_none_match, headers["ETag"]):
+        # Nothing is queried or serialized for an unchanged menu
+        return Response(status_code=304, headers=headers)
+    
+    try:
+        filtered = canteen is not None or category is not None or meal is not None
+        if q:
+            # Filters apply after ranking, so rank the whole menu when filtering
+            foods = vector_db.search_foods(
+                q, n_results=max(vector_db.count(), 1) if filtered else offset + limit
+            )
+        else:
+            foods = sorted(vector_db.get_all_foods(), key=lambda food: food.id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取食物列表失败: {str(e)}")
+    
+    foods = [
+        food for food in foods
+        if (canteen is None or food.canteen == canteen)
+        and (category is None or food.category == category)
+        and (meal is None or meal in food.available_meals)
+    ]
+    page = foods[offset:offset + limit]
+    if fields:
+        return FastJSONResponse(
+            {"version": version, "total": len(foods), "items": project(page, fields)},
+            headers=headers
+        )
+    response.headers.update(headers)
+    return FoodListResponse(version=version, total=len(foods), items=page)
+
+
+@router.post("/lookup", response_model=List[FoodItem])
+async def lookup_foods(
+    request: FoodLookupRequest,
+    fields: Optional[Set[str]] = Depends(field_selector(FoodItem)),
+    vector_db: VectorDatabase = Depends(get_vector_db)
+):
+    """
+    根据ID批量获取食物.
+    
+    按请求顺序返回，不存在的ID会被跳过; 指定 fields 时只返回这些字段。
+    """
+    try:
+        foods = vector_db.get_foods_by_ids(request.ids)
+        if fields:
+            return FastJSONResponse(project(foods, fields))
+        return foods
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取食物失败: {str(e)}")
+
+
+@router.post("/search", response_model=FoodSearchResponse)
+async def search_foods(
+    request: FoodSearchRequest,
+    fields: Optional[Set[str]] = Depends(field_selector(FoodItem)),
+    rag_service: RAGService = Depends(get_rag_service)
+):
+    """
+    批量搜索食物.
+    
+    多个餐次的查询在一次向量检索中完成，并与关键词检索结果融合。
+    指定 fields 时每个食物只返回这些字段。
+    """
+    try:
+        results = rag_service.search_foods_many(request.queries, request.n_results)
+        if fields:
+            return FastJSONResponse({"results": [project(foods, fields) for foods in results]})
+        return FoodSearchResponse(results=results)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"搜索食物失败: {str(e)}")
@@ -1,26 +1,66 @@
 """Recommendation API routes."""
-from fastapi import APIRouter, HTTPException
-from app.models import RecommendationRequest, FoodRecommendation
-from app.services import get_recommendation_service
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from app.models import (
+    RecommendationRequest, FoodRecommendation, DailyPlanRequest, DailyMealPlan,
+    BatchRecommendationRequest
+)
+from app.services import RecommendationService, get_recommendation_service
 
 router = APIRouter(prefix="/api/recommend", tags=["recommendations"])
 
 
 @router.post("", response_model=FoodRecommendation)
-async def get_recommendation(request: RecommendationRequest):
+async def get_recommendation(
+    request: RecommendationRequest,
+    service: RecommendationService = Depends(get_recommendation_service)
+):
     """
     获取食物推荐.
     
     根据用户的偏好设置、健康目标和餐次，返回个性化的食物推荐。
     """
     try:
-        service = get_recommendation_service()
         recommendation = await service.get_recommendation(request)
         return recommendation
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"推荐生成失败: {str(e)}")
 
 
+@router.post("/day", response_model=DailyMealPlan)
+async def get_daily_plan(
+    request: DailyPlanRequest,
+    service: RecommendationService = Depends(get_recommendation_service)
+):
+    """
+    获取全天餐食计划.
+    
+    一次请求完成早餐、午餐、晚餐的推荐，按每日目标卡路里分配各餐次。
+    """
+    try:
+        plan = await service.get_daily_plan(request)
+        return plan
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"餐食计划生成失败: {str(e)}")
+
+
+@router.post("/batch")
+async def get_recommendations_batch(
+    request: BatchRecommendationRequest,
+    service: RecommendationService = Depends(get_recommendation_service)
+):
+    """
+    批量获取多个用户的推荐.
+    
+    以NDJSON流式返回，每行一个用户的结果，按完成顺序输出。
+    """
+    async def stream():
+        async for result in service.get_recommendations_batch(request):
+            yield result.model_dump_json() + "\n"
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 @router.get("/health")
 async def health_check():
     """健康检查端点."""
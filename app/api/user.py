@@ -1,26 +1,26 @@
 """User management API routes."""
-from fastapi import APIRouter, HTTPException
-from typing import List
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Response
+from typing import List, Optional, Set
 from app.models import User, UserPreferences, FoodHistory
-from app.database import get_user_db
+from app.database import UserDatabase, get_user_db, HistoryBufferFullError
+from app.database.user_db import decode_history_cursor
+from app.responses import FastJSONResponse, field_selector, project
 
 router = APIRouter(prefix="/api/user", tags=["users"])
 
 
 @router.post("", response_model=User)
-async def create_user(user: User):
+async def create_user(
+    user: User,
+    user_db: UserDatabase = Depends(get_user_db)
+):
     """
     创建新用户.
     """
     try:
-        user_db = await get_user_db()
-        
-        # Check if user exists
-        existing = await user_db.get_user(user.user_id)
-        if existing:
-            raise HTTPException(status_code=400, detail="用户已存在")
-        
         created_user = await user_db.create_user(user)
+        if not created_user:
+            raise HTTPException(status_code=400, detail="用户已存在")
         return created_user
     except HTTPException:
         raise
@@ -29,12 +29,14 @@ async def create_user(user: User):
 
 
 @router.get("/{user_id}", response_model=User)
-async def get_user(user_id: str):
+async def get_user(
+    user_id: str,
+    user_db: UserDatabase = Depends(get_user_db)
+):
     """
     获取用户信息.
     """
     try:
-        user_db = await get_user_db()
         user = await user_db.get_user(user_id)
         
         if not user:
@@ -48,12 +50,15 @@ async def get_user(user_id: str):
 
 
 @router.put("/{user_id}/preferences", response_model=User)
-async def update_preferences(user_id: str, preferences: UserPreferences):
+async def update_preferences(
+    user_id: str,
+    preferences: UserPreferences,
+    user_db: UserDatabase = Depends(get_user_db)
+):
     """
     更新用户偏好设置.
     """
     try:
-        user_db = await get_user_db()
         user = await user_db.update_user_preferences(user_id, preferences)
         
         if not user:
@@ -67,26 +72,69 @@ async def update_preferences(user_id: str, preferences: UserPreferences):
 
 
 @router.post("/history", response_model=FoodHistory)
-async def add_food_history(history: FoodHistory):
+async def add_food_history(
+    history: FoodHistory,
+    user_db: UserDatabase = Depends(get_user_db)
+):
     """
     添加饮食历史记录.
     """
     try:
-        user_db = await get_user_db()
         created_history = await user_db.add_food_history(history)
         return created_history
+    except HistoryBufferFullError:
+        raise HTTPException(status_code=503, detail="历史记录写入繁忙，请稍后重试")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"添加历史记录失败: {str(e)}")
 
 
+@router.post("/history/batch")
+async def add_food_history_batch(
+    histories: List[FoodHistory] = Body(..., min_length=1, max_length=1000),
+    user_db: UserDatabase = Depends(get_user_db)
+):
+    """
+    批量添加饮食历史记录.
+    
+    用于客户端同步离线记录，所有记录在一个事务中写入; 每批最多1000条。
+    """
+    try:
+        inserted = await user_db.add_food_histories(histories)
+        return {"inserted": inserted}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"批量添加历史记录失败: {str(e)}")
+
+
 @router.get("/{user_id}/history", response_model=List[FoodHistory])
-async def get_user_history(user_id: str, limit: int = 50):
+async def get_user_history(
+    user_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 的值"),
+    fields: Optional[Set[str]] = Depends(field_selector(FoodHistory)),
+    user_db: UserDatabase = Depends(get_user_db)
+):
     """
     获取用户饮食历史.
+    
+    按时间倒序分页，还有更多记录时通过 X-Next-Cursor 响应头返回下一页游标。
+    指定 fields 时每条记录只返回这些字段。
     """
+    if cursor:
+        # Only a malformed cursor is the client's fault; other errors are 500s
+        try:
+            decode_history_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"无效的分页游标: {str(e)}")
+    
     try:
-        user_db = await get_user_db()
-        history = await user_db.get_user_history(user_id, limit)
+        history, next_cursor = await user_db.get_user_history_page(user_id, limit, cursor)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        if fields:
+            # Partial rows would fail response_model validation; serialize directly
+            return FastJSONResponse(project(history, fields), headers=headers)
+        if headers:
+            response.headers.update(headers)
         return history
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取历史记录失败: {str(e)}")
@@ -1,10 +1,13 @@
 """Database package."""
 from .vector_db import VectorDatabase, get_vector_db
 from .user_db import UserDatabase, get_user_db
+from .history_buffer import HistoryWriteBuffer, HistoryBufferFullError
 
 __all__ = [
     "VectorDatabase",
     "get_vector_db",
     "UserDatabase",
     "get_user_db",
+    "HistoryWriteBuffer",
+    "HistoryBufferFullError",
 ]
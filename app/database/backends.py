@@ -0,0 +1,144 @@
+"""Storage backends for the user database (SQLite / PostgreSQL)."""
+from typing import Any, Dict, List, Optional
+from sqlalchemy import Table, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.sql.dml import Insert
+from app.config import Settings
+
+# Dialects with INSERT ... ON CONFLICT support
+_INSERT_FACTORIES = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+
+def build_upsert(
+    dialect_name: str,
+    table: Table,
+    values: Dict[str, Any],
+    index_elements: List[str],
+    update_columns: Optional[List[str]] = None
+) -> Insert:
+    """构建服务端UPSERT语句，update_columns为空时冲突则忽略."""
+    insert_factory = _INSERT_FACTORIES.get(dialect_name)
+    if insert_factory is None:
+        raise ValueError(f"Upsert is not supported for dialect: {dialect_name}")
+    
+    stmt = insert_factory(table).values(**values)
+    if not update_columns:
+        return stmt.on_conflict_do_nothing(index_elements=index_elements)
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={column: stmt.excluded[column] for column in update_columns}
+    )
+
+
+class StorageBackend:
+    """存储后端基类，负责引擎参数和方言相关的语句."""
+    
+    dialect_name = ""
+    
+    def __init__(self, settings: Settings, url: str):
+        """Initialize backend for a database URL."""
+        self.settings = settings
+        self.url = url
+    
+    def engine_kwargs(self) -> Dict[str, Any]:
+        """创建异步引擎的参数."""
+        return {"echo": self.settings.database_echo}
+    
+    def configure_engine(self, engine: AsyncEngine) -> None:
+        """引擎创建后的额外配置 (如连接事件)."""
+    
+    def upsert(
+        self,
+        table: Table,
+        values: Dict[str, Any],
+        index_elements: List[str],
+        update_columns: Optional[List[str]] = None
+    ) -> Insert:
+        """构建UPSERT语句."""
+        return build_upsert(self.dialect_name, table, values, index_elements, update_columns)
+
+
+class SQLiteBackend(StorageBackend):
+    """SQLite后端 (aiosqlite)，production配置下启用WAL等调优."""
+    
+    dialect_name = "sqlite"
+    
+    @property
+    def production(self) -> bool:
+        return self.settings.database_profile == "production"
+    
+    def engine_kwargs(self) -> Dict[str, Any]:
+        kwargs = super().engine_kwargs()
+        # In-memory SQLite uses a static single-connection pool
+        if self.production and ":memory:" not in self.url:
+            kwargs.update(
+                pool_size=self.settings.database_pool_size,
+                max_overflow=self.settings.database_max_overflow,
+                pool_timeout=self.settings.database_pool_timeout,
+                pool_pre_ping=True,
+            )
+        return kwargs
+    
+    def configure_engine(self, engine: AsyncEngine) -> None:
+        if not self.production:
+            return
+        
+        pragmas = [
+            "PRAGMA journal_mode=WAL",
+            "PRAGMA synchronous=NORMAL",
+            f"PRAGMA busy_timeout={self.settings.sqlite_busy_timeout_ms}",
+            # Negative cache_size is in KiB rather than pages
+            f"PRAGMA cache_size=-{self.settings.sqlite_cache_size_kb}",
+            f"PRAGMA mmap_size={self.settings.sqlite_mmap_size}",
+            "PRAGMA temp_store=MEMORY",
+        ]
+        
+        def on_connect(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+        
+        event.listen(engine.sync_engine, "connect", on_connect)
+
+
+class PostgresBackend(StorageBackend):
+    """PostgreSQL后端 (asyncpg)，多进程/多主机共享同一数据库."""
+    
+    dialect_name = "postgresql"
+    
+    def engine_kwargs(self) -> Dict[str, Any]:
+        kwargs = super().engine_kwargs()
+        kwargs.update(
+            pool_size=self.settings.database_pool_size,
+            max_overflow=self.settings.database_max_overflow,
+            pool_timeout=self.settings.database_pool_timeout,
+            pool_recycle=self.settings.database_pool_recycle,
+            pool_pre_ping=True,
+            connect_args={
+                # asyncpg prepares each statement once per connection and reuses it
+                "prepared_statement_cache_size": self.settings.postgres_statement_cache_size,
+                "server_settings": {"application_name": self.settings.app_name},
+            },
+        )
+        return kwargs
+
+
+_BACKENDS = {
+    "sqlite": SQLiteBackend,
+    "postgresql": PostgresBackend,
+}
+
+
+def get_backend(settings: Settings, url: str) -> StorageBackend:
+    """根据数据库URL选择存储后端."""
+    backend_name = make_url(url).get_backend_name()
+    backend_class = _BACKENDS.get(backend_name)
+    if backend_class is None:
+        raise ValueError(f"Unsupported database backend: {backend_name}")
+    return backend_class(settings, url)
@@ -0,0 +1,108 @@
+"""Write-behind buffer for food history inserts."""
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+from app.models import FoodHistory
+
+# Queue sentinel telling the flusher to write what it has and exit
+_STOP = object()
+
+
+class HistoryBufferFullError(Exception):
+    """写缓冲已满，在超时时间内无法入队."""
+
+
+class HistoryWriteBuffer:
+    """饮食历史写缓冲，后台按批量大小或时间间隔合并写入."""
+    
+    def __init__(
+        self,
+        write_batch: Callable[[List[FoodHistory]], Awaitable[None]],
+        max_batch_size: int = 200,
+        flush_interval: float = 0.2,
+        max_queue_size: int = 10000,
+        enqueue_timeout: float = 1.0
+    ):
+        """Initialize buffer; ``write_batch`` persists one batch in one transaction."""
+        self._write_batch = write_batch
+        self.max_batch_size = max_batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue_size)
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+    
+    def start(self) -> None:
+        """启动后台刷新任务."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+    
+    async def put(self, history: FoodHistory) -> None:
+        """入队一条记录，队列满时等待，超时则抛出 HistoryBufferFullError."""
+        if self._closing:
+            raise HistoryBufferFullError("写缓冲已关闭")
+        try:
+            await asyncio.wait_for(self._queue.put(history), timeout=self.enqueue_timeout)
+        except asyncio.TimeoutError:
+            raise HistoryBufferFullError("写缓冲已满")
+    
+    def pending(self) -> int:
+        """等待写入的记录数."""
+        return self._queue.qsize()
+    
+    async def _run(self) -> None:
+        """收集批次并写入，直到收到停止信号."""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self._queue.get()
+            if item is _STOP:
+                return
+            
+            batch = [item]
+            stop = False
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            
+            await self._flush(batch)
+            if stop:
+                return
+    
+    async def _flush(self, batch: List[FoodHistory], retries: int = 3) -> None:
+        """写入一个批次，失败时重试."""
+        for attempt in range(retries):
+            try:
+                await self._write_batch(batch)
+                return
+            except Exception as e:
+                if attempt == retries - 1:
+                    print(f"❌ Dropped {len(batch)} history records: {e}")
+                    return
+                await asyncio.sleep(0.1 * 2 ** attempt)
+    
+    async def close(self) -> None:
+        """停止接收新记录并写完队列中剩余的记录."""
+        self._closing = True
+        if self._task is not None:
+            # The sentinel queues behind everything already buffered
+            await self._queue.put(_STOP)
+            await self._task
+            self._task = None
+        
+        # Anything left over (e.g. the flusher was never started) is written inline
+        remaining = []
+        while not self._queue.empty():
+            item = self._queue.get_nowait()
+            if item is not _STOP:
+                remaining.append(item)
+        for i in range(0, len(remaining), self.max_batch_size):
+            await self._flush(remaining[i:i + self.max_batch_size])
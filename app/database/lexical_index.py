@@ -0,0 +1,146 @@
+"""In-process BM25 index over food documents."""
+import math
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Set, Tuple
+
+# BM25 parameters (Robertson & Zaragoza defaults)
+_K1 = 1.5
+_B = 0.75
+
+# CJK ideograph runs and ASCII words/numbers
+_TOKEN_PATTERN = re.compile(r"[\u3400-\u9fff]+|[a-z0-9]+(?:\.[0-9]+)?")
+
+
+# A negation word and the term it negates ("不要辣", "无糖", "免葱"); the term
+# runs to the next separator, "的" or the end of the CJK run
+_NEGATED_PATTERN = re.compile(
+    r"(?:不要|不吃|不加|不含|不|无|免|忌)([\u3400-\u9fff]+?)(?=[的和与或及、]|[^\u3400-\u9fff]|$)"
+)
+
+# Prefix of tokens from a negated term: "不要辣" yields "!辣", which matches
+# foods described as "无辣" and penalizes foods containing "辣"
+_NEGATED_PREFIX = "!"
+
+
+def _cjk_ngrams(run: str) -> List[str]:
+    # Unigrams match single-character queries ("面"), bigrams keep word order ("牛肉")
+    return [*run, *(run[i:i + 2] for i in range(len(run) - 1))]
+
+
+def tokenize(text: str) -> List[str]:
+    """中文按单字和二元组切分，英文和数字按词切分; 否定的词 (不要辣) 带否定前缀."""
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if not "\u3400" <= run[0] <= "\u9fff":
+            tokens.append(run)
+            continue
+        position = 0
+        for match in _NEGATED_PATTERN.finditer(run):
+            tokens.extend(_cjk_ngrams(run[position:match.start()]))
+            tokens.extend(_NEGATED_PREFIX + token for token in _cjk_ngrams(match.group(1)))
+            position = match.end()
+        tokens.extend(_cjk_ngrams(run[position:]))
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Iterable[List[str]], k: int = 60) -> List[str]:
+    """倒数排名融合 (RRF)，返回融合后的ID顺序."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class BM25Index:
+    """支持增量更新的BM25倒排索引."""
+    
+    def __init__(self):
+        """Initialize an empty index."""
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._doc_terms: Dict[str, Counter] = {}
+        self._doc_lengths: Dict[str, int] = {}
+        self._total_length = 0
+        
+        # Whole field values (names, ingredients, tags...) for exact-match detection
+        self._phrases: Counter = Counter()
+        self._doc_phrases: Dict[str, Set[str]] = {}
+    
+    def __len__(self) -> int:
+        return len(self._doc_lengths)
+    
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._doc_lengths
+    
+    def add(self, doc_id: str, text: str, phrases: Iterable[str] = ()) -> None:
+        """添加或替换一个文档."""
+        if doc_id in self._doc_lengths:
+            self.remove(doc_id)
+        
+        terms = Counter(tokenize(text))
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[doc_id] = count
+        self._doc_terms[doc_id] = terms
+        length = sum(terms.values())
+        self._doc_lengths[doc_id] = length
+        self._total_length += length
+        
+        doc_phrases = {phrase.strip().lower() for phrase in phrases if phrase.strip()}
+        self._phrases.update(doc_phrases)
+        self._doc_phrases[doc_id] = doc_phrases
+    
+    def remove(self, doc_id: str) -> None:
+        """删除一个文档."""
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            postings = self._postings[term]
+            del postings[doc_id]
+            if not postings:
+                del self._postings[term]
+        self._total_length -= self._doc_lengths.pop(doc_id)
+        
+        self._phrases.subtract(self._doc_phrases.pop(doc_id))
+        self._phrases += Counter()  # Drop phrases whose count reached zero
+    
+    def clear(self) -> None:
+        """清空索引."""
+        self.__init__()
+    
+    def is_exact_query(self, query: str) -> bool:
+        """查询的每个词都是已知的字段值 (菜名、食材、标签等) 时视为精确查询."""
+        parts = query.lower().split()
+        return bool(parts) and all(part in self._phrases for part in parts)
+    
+    def search(self, query: str, n_results: int = 10) -> List[Tuple[str, float]]:
+        """返回BM25得分最高的 (doc_id, score)."""
+        n_docs = len(self._doc_lengths)
+        if not n_docs:
+            return []
+        avg_length = self._total_length / n_docs
+        
+        scores: Dict[str, float] = {}
+        
+        def accumulate(term: str, weight: float) -> None:
+            postings = self._postings.get(term)
+            if not postings:
+                return
+            df = len(postings)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in postings.items():
+                norm = _K1 * (1 - _B + _B * self._doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight * idf * tf * (_K1 + 1) / (tf + norm)
+        
+        for term, query_count in Counter(tokenize(query)).items():
+            accumulate(term, query_count)
+            if term.startswith(_NEGATED_PREFIX):
+                # "不要辣": foods that contain the negated term count against the match
+                accumulate(term[len(_NEGATED_PREFIX):], -query_count)
+        
+        ranked = sorted(
+            ((doc_id, score) for doc_id, score in scores.items() if score > 0),
+            key=lambda item: item[1], reverse=True
+        )
+        return ranked[:n_results]
@@ -0,0 +1,68 @@
+"""Schema migrations for the user database."""
+from datetime import datetime
+from typing import Callable, List, Tuple
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, select, text
+from sqlalchemy.engine import Connection
+from app.database.backends import build_upsert
+
+# Kept out of the model metadata so create_all never touches it
+_migration_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+def _initial_schema(conn: Connection, metadata: MetaData) -> None:
+    """创建基础表 (已存在的表会被跳过)."""
+    metadata.create_all(conn)
+
+
+def _history_user_timestamp_index(conn: Connection, metadata: MetaData) -> None:
+    """用 (user_id, timestamp) 复合索引替换 user_id 单列索引."""
+    table = metadata.tables["food_history"]
+    for index in table.indexes:
+        if index.name == "ix_food_history_user_timestamp":
+            index.create(conn, checkfirst=True)
+    conn.execute(text("DROP INDEX IF EXISTS ix_food_history_user_id"))
+
+
+def _taste_profiles_table(conn: Connection, metadata: MetaData) -> None:
+    """创建用户口味画像表."""
+    metadata.tables["taste_profiles"].create(conn, checkfirst=True)
+
+
+# (version, description, migrate); each step must be safe to run on a
+# database that already has its changes, since version 1 builds the
+# schema from the current models. Steps use portable DDL so they run
+# on every supported backend.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection, MetaData], None]]] = [
+    (1, "initial schema", _initial_schema),
+    (2, "food_history (user_id, timestamp) index", _history_user_timestamp_index),
+    (3, "taste_profiles table", _taste_profiles_table),
+]
+
+
+def run_migrations(conn: Connection, metadata: MetaData) -> List[int]:
+    """按顺序执行未应用的迁移，返回本次应用的版本号."""
+    schema_migrations.create(conn, checkfirst=True)
+    applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+    
+    newly_applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        migrate(conn, metadata)
+        # Another worker may have applied the same step concurrently
+        conn.execute(build_upsert(
+            conn.dialect.name,
+            schema_migrations,
+            {"version": version, "description": description, "applied_at": datetime.now()},
+            index_elements=["version"]
+        ))
+        newly_applied.append(version)
+    return newly_applied
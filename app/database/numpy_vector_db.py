@@ -0,0 +1,400 @@
+"""In-process vector index on a shared, versioned, memory-mapped file.
+
+Each version of the index is one packed file (embeddings + food table)
+that every worker maps read-only, so the pages live once in the OS page
+cache however many workers there are. A writer publishes a new version
+by writing a new file and atomically replacing the ``CURRENT`` pointer;
+readers poll the pointer and remap without restarting.
+"""
+import json
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.config import get_settings
+from app.metrics import STAGE_SECONDS, timed
+from app.tracing import span
+from app.models import FoodItem
+from app.database.lexical_index import BM25Index
+from app.database.vector_db import VectorDatabase, load_embedding_model
+
+# Packed file layout (integers are little-endian uint64):
+#   header:     magic, count, dim, embeddings/offsets/blob/ids offsets, ids length,
+#               storage code, scale/quantized offsets
+#   embeddings: float32 (count, dim), 64-byte aligned
+#   offsets:    (count + 1) byte offsets of each row within the blob
+#   blob:       UTF-8 JSON rows {"document", "food"}
+#   ids:        newline-separated food IDs
+#   scale:      float32 (dim,) per-dimension scale, int8 storage only
+#   quantized:  float16 or int8 (count, dim) copy used for scanning
+_MAGIC = b"FOODIDX2"
+_HEADER = struct.Struct("<8s10Q")
+_ALIGN = 64
+
+_STORAGE_CODES = {"float32": 0, "float16": 1, "int8": 2}
+
+_CURRENT_FILE = "CURRENT"
+_VERSION_FORMAT = "index-{:06d}.bin"
+
+
+def _atomic_write(path: Path, write) -> None:
+    """写入临时文件后原子替换，读者不会看到写了一半的文件."""
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def quantize_vectors(
+    embeddings: np.ndarray, storage: str
+) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """按存储精度量化向量矩阵，返回 (量化矩阵, 每维缩放系数); float32 不量化."""
+    if storage == "float16":
+        return embeddings.astype("<f2"), None
+    if storage == "int8":
+        # Symmetric per-dimension scale, so q·x ≈ (q * scale)·x_int8
+        scale = np.abs(embeddings).max(axis=0) / 127 if len(embeddings) else np.ones(0)
+        scale[scale == 0] = 1.0
+        quantized = np.clip(np.round(embeddings / scale), -127, 127).astype(np.int8)
+        return quantized, scale.astype("<f4")
+    return None, None
+
+
+def write_packed_index(
+    path: Path,
+    ids: List[str],
+    rows: List[bytes],
+    embeddings: np.ndarray,
+    storage: str = "float32"
+) -> None:
+    """写入一个打包索引文件 (rows 为已编码的JSON行)."""
+    embeddings = np.ascontiguousarray(embeddings, dtype="<f4")
+    offsets = np.zeros(len(rows) + 1, dtype="<u8")
+    np.cumsum([len(row) for row in rows], out=offsets[1:])
+    id_bytes = "\n".join(ids).encode("utf-8")
+    quantized, scale = quantize_vectors(embeddings, storage)
+    
+    sections = [
+        embeddings.tobytes(), offsets.tobytes(), b"".join(rows), id_bytes,
+        scale.tobytes() if scale is not None else b"",
+        quantized.tobytes() if quantized is not None else b"",
+    ]
+    # The matrices are aligned for vectorized reads; the rest is packed
+    aligned = (True, True, False, False, True, True)
+    positions = []
+    end = _HEADER.size
+    for section, align in zip(sections, aligned):
+        positions.append(_aligned(end) if align else end)
+        end = positions[-1] + len(section)
+    
+    embeddings_at, offsets_at, blob_at, ids_at, scale_at, quantized_at = positions
+    header = _HEADER.pack(
+        _MAGIC, len(ids), embeddings.shape[1], embeddings_at, offsets_at, blob_at,
+        ids_at, len(id_bytes), _STORAGE_CODES[storage], scale_at, quantized_at
+    )
+    
+    def write(f):
+        f.write(header)
+        for section, position in zip(sections, positions):
+            f.write(b"\0" * (position - f.tell()))
+            f.write(section)
+    
+    _atomic_write(path, write)
+
+
+class PackedIndex:
+    """只读映射的打包索引文件，向量和行数据都不复制."""
+    
+    def __init__(self, path: Path):
+        """Map ``path`` read-only."""
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(_MAGIC)] != _MAGIC:
+            raise ValueError(f"无效的索引文件: {path}")
+        (
+            _, count, dim, embeddings_at, offsets_at, blob_at, ids_at, ids_length,
+            storage_code, scale_at, quantized_at
+        ) = _HEADER.unpack_from(self._mmap)
+        
+        self.embeddings = np.frombuffer(
+            self._mmap, dtype="<f4", count=count * dim, offset=embeddings_at
+        ).reshape(count, dim)
+        
+        # Optional low-precision copy scanned first, then rescored in float32
+        self.quantized: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+        if storage_code == _STORAGE_CODES["float16"]:
+            self.quantized = np.frombuffer(
+                self._mmap, dtype="<f2", count=count * dim, offset=quantized_at
+            ).reshape(count, dim)
+        elif storage_code == _STORAGE_CODES["int8"]:
+            self.scale = np.frombuffer(self._mmap, dtype="<f4", count=dim, offset=scale_at)
+            self.quantized = np.frombuffer(
+                self._mmap, dtype=np.int8, count=count * dim, offset=quantized_at
+            ).reshape(count, dim)
+        self._offsets = np.frombuffer(self._mmap, dtype="<u8", count=count + 1, offset=offsets_at)
+        self._blob_at = blob_at
+        id_bytes = self._mmap[ids_at:ids_at + ids_length]
+        self.ids = id_bytes.decode("utf-8").split("\n") if count else []
+    
+    def raw_row(self, position: int) -> bytes:
+        """第 position 行的JSON原文."""
+        start = self._blob_at + int(self._offsets[position])
+        end = self._blob_at + int(self._offsets[position + 1])
+        return self._mmap[start:end]
+    
+    def row(self, position: int) -> Dict[str, Any]:
+        """解码第 position 行."""
+        return json.loads(self.raw_row(position))
+    
+    def scan(self, vectors: np.ndarray) -> np.ndarray:
+        """对全部向量打分; 有量化副本时结果为近似值."""
+        if self.quantized is None:
+            return vectors @ self.embeddings.T
+        if self.scale is not None:
+            return (vectors * self.scale) @ self.quantized.T
+        return vectors @ self.quantized.T
+
+
+def _encode_row(document: str, food: FoodItem) -> bytes:
+    return json.dumps(
+        {"document": document, "food": food.model_dump()}, ensure_ascii=False
+    ).encode("utf-8")
+
+
+class NumpyVectorDatabase(VectorDatabase):
+    """NumPy向量数据库: 归一化向量矩阵 + 精确top-k，接口与Chroma版本一致.
+    
+    多个worker共享同一份映射文件; 写入假定同一时间只有一个写进程 (例如 init_db.py)。
+    """
+    
+    def __init__(self):
+        """Initialize index from ``numpy_index_path`` (created on first write)."""
+        self.settings = get_settings()
+        self.index_path = Path(self.settings.numpy_index_path)
+        self.index_path.mkdir(parents=True, exist_ok=True)
+        
+        self._embedding_model = None
+        self._food_cache: Dict[str, FoodItem] = {}
+        self._lexical_index: Optional[BM25Index] = None
+        self._menu_hash: Optional[Tuple[str, str]] = None  # (index version, content hash)
+        self._checked_at = 0.0
+        
+        self._load()
+    
+    def _read_current(self) -> Optional[str]:
+        """读取当前版本的文件名."""
+        try:
+            return (self.index_path / _CURRENT_FILE).read_text().strip() or None
+        except FileNotFoundError:
+            return None
+    
+    def _load(self) -> None:
+        """映射当前版本; 食物条目在首次访问时解码."""
+        self.version = self._read_current()
+        self._packed = PackedIndex(self.index_path / self.version) if self.version else None
+        self._ids: List[str] = list(self._packed.ids) if self._packed else []
+        self._positions = {food_id: i for i, food_id in enumerate(self._ids)}
+        self._food_cache.clear()
+        self._lexical_index = None
+        self._checked_at = time.monotonic()
+    
+    def _refresh(self) -> None:
+        """其他进程发布了新版本时重新映射 (按间隔检查)."""
+        now = time.monotonic()
+        if now - self._checked_at < self.settings.numpy_index_reload_interval:
+            return
+        self._checked_at = now
+        if self._read_current() != self.version:
+            self._load()
+    
+    def _publish(self, ids: List[str], rows: List[bytes], embeddings: np.ndarray) -> None:
+        """写入新版本并原子切换 CURRENT，再清理旧版本."""
+        current = self._read_current()
+        number = int(current.split("-")[1].split(".")[0]) + 1 if current else 1
+        name = _VERSION_FORMAT.format(number)
+        write_packed_index(
+            self.index_path / name, ids, rows, embeddings, self.settings.vector_storage
+        )
+        _atomic_write(self.index_path / _CURRENT_FILE, lambda f: f.write(name.encode()))
+        
+        # Keep the previous version for readers that have not switched yet;
+        # mappings of deleted files stay valid until the reader remaps
+        keep = {name, current}
+        for path in self.index_path.glob("index-*.bin"):
+            if path.name not in keep:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+    
+    def _food_at(self, position: int) -> FoodItem:
+        """解码并缓存第 position 个食物."""
+        food_id = self._ids[position]
+        food = self._food_cache.get(food_id)
+        if food is None:
+            food = FoodItem.model_validate(self._packed.row(position)["food"])
+            self._food_cache[food_id] = food
+        return food
+    
+    @property
+    def embedding_model(self):
+        """嵌入模型，首次需要向量时加载 (纯关键词查询不会加载)."""
+        if self._embedding_model is None:
+            # Deferred so opening the index does not import torch; each worker
+            # still holds its own copy of the model
+            self._embedding_model = load_embedding_model(self.settings)
+        return self._embedding_model
+    
+    @property
+    def lexical_index(self) -> BM25Index:
+        """BM25倒排索引，首次访问时由当前版本构建."""
+        self._refresh()
+        if self._lexical_index is None:
+            index = BM25Index()
+            for position, food_id in enumerate(self._ids):
+                document = self._packed.row(position)["document"]
+                index.add(food_id, document, self._food_phrases(self._food_at(position)))
+            self._lexical_index = index
+        return self._lexical_index
+    
+    def add_food_items(self, foods: List[FoodItem]) -> None:
+        """添加食物条目，ID已存在时覆盖."""
+        if not foods:
+            return
+        
+        documents = [self._create_food_document(food) for food in foods]
+        self.add_food_vectors(foods, self._embed(documents), documents)
+    
+    def add_food_vectors(
+        self,
+        foods: List[FoodItem],
+        vectors: np.ndarray,
+        documents: Optional[List[str]] = None
+    ) -> None:
+        """添加已计算好归一化向量的食物 (例如离线批量嵌入)，发布为新版本."""
+        if documents is None:
+            documents = [self._create_food_document(food) for food in foods]
+        
+        # Start from the latest published version, not a possibly stale mapping
+        self._load()
+        ids = list(self._ids)
+        rows = [self._packed.raw_row(i) for i in range(len(ids))] if self._packed else []
+        embeddings = (
+            np.array(self._packed.embeddings, dtype=np.float32)
+            if ids else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+        )
+        
+        positions = dict(self._positions)
+        appended = []
+        for food, document, vector in zip(foods, documents, vectors):
+            position = positions.get(food.id)
+            if position is None:
+                positions[food.id] = len(ids)
+                ids.append(food.id)
+                rows.append(_encode_row(document, food))
+                appended.append(vector)
+            else:
+                rows[position] = _encode_row(document, food)
+                embeddings[position] = vector
+        
+        if appended:
+            embeddings = np.vstack([embeddings, np.array(appended, dtype=np.float32)])
+        self._publish(ids, rows, embeddings)
+        self._load()
+    
+    def _matches(self, food: FoodItem, filters: Dict[str, Any]) -> bool:
+        """按字段相等过滤."""
+        return all(getattr(food, field, None) == value for field, value in filters.items())
+    
+    def search_by_vectors(
+        self,
+        vectors: np.ndarray,
+        n_results: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[FoodItem]]:
+        """对归一化的查询向量做top-k (余弦相似度)，量化扫描的候选用float32重排."""
+        self._refresh()
+        if not self._ids:
+            return [[] for _ in vectors]
+        
+        packed = self._packed
+        scores = packed.scan(vectors)  # (queries, foods)
+        if filters:
+            mask = np.array([
+                self._matches(self._food_at(i), filters) for i in range(len(self._ids))
+            ])
+            scores[:, ~mask] = -np.inf
+        
+        k = min(n_results, len(self._ids))
+        rescore = packed.quantized is not None
+        width = min(k * self.settings.vector_rescore_factor, len(self._ids)) if rescore else k
+        # argpartition finds the top candidates in O(n); only those are sorted
+        top = np.argpartition(-scores, width - 1, axis=1)[:, :width]
+        results = []
+        for vector, row, candidates in zip(vectors, scores, top):
+            candidates = candidates[np.isfinite(row[candidates])]
+            # Exact scores touch only the shortlisted float32 rows
+            exact = packed.embeddings[candidates] @ vector if rescore else row[candidates]
+            ordered = candidates[np.argsort(-exact)[:k]]
+            results.append([self._food_at(i) for i in ordered])
+        return results
+    
+    def search_foods_many(
+        self,
+        queries: List[str],
+        n_results: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[FoodItem]]:
+        """批量搜索，所有查询一次嵌入并用一次矩阵乘法打分."""
+        if not queries:
+            return []
+        with span(
+            "vector_db.search", backend="numpy", queries=len(queries), n_results=n_results
+        ) as current:
+            self._refresh()
+            current.set_attribute("index_version", self.version or "")
+            if not self._ids:
+                return [[] for _ in queries]
+            with timed(STAGE_SECONDS, stage="embedding"), span("vector_db.embed"):
+                vectors = self._embed(queries)
+            results = self.search_by_vectors(vectors, n_results, filters)
+            current.set_attribute("hits", sum(len(foods) for foods in results))
+            return results
+    
+    def get_foods_by_ids(self, food_ids: List[str]) -> List[FoodItem]:
+        """根据ID批量获取食物，按输入顺序返回，跳过不存在的ID."""
+        self._refresh()
+        return [
+            self._food_at(self._positions[food_id])
+            for food_id in food_ids if food_id in self._positions
+        ]
+    
+    def get_all_foods(self) -> List[FoodItem]:
+        """获取数据库中的全部食物."""
+        self._refresh()
+        return [self._food_at(i) for i in range(len(self._ids))]
+    
+    def clear_all(self) -> None:
+        """清空数据库 (谨慎使用)，发布一个空版本."""
+        self._publish([], [], np.zeros((0, 0), dtype=np.float32))
+        self._load()
+    
+    def count(self) -> int:
+        """返回数据库中的食物数量."""
+        self._refresh()
+        return len(self._ids)
+    
+    def menu_version(self) -> str:
+        """菜单版本 (食物内容的哈希)，每个发布的索引版本只计算一次."""
+        self._refresh()
+        if self._menu_hash is None or self._menu_hash[0] != self.version:
+            self._menu_hash = (self.version, self._hash_menu())
+        return self._menu_hash[1]
@@ -1,16 +1,34 @@
-"""User database using SQLite."""
-from sqlalchemy import create_engine, Column, String, Integer, DateTime, Text, JSON
+"""User database with SQLite and PostgreSQL backends."""
+from sqlalchemy import (
+    create_engine, Column, String, Integer, DateTime, Text, JSON, Index,
+    select, func, insert, and_, or_
+)
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, aliased
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Dict, Tuple, Callable, Awaitable
+from collections import deque
+import base64
 import json
+from app.cache import TTLCache
 from app.config import get_settings
-from app.models import User, UserPreferences, FoodHistory
+from app.metrics import DB_SECONDS, REGISTRY, timed_operation
+from app.registry import AsyncSingleton
+from app.tracing import traced
+from app.models import User, UserPreferences, FoodHistory, TasteProfile
+from app.database.history_buffer import HistoryWriteBuffer
+from app.database.migrations import run_migrations
+from app.database.backends import get_backend
 
 Base = declarative_base()
 
+# Max bound parameters per IN (...) clause, below SQLite's historical limit of 999
+_IN_CLAUSE_CHUNK = 500
+
+# Rows per multi-row INSERT, keeping (rows x columns) under the same limit
+_INSERT_CHUNK = 100
+
 
 class UserModel(Base):
     """用户表模型."""
@@ -26,9 +44,12 @@ class UserModel(Base):
 class FoodHistoryModel(Base):
     """饮食历史表模型."""
     __tablename__ = "food_history"
+    __table_args__ = (
+        Index("ix_food_history_user_timestamp", "user_id", "timestamp"),
+    )
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    user_id = Column(String, index=True, nullable=False)
+    user_id = Column(String, nullable=False)
     food_id = Column(String, nullable=False)
     food_name = Column(String, nullable=False)
     canteen = Column(String, nullable=False)
@@ -38,53 +59,256 @@ class FoodHistoryModel(Base):
     notes = Column(Text, nullable=True)
 
 
+class TasteProfileModel(Base):
+    """用户口味画像表模型."""
+    __tablename__ = "taste_profiles"
+    
+    user_id = Column(String, primary_key=True)
+    profile = Column(JSON, nullable=False)
+    updated_at = Column(DateTime, default=datetime.now)
+
+
+def _to_user(model: UserModel) -> User:
+    """将ORM对象转换为用户模型."""
+    return User(
+        user_id=model.user_id,
+        username=model.username,
+        preferences=UserPreferences(**model.preferences) if model.preferences else None,
+        created_at=model.created_at,
+        last_active=model.last_active
+    )
+
+
+def _to_history(model: FoodHistoryModel) -> FoodHistory:
+    """将ORM对象转换为饮食历史模型."""
+    return FoodHistory(
+        user_id=model.user_id,
+        food_id=model.food_id,
+        food_name=model.food_name,
+        canteen=model.canteen,
+        meal_type=model.meal_type,
+        timestamp=model.timestamp,
+        rating=model.rating,
+        notes=model.notes
+    )
+
+
+# Columns read for history pages; rows are projected without ORM objects
+_HISTORY_COLUMNS = (
+    FoodHistoryModel.id,
+    FoodHistoryModel.user_id,
+    FoodHistoryModel.food_id,
+    FoodHistoryModel.food_name,
+    FoodHistoryModel.canteen,
+    FoodHistoryModel.meal_type,
+    FoodHistoryModel.timestamp,
+    FoodHistoryModel.rating,
+    FoodHistoryModel.notes,
+)
+
+
+def encode_history_cursor(timestamp: datetime, row_id: int) -> str:
+    """将分页位置编码为不透明的游标."""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """解析游标，格式错误时抛出 ValueError."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, _, row_id = base64.urlsafe_b64decode(padded).decode().partition("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError(f"Invalid history cursor: {cursor}")
+
+
+# Marks a cached context whose user row has not been loaded yet
+_UNLOADED = object()
+
+
+class _UserContext:
+    """缓存的用户上下文: 用户信息、口味画像和最近的饮食历史窗口."""
+    
+    __slots__ = ("user", "history", "history_loaded", "profile")
+    
+    def __init__(self, history_window: int):
+        self.user = _UNLOADED
+        self.profile = _UNLOADED
+        self.history: deque = deque(maxlen=history_window)  # Newest first
+        self.history_loaded = False
+    
+    def record_history(self, history: FoodHistory) -> None:
+        """写入一条新的历史记录."""
+        if not self.history_loaded:
+            return
+        if not self.history or history.timestamp >= self.history[0].timestamp:
+            self.history.appendleft(history)
+        else:
+            # Back-dated rows (e.g. offline sync) may belong mid-window; reload lazily
+            self.history.clear()
+            self.history_loaded = False
+
+
+def _chunks(items: List[str], size: int = _IN_CLAUSE_CHUNK):
+    """按固定大小切分列表."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _operation(func):
+    """数据库操作: 记录耗时指标，并在当前追踪中创建 db.<操作名> span."""
+    return timed_operation(DB_SECONDS)(traced(f"db.{func.__name__.lstrip('_')}")(func))
+
+
 class UserDatabase:
     """用户数据库管理类."""
     
-    def __init__(self):
-        """Initialize database."""
+    def __init__(self, database_url: Optional[str] = None):
+        """Initialize database; ``database_url`` overrides the configured URL."""
         self.settings = get_settings()
-        self.engine = create_async_engine(
-            self.settings.database_url,
-            echo=self.settings.debug
-        )
+        
+        url = database_url or self.settings.database_url
+        
+        # Dialect-specific engine tuning and statements (SQLite / PostgreSQL)
+        self.backend = get_backend(self.settings, url)
+        self.engine = create_async_engine(url, **self.backend.engine_kwargs())
+        self.backend.configure_engine(self.engine)
+        
         self.async_session = sessionmaker(
             self.engine, class_=AsyncSession, expire_on_commit=False
         )
+        
+        # In-process user/history cache, kept current by the write methods
+        self.history_window = self.settings.user_cache_history_window
+        self._contexts = TTLCache(
+            maxsize=self.settings.user_cache_size,
+            ttl=self.settings.user_cache_ttl
+        )
+        REGISTRY.register_cache("user_context", self._contexts)
+        
+        # Called with each batch of persisted history rows (e.g. taste profile upkeep)
+        self._history_listeners: List[Callable[[List[FoodHistory]], Awaitable[None]]] = []
+        
+        # Write-behind buffer for history inserts in buffered durability mode
+        self.history_buffer: Optional[HistoryWriteBuffer] = None
+        if self.settings.history_durability == "buffered":
+            self.history_buffer = HistoryWriteBuffer(
+                self._insert_histories,
+                max_batch_size=self.settings.history_batch_size,
+                flush_interval=self.settings.history_flush_interval_ms / 1000,
+                max_queue_size=self.settings.history_queue_size,
+                enqueue_timeout=self.settings.history_enqueue_timeout
+            )
     
     async def init_db(self):
         """初始化数据库表."""
         async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(run_migrations, Base.metadata)
+        
+        if self.history_buffer:
+            self.history_buffer.start()
+    
+    async def close(self):
+        """写完缓冲中的记录并关闭数据库连接."""
+        if self.history_buffer:
+            await self.history_buffer.close()
+        await self.engine.dispose()
+    
+    def _context(self, user_id: str) -> _UserContext:
+        """获取或创建用户的缓存上下文."""
+        context = self._contexts.get(user_id)
+        if context is None:
+            context = _UserContext(self.history_window)
+            self._contexts.set(user_id, context)
+        return context
     
-    async def create_user(self, user: User) -> User:
-        """创建新用户."""
+    def cache_stats(self) -> Dict[str, object]:
+        """用户上下文缓存的统计信息."""
+        return self._contexts.stats()
+    
+    @_operation
+    async def create_user(self, user: User) -> Optional[User]:
+        """创建新用户，用户已存在时返回None."""
+        stmt = self.backend.upsert(
+            UserModel.__table__,
+            {
+                "user_id": user.user_id,
+                "username": user.username,
+                "preferences": user.preferences.model_dump() if user.preferences else None,
+                "created_at": user.created_at,
+                "last_active": user.last_active,
+            },
+            index_elements=["user_id"]
+        )
         async with self.async_session() as session:
-            user_model = UserModel(
-                user_id=user.user_id,
-                username=user.username,
-                preferences=user.preferences.model_dump() if user.preferences else None,
-                created_at=user.created_at,
-                last_active=user.last_active
-            )
-            session.add(user_model)
+            result = await session.execute(stmt)
             await session.commit()
-            return user
+        
+        # The conflict is resolved in the database, so concurrent creates can't both win
+        if result.rowcount == 0:
+            return None
+        
+        self._context(user.user_id).user = user
+        return user
     
+    @_operation
     async def get_user(self, user_id: str) -> Optional[User]:
         """获取用户信息."""
+        context = self._contexts.get(user_id)
+        if context is not None and context.user is not _UNLOADED:
+            return context.user
+        
         async with self.async_session() as session:
             result = await session.get(UserModel, user_id)
-            if result:
-                return User(
-                    user_id=result.user_id,
-                    username=result.username,
-                    preferences=UserPreferences(**result.preferences) if result.preferences else None,
-                    created_at=result.created_at,
-                    last_active=result.last_active
-                )
-            return None
+            user = _to_user(result) if result else None
+        
+        # Unknown users are cached too so repeat lookups skip the database
+        self._context(user_id).user = user
+        return user
+    
+    @_operation
+    async def get_users(self, user_ids: List[str]) -> Dict[str, User]:
+        """批量获取用户信息，不存在的用户不在结果中."""
+        users: Dict[str, User] = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            context = self._contexts.get(user_id)
+            if context is not None and context.user is not _UNLOADED:
+                if context.user is not None:
+                    users[user_id] = context.user
+            else:
+                missing.append(user_id)
+        
+        async with self.async_session() as session:
+            for chunk in _chunks(missing):
+                stmt = select(UserModel).where(UserModel.user_id.in_(chunk))
+                result = await session.execute(stmt)
+                for model in result.scalars():
+                    users[model.user_id] = _to_user(model)
+        
+        for user_id in missing:
+            self._context(user_id).user = users.get(user_id)
+        return users
     
+    @_operation
+    async def get_top_preferences(self, limit: int = 20) -> List[UserPreferences]:
+        """统计用户中最常见的偏好设置."""
+        async with self.async_session() as session:
+            stmt = select(UserModel.preferences).where(UserModel.preferences.is_not(None))
+            result = await session.execute(stmt)
+            counts: Dict[str, int] = {}
+            for preferences in result.scalars():
+                # JSON null passes the SQL NULL filter (users created without preferences)
+                if not preferences:
+                    continue
+                key = json.dumps(preferences, sort_keys=True, ensure_ascii=False)
+                counts[key] = counts.get(key, 0) + 1
+        
+        top = sorted(counts, key=counts.get, reverse=True)[:limit]
+        return [UserPreferences(**json.loads(key)) for key in top]
+    
+    @_operation
     async def update_user_preferences(
         self, user_id: str, preferences: UserPreferences
     ) -> Optional[User]:
@@ -95,60 +319,268 @@ class UserDatabase:
                 user.preferences = preferences.model_dump()
                 user.last_active = datetime.now()
                 await session.commit()
-                return await self.get_user(user_id)
+                updated = _to_user(user)
+                self._context(user_id).user = updated
+                return updated
             return None
     
+    def add_history_listener(
+        self, listener: Callable[[List[FoodHistory]], Awaitable[None]]
+    ) -> None:
+        """注册饮食历史写入后的回调，每批写入调用一次."""
+        if listener not in self._history_listeners:
+            self._history_listeners.append(listener)
+    
+    async def _notify_history_listeners(self, histories: List[FoodHistory]) -> None:
+        """通知历史写入回调，回调失败不影响已提交的写入."""
+        for listener in self._history_listeners:
+            try:
+                await listener(histories)
+            except Exception as e:
+                print(f"⚠️  History listener failed: {e}")
+    
+    @_operation
     async def add_food_history(self, history: FoodHistory) -> FoodHistory:
         """添加饮食历史记录."""
+        if self.history_buffer:
+            await self.history_buffer.put(history)
+        else:
+            await self._insert_histories([history])
+        self._record_histories([history])
+        return history
+    
+    @_operation
+    async def add_food_histories(self, histories: List[FoodHistory]) -> int:
+        """在一个事务中批量写入饮食历史，使用多行INSERT."""
+        inserted = await self._insert_histories(histories)
+        self._record_histories(histories)
+        return inserted
+    
+    def _record_histories(self, histories: List[FoodHistory]) -> None:
+        """将新写入的历史同步到已缓存的用户上下文."""
+        for history in sorted(histories, key=lambda h: h.timestamp):
+            context = self._contexts.get(history.user_id)
+            if context is not None:
+                context.record_history(history)
+    
+    @_operation
+    async def _insert_histories(self, histories: List[FoodHistory]) -> int:
+        """写入饮食历史行."""
+        if not histories:
+            return 0
+        
+        rows = [
+            {
+                "user_id": h.user_id,
+                "food_id": h.food_id,
+                "food_name": h.food_name,
+                "canteen": h.canteen,
+                "meal_type": h.meal_type,
+                "timestamp": h.timestamp,
+                "rating": h.rating,
+                "notes": h.notes,
+            }
+            for h in histories
+        ]
+        
         async with self.async_session() as session:
-            history_model = FoodHistoryModel(
-                user_id=history.user_id,
-                food_id=history.food_id,
-                food_name=history.food_name,
-                canteen=history.canteen,
-                meal_type=history.meal_type,
-                timestamp=history.timestamp,
-                rating=history.rating,
-                notes=history.notes
-            )
-            session.add(history_model)
+            for i in range(0, len(rows), _INSERT_CHUNK):
+                await session.execute(
+                    insert(FoodHistoryModel).values(rows[i:i + _INSERT_CHUNK])
+                )
             await session.commit()
-            return history
+        
+        # Runs after commit so listeners see the new rows; buffered writes arrive per batch
+        await self._notify_history_listeners(histories)
+        return len(rows)
+    
+    @_operation
+    async def get_ratings(self) -> List[Tuple[str, str, Optional[int]]]:
+        """读取全部 (user_id, food_id, rating)，用于离线训练."""
+        stmt = select(
+            FoodHistoryModel.user_id, FoodHistoryModel.food_id, FoodHistoryModel.rating
+        )
+        async with self.async_session() as session:
+            result = await session.execute(stmt)
+            return [tuple(row) for row in result]
     
+    @_operation
+    async def get_taste_profile(self, user_id: str) -> Optional[TasteProfile]:
+        """获取用户口味画像."""
+        profiles = await self.get_taste_profiles([user_id])
+        return profiles.get(user_id)
+    
+    @_operation
+    async def get_taste_profiles(self, user_ids: List[str]) -> Dict[str, TasteProfile]:
+        """批量获取口味画像，尚未建立画像 (也未缓存空画像) 的用户不在结果中."""
+        profiles: Dict[str, TasteProfile] = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            context = self._contexts.get(user_id)
+            if context is not None and context.profile is not _UNLOADED:
+                if context.profile is not None:
+                    profiles[user_id] = context.profile
+            else:
+                missing.append(user_id)
+        
+        async with self.async_session() as session:
+            for chunk in _chunks(missing):
+                stmt = select(TasteProfileModel.profile).where(
+                    TasteProfileModel.user_id.in_(chunk)
+                )
+                for data in (await session.execute(stmt)).scalars():
+                    profile = TasteProfile.model_validate(data)
+                    profiles[profile.user_id] = profile
+        
+        for user_id in missing:
+            self._context(user_id).profile = profiles.get(user_id)
+        return profiles
+    
+    def cache_taste_profiles(self, profiles: List[TasteProfile]) -> None:
+        """只缓存画像不写数据库 (没有历史的用户的空画像)，首次写入历史时重建."""
+        for profile in profiles:
+            self._context(profile.user_id).profile = profile
+    
+    @_operation
+    async def save_taste_profiles(self, profiles: List[TasteProfile]) -> None:
+        """写入口味画像 (存在则覆盖)."""
+        if not profiles:
+            return
+        
+        async with self.async_session() as session:
+            for profile in profiles:
+                await session.execute(self.backend.upsert(
+                    TasteProfileModel.__table__,
+                    {
+                        "user_id": profile.user_id,
+                        "profile": profile.model_dump(mode="json"),
+                        "updated_at": profile.updated_at,
+                    },
+                    index_elements=["user_id"],
+                    update_columns=["profile", "updated_at"]
+                ))
+            await session.commit()
+        
+        for profile in profiles:
+            self._context(profile.user_id).profile = profile
+    
+    @_operation
     async def get_user_history(
         self, user_id: str, limit: int = 50
     ) -> List[FoodHistory]:
         """获取用户饮食历史."""
+        if limit > self.history_window:
+            history, _ = await self.get_user_history_page(user_id, limit)
+            return history
+        
+        context = self._context(user_id)
+        if not context.history_loaded:
+            history, _ = await self.get_user_history_page(user_id, self.history_window)
+            context.history.extend(history)
+            context.history_loaded = True
+        return list(context.history)[:limit]
+    
+    @_operation
+    async def get_user_history_page(
+        self, user_id: str, limit: int = 50, cursor: Optional[str] = None
+    ) -> Tuple[List[FoodHistory], Optional[str]]:
+        """按时间倒序分页获取饮食历史，返回本页记录和下一页游标."""
+        stmt = select(*_HISTORY_COLUMNS).where(FoodHistoryModel.user_id == user_id)
+        
+        if cursor:
+            # Keyset pagination: continue strictly after the last row seen
+            timestamp, row_id = decode_history_cursor(cursor)
+            stmt = stmt.where(or_(
+                FoodHistoryModel.timestamp < timestamp,
+                and_(FoodHistoryModel.timestamp == timestamp, FoodHistoryModel.id < row_id)
+            ))
+        
+        stmt = stmt.order_by(
+            FoodHistoryModel.timestamp.desc(), FoodHistoryModel.id.desc()
+        ).limit(limit + 1)
+        
         async with self.async_session() as session:
-            from sqlalchemy import select
-            stmt = select(FoodHistoryModel).where(
-                FoodHistoryModel.user_id == user_id
-            ).order_by(FoodHistoryModel.timestamp.desc()).limit(limit)
-            result = await session.execute(stmt)
-            histories = result.scalars().all()
-            
-            return [
-                FoodHistory(
-                    user_id=h.user_id,
-                    food_id=h.food_id,
-                    food_name=h.food_name,
-                    canteen=h.canteen,
-                    meal_type=h.meal_type,
-                    timestamp=h.timestamp,
-                    rating=h.rating,
-                    notes=h.notes
-                ) for h in histories
-            ]
-
-
-# Global instance
-_user_db: Optional[UserDatabase] = None
+            rows = (await session.execute(stmt)).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_history_cursor(rows[-1].timestamp, rows[-1].id)
+        
+        history = [
+            FoodHistory(
+                user_id=row.user_id,
+                food_id=row.food_id,
+                food_name=row.food_name,
+                canteen=row.canteen,
+                meal_type=row.meal_type,
+                timestamp=row.timestamp,
+                rating=row.rating,
+                notes=row.notes
+            ) for row in rows
+        ]
+        return history, next_cursor
+    
+    @_operation
+    async def get_users_history(
+        self, user_ids: List[str], limit: int = 20
+    ) -> Dict[str, List[FoodHistory]]:
+        """批量获取多个用户最近的饮食历史."""
+        histories: Dict[str, List[FoodHistory]] = {user_id: [] for user_id in user_ids}
+        
+        # Serve cached windows; load the rest with at least a full window to cache it
+        use_cache = limit <= self.history_window
+        missing = []
+        for user_id in histories:
+            context = self._contexts.get(user_id) if use_cache else None
+            if context is not None and context.history_loaded:
+                histories[user_id] = list(context.history)[:limit]
+            else:
+                missing.append(user_id)
+        fetch_limit = self.history_window if use_cache else limit
+        
+        async with self.async_session() as session:
+            for chunk in _chunks(missing):
+                # Rank rows per user so one query returns each user's latest N
+                ranked = select(
+                    FoodHistoryModel,
+                    func.row_number().over(
+                        partition_by=FoodHistoryModel.user_id,
+                        order_by=(FoodHistoryModel.timestamp.desc(), FoodHistoryModel.id.desc())
+                    ).label("rank")
+                ).where(FoodHistoryModel.user_id.in_(chunk)).subquery()
+                
+                history_alias = aliased(FoodHistoryModel, ranked)
+                stmt = select(history_alias).where(
+                    ranked.c.rank <= fetch_limit
+                ).order_by(
+                    history_alias.user_id, history_alias.timestamp.desc(), history_alias.id.desc()
+                )
+                result = await session.execute(stmt)
+                for h in result.scalars():
+                    histories[h.user_id].append(_to_history(h))
+        
+        if use_cache:
+            for user_id in missing:
+                context = self._context(user_id)
+                context.history.clear()
+                context.history.extend(histories[user_id])
+                context.history_loaded = True
+                histories[user_id] = histories[user_id][:limit]
+        return histories
+
+
+async def _create_user_db() -> UserDatabase:
+    """创建用户数据库并执行迁移."""
+    user_db = UserDatabase()
+    await user_db.init_db()
+    return user_db
+
+
+# Global instance; closing drains buffered history and disposes the engine
+_user_db = AsyncSingleton("user_db", _create_user_db, close=UserDatabase.close)
 
 
 async def get_user_db() -> UserDatabase:
     """获取用户数据库单例."""
-    global _user_db
-    if _user_db is None:
-        _user_db = UserDatabase()
-        await _user_db.init_db()
-    return _user_db
+    return await _user_db.get()
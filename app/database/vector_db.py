@@ -1,12 +1,121 @@
 """Vector database for RAG system using ChromaDB."""
-import chromadb
-from chromadb.config import Settings as ChromaSettings
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+import hashlib
 import json
 from pathlib import Path
-from sentence_transformers import SentenceTransformer
+import numpy as np
 from app.config import get_settings
-from app.models import FoodItem
+from app.metrics import STAGE_SECONDS, timed
+from app.registry import Singleton
+from app.tracing import span
+from app.models import FoodItem, NutritionInfo
+from app.database.lexical_index import BM25Index
+
+# Separator for list fields packed into a single metadata string; a literal
+# separator (or escape) inside an item is escaped with a backslash
+_LIST_SEP = "|"
+_LIST_ESCAPE = "\\"
+
+# Scalar nutrition fields flattened into metadata as ``nutrition_<field>``
+_NUTRITION_FIELDS = ("calories", "protein", "carbs", "fat", "fiber", "sodium")
+_LIST_FIELDS = ("ingredients", "tags", "available_meals")
+
+
+def _encode_food_metadata(food: FoodItem) -> Dict[str, Any]:
+    """将食物编码为扁平的Chroma元数据 (标量营养字段 + 分隔符拼接的列表)."""
+    metadata: Dict[str, Any] = {
+        "id": food.id,
+        "name": food.name,
+        "canteen": food.canteen,
+        "category": food.category,
+        "price": food.price,
+    }
+    if food.description is not None:
+        metadata["description"] = food.description
+    
+    for field in _NUTRITION_FIELDS:
+        value = getattr(food.nutrition, field)
+        if value is not None:  # Chroma metadata values cannot be None
+            metadata[f"nutrition_{field}"] = value
+    
+    for field in _LIST_FIELDS:
+        metadata[field] = _pack_list(getattr(food, field))
+    
+    return metadata
+
+
+def _pack_list(items: List[str]) -> str:
+    """用分隔符拼接列表字段，元素中的分隔符和转义符加反斜杠转义."""
+    return _LIST_SEP.join(
+        item.replace(_LIST_ESCAPE, _LIST_ESCAPE * 2).replace(_LIST_SEP, _LIST_ESCAPE + _LIST_SEP)
+        for item in items
+    )
+
+
+def _unpack_list(value: str) -> List[str]:
+    """拆分分隔符拼接的列表字段."""
+    if not value:
+        return []
+    if _LIST_ESCAPE not in value:
+        return value.split(_LIST_SEP)
+    
+    items = []
+    current = []
+    chars = iter(value)
+    for char in chars:
+        if char == _LIST_ESCAPE:
+            current.append(next(chars, ""))
+        elif char == _LIST_SEP:
+            items.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    items.append("".join(current))
+    return items
+
+
+def _decode_food_metadata(metadata: Dict[str, Any]) -> FoodItem:
+    """从Chroma元数据还原食物条目，兼容旧的JSON字符串格式."""
+    if "nutrition" in metadata:
+        # Legacy rows written before the compact encoding
+        metadata = dict(metadata)
+        metadata["nutrition"] = json.loads(metadata["nutrition"])
+        for field in _LIST_FIELDS:
+            metadata[field] = json.loads(metadata[field])
+        return FoodItem(**metadata)
+    
+    # Stored rows were validated on insert, so skip re-validation
+    nutrition = NutritionInfo.model_construct(**{
+        field: metadata.get(f"nutrition_{field}") for field in _NUTRITION_FIELDS
+    })
+    return FoodItem.model_construct(
+        id=metadata["id"],
+        name=metadata["name"],
+        canteen=metadata["canteen"],
+        category=metadata["category"],
+        price=metadata["price"],
+        nutrition=nutrition,
+        ingredients=_unpack_list(metadata.get("ingredients", "")),
+        tags=_unpack_list(metadata.get("tags", "")),
+        available_meals=_unpack_list(metadata.get("available_meals", "")),
+        description=metadata.get("description"),
+    )
+
+
+def load_embedding_model(settings):
+    """加载嵌入模型; embedding_quantization=int8 时对线性层做动态int8量化 (仅CPU)."""
+    from sentence_transformers import SentenceTransformer
+    
+    if settings.embedding_quantization != "int8":
+        return SentenceTransformer(settings.embedding_model)
+    
+    import torch
+    model = SentenceTransformer(settings.embedding_model, device="cpu")
+    # Linear layers dominate MiniLM inference: weights are stored as int8 and
+    # activations are quantized on the fly per batch
+    return torch.ao.quantization.quantize_dynamic(
+        model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True
+    )
 
 
 class VectorDatabase:
@@ -18,6 +127,10 @@ class VectorDatabase:
         self.db_path = Path(self.settings.vector_db_path)
         self.db_path.mkdir(parents=True, exist_ok=True)
         
+        # Imported here so the NumPy backend never loads Chroma
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        
         # Initialize ChromaDB
         self.client = chromadb.PersistentClient(
             path=str(self.db_path),
@@ -25,13 +138,59 @@ class VectorDatabase:
         )
         
         # Initialize embedding model
-        self.embedding_model = SentenceTransformer(self.settings.embedding_model)
+        self.embedding_model = load_embedding_model(self.settings)
         
         # Get or create collection
-        self.collection = self.client.get_or_create_collection(
-            name="food_items",
-            metadata={"description": "XJTLU canteen food items"}
+        self.collection = self._open_collection()
+        stored_model = (self.collection.metadata or {}).get("embedding_model")
+        if stored_model != self.settings.embedding_model and self.collection.count():
+            print(f"⚠️ Vector DB was embedded with {stored_model or 'Chroma default model'}, "
+                  f"not {self.settings.embedding_model}; re-run init_db.py to rebuild it")
+        
+        # In-process side store of decoded food items keyed by id
+        self._food_cache: Dict[str, FoodItem] = {}
+        
+        # BM25 index over the same documents, built on first use
+        self._lexical_index: Optional[BM25Index] = None
+        
+        # Menu version the cached foods and lexical index belong to
+        self._menu_version: Optional[str] = None
+    
+    def _open_collection(self):
+        """打开食物集合; 向量由本类的嵌入模型计算，不使用Chroma自带的嵌入函数."""
+        # get_or_create_collection would overwrite the stored metadata (embedding
+        # model, menu version) on open; the not-found error differs by Chroma version
+        try:
+            return self.client.get_collection("food_items", embedding_function=None)
+        except Exception:
+            return self.client.create_collection(
+                name="food_items",
+                embedding_function=None,
+                metadata={
+                    "description": "XJTLU canteen food items",
+                    "embedding_model": self.settings.embedding_model,
+                }
+            )
+    
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        """计算归一化的float32向量 (文档和查询共用，包括int8量化模型)."""
+        vectors = self.embedding_model.encode(
+            list(texts), convert_to_numpy=True, normalize_embeddings=True
         )
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+    
+    def _foods_from_results(
+        self, ids: List[str], metadatas: List[Dict[str, Any]]
+    ) -> List[FoodItem]:
+        """将查询结果转换为食物条目，优先使用内存缓存."""
+        foods = []
+        for food_id, metadata in zip(ids, metadatas):
+            food = self._food_cache.get(food_id)
+            if food is None:
+                food = _decode_food_metadata(metadata)
+                self._food_cache[food_id] = food
+            foods.append(food)
+        return foods
     
     def _create_food_document(self, food: FoodItem) -> str:
         """创建食物的文本表示用于嵌入."""
@@ -53,27 +212,53 @@ class VectorDatabase:
             doc += f"\n描述: {food.description}"
         return doc.strip()
     
+    def _food_phrases(self, food: FoodItem) -> List[str]:
+        """食物的完整字段值，用于精确匹配."""
+        return [
+            food.name, food.canteen, food.category,
+            *food.ingredients, *food.tags, *food.available_meals
+        ]
+    
+    @property
+    def lexical_index(self) -> BM25Index:
+        """BM25倒排索引，首次访问时由集合中的文档构建."""
+        if self._lexical_index is None:
+            index = BM25Index()
+            result = self.collection.get(include=["documents", "metadatas"])
+            if result['metadatas']:
+                foods = self._foods_from_results(result['ids'], result['metadatas'])
+                for food, document in zip(foods, result['documents']):
+                    index.add(food.id, document, self._food_phrases(food))
+            self._lexical_index = index
+        return self._lexical_index
+    
     def add_food_items(self, foods: List[FoodItem]) -> None:
-        """添加食物条目到向量数据库."""
+        """添加食物条目到向量数据库，ID已存在时替换 (与NumPy后端一致)."""
         if not foods:
             return
         
+        # add() would silently keep stored rows for existing ids while the caches
+        # took the new values; upsert keeps both in sync. Last duplicate wins.
+        foods = list({food.id: food for food in foods}.values())
         documents = [self._create_food_document(food) for food in foods]
-        metadatas = [food.model_dump() for food in foods]
+        metadatas = [_encode_food_metadata(food) for food in foods]
         ids = [food.id for food in foods]
         
-        # Convert metadata to JSON strings for nested objects
-        for metadata in metadatas:
-            metadata['nutrition'] = json.dumps(metadata['nutrition'])
-            metadata['ingredients'] = json.dumps(metadata['ingredients'])
-            metadata['tags'] = json.dumps(metadata['tags'])
-            metadata['available_meals'] = json.dumps(metadata['available_meals'])
-        
-        self.collection.add(
+        self.collection.upsert(
             documents=documents,
+            embeddings=self._embed(documents).tolist(),
             metadatas=metadatas,
             ids=ids
         )
+        
+        for food in foods:
+            self._food_cache[food.id] = food
+        self._store_menu_version()
+        
+        # Keep an already-built lexical index current
+        if self._lexical_index is not None:
+            for food, document in zip(foods, documents):
+                self._lexical_index.add(food.id, document, self._food_phrases(food))
     
     def search_foods(
         self,
@@ -82,63 +267,147 @@ class VectorDatabase:
         filters: Optional[Dict[str, Any]] = None
     ) -> List[FoodItem]:
         """根据查询搜索相关食物."""
-        where = filters if filters else None
+        return self.search_foods_many([query], n_results, filters)[0]
+    
+    def search_foods_many(
+        self,
+        queries: List[str],
+        n_results: int = 10,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> List[List[FoodItem]]:
+        """批量搜索，所有查询一次嵌入并在一次调用中完成."""
+        if not queries:
+            return []
         
-        results = self.collection.query(
-            query_texts=[query],
-            n_results=n_results,
-            where=where
-        )
+        where = filters if filters else None
         
-        if not results['metadatas'] or not results['metadatas'][0]:
-            return []
+        with span(
+            "vector_db.search", backend="chroma", queries=len(queries), n_results=n_results
+        ) as current:
+            with timed(STAGE_SECONDS, stage="embedding"), span("vector_db.embed"):
+                vectors = self._embed(queries)
+            results = self.collection.query(
+                query_embeddings=vectors.tolist(),
+                n_results=n_results,
+                where=where,
+                include=["metadatas"]
+            )
+            current.set_attribute("hits", sum(len(ids) for ids in results['ids']))
         
-        foods = []
-        for metadata in results['metadatas'][0]:
-            # Parse JSON strings back to objects
-            metadata['nutrition'] = json.loads(metadata['nutrition'])
-            metadata['ingredients'] = json.loads(metadata['ingredients'])
-            metadata['tags'] = json.loads(metadata['tags'])
-            metadata['available_meals'] = json.loads(metadata['available_meals'])
-            foods.append(FoodItem(**metadata))
+        if not results['metadatas']:
+            return [[] for _ in queries]
         
-        return foods
+        return [
+            self._foods_from_results(ids, metadatas or [])
+            for ids, metadatas in zip(results['ids'], results['metadatas'])
+        ]
+    
+    def lexical_search_many(
+        self,
+        queries: List[str],
+        n_results: int = 10
+    ) -> List[List[FoodItem]]:
+        """BM25关键词搜索，不需要嵌入模型."""
+        index = self.lexical_index
+        return [
+            self.get_foods_by_ids([food_id for food_id, _ in index.search(query, n_results)])
+            for query in queries
+        ]
+    
+    def is_exact_query(self, query: str) -> bool:
+        """查询是否完全由已知的菜名、食材、标签等组成."""
+        return self.lexical_index.is_exact_query(query)
     
     def get_food_by_id(self, food_id: str) -> Optional[FoodItem]:
         """根据ID获取食物."""
         try:
-            result = self.collection.get(ids=[food_id])
-            if result['metadatas']:
-                metadata = result['metadatas'][0]
-                metadata['nutrition'] = json.loads(metadata['nutrition'])
-                metadata['ingredients'] = json.loads(metadata['ingredients'])
-                metadata['tags'] = json.loads(metadata['tags'])
-                metadata['available_meals'] = json.loads(metadata['available_meals'])
-                return FoodItem(**metadata)
+            foods = self.get_foods_by_ids([food_id])
         except Exception:
             return None
-        return None
+        return foods[0] if foods else None
+    
+    def get_foods_by_ids(self, food_ids: List[str]) -> List[FoodItem]:
+        """根据ID批量获取食物，按输入顺序返回，跳过不存在的ID."""
+        missing = [
+            food_id for food_id in dict.fromkeys(food_ids)
+            if food_id not in self._food_cache
+        ]
+        if missing:
+            result = self.collection.get(ids=missing, include=["metadatas"])
+            if result['metadatas']:
+                self._foods_from_results(result['ids'], result['metadatas'])
+        
+        return [
+            self._food_cache[food_id] for food_id in food_ids
+            if food_id in self._food_cache
+        ]
+    
+    def get_all_foods(self) -> List[FoodItem]:
+        """获取数据库中的全部食物."""
+        result = self.collection.get(include=["metadatas"])
+        if not result['metadatas']:
+            return []
+        return self._foods_from_results(result['ids'], result['metadatas'])
     
     def clear_all(self) -> None:
         """清空数据库 (谨慎使用)."""
         self.client.delete_collection("food_items")
-        self.collection = self.client.get_or_create_collection(
-            name="food_items",
-            metadata={"description": "XJTLU canteen food items"}
-        )
+        self._food_cache.clear()
+        self._lexical_index = None
+        self.collection = self._open_collection()
+        self._store_menu_version()
     
     def count(self) -> int:
         """返回数据库中的食物数量."""
         return self.collection.count()
+    
+    def _hash_menu(self) -> str:
+        """全部食物按ID排序后的规范化JSON的哈希，内容不变则哈希不变."""
+        digest = hashlib.sha256()
+        for food in sorted(self.get_all_foods(), key=lambda food: food.id):
+            digest.update(json.dumps(
+                food.model_dump(), ensure_ascii=False, sort_keys=True
+            ).encode("utf-8"))
+            digest.update(b"\n")
+        return digest.hexdigest()[:16]
+    
+    def _store_menu_version(self) -> str:
+        """写入后计算菜单版本并存入集合元数据，其他进程 (如 init_db.py) 的写入也能被发现."""
+        version = self._hash_menu()
+        metadata = {**(self.collection.metadata or {}), "menu_version": version}
+        self.collection.modify(metadata=metadata)
+        self._menu_version = version
+        return version
+    
+    def menu_version(self) -> str:
+        """菜单版本 (食物内容的哈希)，菜单被其他进程修改后随之变化."""
+        collection = self._open_collection()
+        version = (collection.metadata or {}).get("menu_version")
+        if collection.id != self.collection.id or version != self._menu_version:
+            # Rewritten elsewhere (init_db.py recreates the collection): drop
+            # decoded foods and the lexical index built from the old menu
+            self.collection = collection
+            self._food_cache.clear()
+            self._lexical_index = None
+            self._menu_version = version
+        if version is None:
+            # Collections written before the version was stored
+            version = self._store_menu_version()
+        return version
+
+
+def _create_vector_db() -> VectorDatabase:
+    """按 vector_backend 创建向量数据库."""
+    if get_settings().vector_backend == "numpy":
+        from app.database.numpy_vector_db import NumpyVectorDatabase
+        return NumpyVectorDatabase()
+    return VectorDatabase()
 
 
 # Global instance
-_vector_db: Optional[VectorDatabase] = None
+_vector_db = Singleton("vector_db", _create_vector_db)
 
 
 def get_vector_db() -> VectorDatabase:
     """获取向量数据库单例."""
-    global _vector_db
-    if _vector_db is None:
-        _vector_db = VectorDatabase()
-    return _vector_db
+    return _vector_db.get()
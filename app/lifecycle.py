@@ -0,0 +1,140 @@
+"""Startup preloading and per-component readiness."""
+import asyncio
+import inspect
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app import registry
+
+
+@dataclass
+class ComponentStatus:
+    """单个组件的加载状态."""
+    state: str = "pending"  # pending / loading / ready / failed
+    seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+def _load_vector_db() -> None:
+    """打开向量数据库并完成首次查询所需的全部加载."""
+    from app.database import get_vector_db
+    vector_db = get_vector_db()
+    # Embedding model (used for documents and queries by both backends) and the index pages
+    vector_db.embedding_model
+    vector_db.search_foods("预热", n_results=1)
+    vector_db.lexical_index
+
+
+def _load_services() -> None:
+    """创建推荐链路上的服务单例 (RAG、DeepSeek客户端、口味画像)."""
+    from app.services import get_recommendation_service
+    get_recommendation_service()
+
+
+def _load_collaborative() -> None:
+    """加载协同过滤模型文件."""
+    from app.services.collaborative import get_cf_scorer
+    # Scoring no foods still loads the model file
+    get_cf_scorer().score("", [])
+
+
+# Loaded in order in a worker thread after startup
+PRELOAD_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("vector_db", _load_vector_db),
+    ("services", _load_services),
+    ("collaborative", _load_collaborative),
+]
+
+
+class Lifecycle:
+    """记录各组件的加载状态，并在后台预加载重量级组件."""
+    
+    def __init__(self):
+        """Initialize with no tracked components."""
+        self.components: Dict[str, ComponentStatus] = {}
+    
+    async def run(self, name: str, load: Callable[[], Any]) -> Any:
+        """加载一个组件并记录状态; 同步函数在线程中执行，失败时抛出异常."""
+        status = self.components.setdefault(name, ComponentStatus())
+        status.state = "loading"
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(load):
+                result = await load()
+            else:
+                result = await asyncio.to_thread(load)
+        except Exception as e:
+            status.state = "failed"
+            status.error = str(e)
+            raise
+        finally:
+            status.seconds = round(time.perf_counter() - started, 3)
+        status.state = "ready"
+        return result
+    
+    async def preload(self, steps: Optional[List[Tuple[str, Callable[[], None]]]] = None) -> None:
+        """按顺序预加载组件; 单个组件失败不影响其余组件，首次请求时会再次尝试加载."""
+        steps = PRELOAD_STEPS if steps is None else steps
+        for name, _ in steps:
+            self.components.setdefault(name, ComponentStatus())
+        
+        for name, load in steps:
+            try:
+                await self.run(name, load)
+                print(f"✅ Preloaded {name} ({self.components[name].seconds}s)")
+            except Exception as e:
+                print(f"⚠️ Preloading {name} failed: {e}")
+    
+    def start_preload(
+        self, steps: Optional[List[Tuple[str, Callable[[], None]]]] = None
+    ) -> asyncio.Task:
+        """登记组件并在后台开始预加载; 登记是同步的，/ready 立即报告未就绪."""
+        steps = PRELOAD_STEPS if steps is None else steps
+        for name, _ in steps:
+            self.components.setdefault(name, ComponentStatus())
+        return asyncio.create_task(self.preload(steps))
+    
+    async def shutdown(self, tasks: List[asyncio.Task]) -> List[str]:
+        """停止后台任务，再按创建的逆序关闭单例，返回关闭顺序.
+        
+        用户数据库最先创建、最后关闭: 关闭时写完缓冲中的饮食历史 (口味画像回调
+        仍可使用其他服务)，再释放连接池; DeepSeek 等后创建的HTTP客户端先关闭。
+        """
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return await registry.close_all()
+    
+    @property
+    def ready(self) -> bool:
+        """所有已登记的组件都加载完成."""
+        return all(status.state == "ready" for status in self.components.values())
+    
+    def report(self) -> Dict[str, Any]:
+        """就绪状态报告."""
+        states = {status.state for status in self.components.values()}
+        if self.ready:
+            overall = "ready"
+        elif "failed" in states:
+            overall = "degraded"
+        else:
+            overall = "loading"
+        return {
+            "status": overall,
+            "components": {
+                name: {k: v for k, v in vars(status).items() if v is not None}
+                for name, status in self.components.items()
+            },
+        }
+
+
+# Global instance
+_lifecycle: Optional[Lifecycle] = None
+
+
+def get_lifecycle() -> Lifecycle:
+    """获取生命周期管理单例."""
+    global _lifecycle
+    if _lifecycle is None:
+        _lifecycle = Lifecycle()
+    return _lifecycle
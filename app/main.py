@@ -1,19 +1,27 @@
 """FastAPI main application."""
-from fastapi import FastAPI
+import asyncio
+from typing import Optional
+from fastapi import FastAPI, Header, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
 from pathlib import Path
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
 from app.config import get_settings
-from app.api import recommend_router, user_router, chat_router
+from app.api import recommend_router, user_router, chat_router, foods_router, admin_router
 from app.database import get_user_db
+from app.lifecycle import get_lifecycle
+from app.metrics import REGISTRY, MetricsMiddleware
+from app.profiling import RequestProfilerMiddleware
+from app.responses import CompressionMiddleware, FastJSONResponse, etag_matches
+from app.static_assets import REVALIDATE_CACHE_CONTROL, HashedStaticFiles, StaticAssets
+from app.services import get_warmup_service, get_taste_profile_service
 
 
 # Create FastAPI app
 app = FastAPI(
     title="XJTLU Food Recommendation API",
     description="AI-powered food recommendation system for XJTLU students",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
 
@@ -24,14 +32,35 @@ async def startup_event():
     print(f"🚀 Starting {settings.app_name} v{settings.app_version}")
     
     # Initialize databases
-    user_db = await get_user_db()
+    lifecycle = get_lifecycle()
+    user_db = await lifecycle.run("user_db", get_user_db)
     print("✅ Database initialized")
+    
+    # Keep taste profiles current as food history is written
+    await get_taste_profile_service().attach(user_db)
+    
+    # Load the embedding model, vector index and services off the request path
+    if settings.preload_enabled:
+        app.state.preload_task = lifecycle.start_preload()
+    
+    # Schedule cache warmup before meal peaks
+    if settings.warmup_enabled:
+        app.state.warmup_task = asyncio.create_task(get_warmup_service().run_forever())
+        print(f"🔥 Warmup scheduled: {settings.warmup_schedule}")
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Application shutdown event."""
     print("👋 Shutting down...")
+    
+    tasks = [
+        task for task in (
+            getattr(app.state, "preload_task", None), getattr(app.state, "warmup_task", None)
+        ) if task
+    ]
+    closed = await get_lifecycle().shutdown(tasks)
+    print(f"✅ Closed {', '.join(closed) or 'nothing'}")
 
 # Configure CORS
 app.add_middleware(
@@ -40,25 +69,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Menu-Version"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(RequestProfilerMiddleware)
 
 # Include routers
 app.include_router(recommend_router)
 app.include_router(user_router)
 app.include_router(chat_router)
+app.include_router(foods_router)
+app.include_router(admin_router)
 
-# Mount static files
+# Mount static files (content-hashed URLs are cached as immutable)
 static_path = Path(__file__).parent.parent / "static"
+static_assets = StaticAssets(static_path)
 if static_path.exists():
-    app.mount("/static", StaticFiles(directory=str(static_path)), name="static")
+    app.mount("/static", HashedStaticFiles(static_assets), name="static")
 
 
 @app.get("/")
-async def root():
-    """Root endpoint - serve the frontend."""
-    static_file = Path(__file__).parent.parent / "static" / "index.html"
-    if static_file.exists():
-        return FileResponse(static_file)
+async def root(if_none_match: Optional[str] = Header(None)):
+    """Root endpoint - serve the frontend with hashed asset URLs."""
+    page = static_assets.render_page("index.html")
+    if page is not None:
+        body, etag = page
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(body, headers=headers)
     return {
         "message": "🍜 XJTLU Food Recommendation API",
         "version": "1.0.0",
@@ -78,3 +118,20 @@ async def health():
         "version": settings.app_version
     }
 
+
+@app.get("/ready")
+async def ready():
+    """Readiness check - 503 until every preloaded component has loaded."""
+    lifecycle = get_lifecycle()
+    return JSONResponse(
+        status_code=200 if lifecycle.ready else 503,
+        content=lifecycle.report()
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: stage, LLM, database and HTTP latencies, cache hit rates."""
+    if not get_settings().metrics_enabled:
+        raise HTTPException(status_code=404, detail="指标未启用")
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,271 @@
+"""Low-overhead in-process metrics exported in the Prometheus text format."""
+import bisect
+import random
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from app.config import get_settings
+
+# Latency buckets (seconds), from sub-millisecond stages up to LLM calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+Labels = Tuple[str, ...]
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [
+        f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for name, value in zip(names, values)
+    ]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    """单调递增计数器."""
+    
+    type = "counter"
+    
+    def __init__(self, name: str, documentation: str, labelnames: Labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Labels, float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        """增加计数."""
+        key = tuple(labels[name] for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def value(self, **labels: str) -> float:
+        """当前计数 (主要用于测试)."""
+        return self._values.get(tuple(labels[name] for name in self.labelnames), 0.0)
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram:
+    """固定分桶的直方图."""
+    
+    type = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Labels = (),
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Per label set: [bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, weight: float = 1.0, **labels: str) -> None:
+        """记录一个观测值; 抽样时 weight 为 1/采样率."""
+        key = tuple(labels[name] for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[index] += weight
+            row[-1] += value * weight
+    
+    def count(self, **labels: str) -> float:
+        """观测次数 (主要用于测试)."""
+        row = self._values.get(tuple(labels[name] for name in self.labelnames))
+        return sum(row[:-1]) if row else 0.0
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(row)) for key, row in self._values.items()]
+        lines = []
+        for key, row in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = _format_labels(self.labelnames + ("le",), key + (le,))
+                lines.append(f"{self.name}_bucket{labels} {_format_value(cumulative)}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(row[-1])}")
+            lines.append(f"{self.name}_count{labels} {_format_value(cumulative)}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表，渲染为 Prometheus 文本格式."""
+    
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._metrics: List[Any] = []
+        self._caches: Dict[str, Any] = {}
+    
+    def counter(self, name: str, documentation: str, labelnames: Labels = ()) -> Counter:
+        """创建并注册计数器."""
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+    
+    def histogram(self, name: str, documentation: str, labelnames: Labels = ()) -> Histogram:
+        """创建并注册直方图."""
+        metric = Histogram(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+    
+    def register_cache(self, name: str, cache: Any) -> None:
+        """登记一个 TTLCache，导出其命中、未命中、淘汰次数和大小; 同名缓存以最新的为准."""
+        self._caches[name] = cache
+    
+    def _render_caches(self) -> List[str]:
+        stats = {name: cache.stats() for name, cache in self._caches.items()}
+        families = [
+            ("cache_hits_total", "counter", "Cache lookups that found a live entry", "hits"),
+            ("cache_misses_total", "counter", "Cache lookups that missed or expired", "misses"),
+            ("cache_evictions_total", "counter", "Entries evicted by the LRU bound", "evictions"),
+            ("cache_entries", "gauge", "Entries currently cached", "size"),
+            ("cache_hit_ratio", "gauge", "Hits / lookups since process start", "hit_rate"),
+        ]
+        lines = []
+        for name, kind, documentation, field in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(
+                f"{name}{_format_labels(('cache',), (cache,))} {_format_value(values[field])}"
+                for cache, values in stats.items()
+            )
+        return lines
+    
+    def render(self) -> str:
+        """渲染全部指标."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        if self._caches:
+            lines.extend(self._render_caches())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "pipeline_stage_duration_seconds", "Time spent in each recommendation pipeline stage",
+    ("stage",)
+)
+LLM_SECONDS = REGISTRY.histogram(
+    "llm_request_duration_seconds", "DeepSeek completion latency", ("operation",)
+)
+LLM_REQUESTS = REGISTRY.counter(
+    "llm_requests_total", "DeepSeek completion requests", ("operation", "status")
+)
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported in the completion usage field", ("operation", "kind")
+)
+DB_SECONDS = REGISTRY.histogram(
+    "db_operation_duration_seconds", "User database operation latency", ("operation",)
+)
+HTTP_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+)
+
+
+class _Timer:
+    """抽样计时器; 未抽中时只有一次随机数开销."""
+    
+    __slots__ = ("histogram", "labels", "weight", "started")
+    
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        rate = get_settings().metrics_sample_rate if get_settings().metrics_enabled else 0.0
+        sampled = rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+        self.weight = 1.0 / rate if sampled else 0.0
+    
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        if self.weight:
+            self.histogram.observe(
+                time.perf_counter() - self.started, weight=self.weight, **self.labels
+            )
+
+
+def timed(histogram: Histogram, **labels: str) -> _Timer:
+    """计时一个代码块: ``with timed(STAGE_SECONDS, stage="rank"): ...``."""
+    return _Timer(histogram, labels)
+
+
+def timed_operation(histogram: Histogram, operation: Optional[str] = None) -> Callable:
+    """计时异步方法，operation 标签默认为方法名."""
+    def decorate(func: Callable) -> Callable:
+        label = operation or func.__name__.lstrip("_")
+        
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with _Timer(histogram, {"operation": label}):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_llm_usage(operation: str, usage: Optional[Any]) -> None:
+    """记录补全响应 usage 字段中的token数."""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        tokens = getattr(usage, kind, None)
+        if tokens:
+            LLM_TOKENS.inc(tokens, operation=operation, kind=kind.split("_")[0])
+
+
+class MetricsMiddleware:
+    """ASGI中间件，按路由模板记录HTTP请求耗时 (避免路径参数导致标签过多)."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not get_settings().metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+        
+        started = time.perf_counter()
+        status = 500
+        
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "other")
+            HTTP_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"], route=route, status=str(status)
+            )
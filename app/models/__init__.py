@@ -1,14 +1,23 @@
 """Models package."""
-from .food import FoodItem, NutritionInfo, FoodRecommendation
-from .user import User, UserPreferences, FoodHistory, RecommendationRequest, FitnessGoal
+from .food import FoodItem, NutritionInfo, FoodRecommendation, DailyMealPlan, BatchRecommendationResult
+from .user import (
+    User, UserPreferences, FoodHistory, RecommendationRequest, DailyPlanRequest,
+    BatchRecommendationRequest, FitnessGoal, MealMacros, TasteProfile
+)
 
 __all__ = [
     "FoodItem",
     "NutritionInfo", 
     "FoodRecommendation",
+    "DailyMealPlan",
+    "BatchRecommendationResult",
     "User",
     "UserPreferences",
     "FoodHistory",
     "RecommendationRequest",
+    "DailyPlanRequest",
+    "BatchRecommendationRequest",
     "FitnessGoal",
+    "MealMacros",
+    "TasteProfile",
 ]
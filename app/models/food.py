@@ -1,5 +1,5 @@
 """Data models for food items."""
-from typing import Optional, List
+from typing import Optional, List, Dict
 from pydantic import BaseModel, Field
 
 
@@ -33,3 +33,18 @@ class FoodRecommendation(BaseModel):
     total_nutrition: NutritionInfo = Field(..., description="总营养信息")
     reasoning: str = Field(..., description="推荐理由")
     tips: Optional[str] = Field(None, description="饮食建议")
+
+
+class DailyMealPlan(BaseModel):
+    """每日餐食计划."""
+    meals: Dict[str, FoodRecommendation] = Field(..., description="各餐次的推荐")
+    total_nutrition: NutritionInfo = Field(..., description="全天总营养信息")
+    reasoning: str = Field(..., description="推荐理由")
+    tips: Optional[str] = Field(None, description="饮食建议")
+
+
+class BatchRecommendationResult(BaseModel):
+    """批量推荐中单个用户的结果."""
+    user_id: str = Field(..., description="用户ID")
+    recommendation: Optional[FoodRecommendation] = Field(None, description="推荐结果")
+    error: Optional[str] = Field(None, description="失败原因")
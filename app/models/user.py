@@ -1,7 +1,7 @@
 """Data models for users."""
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
 from enum import Enum
 
 
@@ -35,6 +35,27 @@ class FoodHistory(BaseModel):
     notes: Optional[str] = Field(None, description="备注")
 
 
+class MealMacros(BaseModel):
+    """某餐次的平均营养摄入."""
+    count: int = 0
+    calories: float = 0.0
+    protein: float = 0.0
+    carbs: float = 0.0
+    fat: float = 0.0
+
+
+class TasteProfile(BaseModel):
+    """由饮食历史增量维护的用户口味画像."""
+    user_id: str
+    history_count: int = Field(0, description="已计入的历史记录数")
+    tag_affinity: Dict[str, float] = Field(default_factory=dict, description="按评分加权的标签偏好")
+    ingredient_affinity: Dict[str, float] = Field(default_factory=dict, description="按评分加权的食材偏好")
+    canteen_counts: Dict[str, int] = Field(default_factory=dict, description="各食堂就餐次数")
+    meal_macros: Dict[str, MealMacros] = Field(default_factory=dict, description="各餐次平均营养摄入")
+    recent_food_ids: List[str] = Field(default_factory=list, description="最近吃过的食物ID，最新在前")
+    updated_at: datetime = Field(default_factory=datetime.now)
+
+
 class User(BaseModel):
     """用户模型."""
     user_id: str = Field(..., description="用户唯一标识")
@@ -50,3 +71,30 @@ class RecommendationRequest(BaseModel):
     meal_type: str = Field(..., description="餐次 (早餐/午餐/晚餐)")
     preferences: Optional[UserPreferences] = Field(None, description="临时偏好设置")
     custom_requirements: Optional[str] = Field(None, description="自定义要求")
+
+
+class DailyPlanRequest(BaseModel):
+    """每日餐食计划请求模型."""
+    user_id: str = Field(..., description="用户ID")
+    meal_types: List[str] = Field(
+        default_factory=lambda: ["早餐", "午餐", "晚餐"],
+        min_length=1, max_length=5, description="需要规划的餐次"
+    )
+    preferences: Optional[UserPreferences] = Field(None, description="临时偏好设置")
+    custom_requirements: Optional[str] = Field(None, description="自定义要求")
+    
+    @field_validator("meal_types")
+    @classmethod
+    def _dedupe_meal_types(cls, meal_types: List[str]) -> List[str]:
+        """去除空白和重复的餐次，保持顺序."""
+        meal_types = list(dict.fromkeys(meal.strip() for meal in meal_types if meal.strip()))
+        if not meal_types:
+            raise ValueError("至少需要一个餐次")
+        return meal_types
+
+
+class BatchRecommendationRequest(BaseModel):
+    """批量推荐请求模型."""
+    user_ids: List[str] = Field(..., min_length=1, max_length=1000, description="用户ID列表")
+    meal_type: str = Field(..., description="餐次 (早餐/午餐/晚餐)")
+    custom_requirements: Optional[str] = Field(None, description="自定义要求")
@@ -0,0 +1,222 @@
+"""On-demand profiling for production hot-path analysis.
+
+Two tools, both off unless ``profiling_enabled`` is set and the caller
+sends the admin token in ``X-Admin-Token``:
+
+- a sampling profiler: a background thread reads every thread's Python
+  stack (``sys._current_frames``) at a fixed interval for a bounded time
+  and counts identical stacks. The profiled code is not instrumented, so
+  the overhead is one stack walk per thread per interval. Results are in
+  the collapsed-stack format read by flamegraph.pl, speedscope and
+  inferno (``thread;outer;...;inner count`` per line);
+- single-request cProfile: a request with ``X-Profile`` runs under
+  cProfile and the response body is replaced by the pstats report. The
+  profiler hooks the event loop thread, so work of concurrent requests on
+  the loop is included and work offloaded to other threads is not.
+"""
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Optional
+from app.config import get_settings
+from app.registry import Singleton
+
+# Leaf frames of threads waiting for work (event loop select, idle pool
+# workers, condition waits); dropped unless idle samples are requested
+_IDLE_LEAVES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+}
+_PSTATS_SORT_KEYS = {"cumulative", "tottime", "calls", "ncalls", "time"}
+
+
+def check_admin_token(token: Optional[str]) -> bool:
+    """校验管理员令牌; 未配置令牌时一律拒绝."""
+    expected = get_settings().profiling_admin_token
+    if not expected or not token:
+        return False
+    return hmac.compare_digest(token.encode(), expected.encode())
+
+
+def _frame_label(code) -> str:
+    """栈帧名: 函数名 (父目录/文件:首行)，同一函数的不同行合并."""
+    path = code.co_filename
+    short = os.path.join(os.path.basename(os.path.dirname(path)), os.path.basename(path))
+    return f"{code.co_name} ({short}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    """定时采样所有线程调用栈的低开销分析器."""
+    
+    def __init__(self, interval: float = 0.01, max_depth: int = 128):
+        self.interval = interval
+        self.max_depth = max_depth
+        self._stacks: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.stopped_at: Optional[float] = None
+        self.include_idle = False
+    
+    @property
+    def running(self) -> bool:
+        """是否正在采样."""
+        return self._thread is not None and self._thread.is_alive()
+    
+    def start(self, seconds: float, include_idle: bool = False) -> None:
+        """开始采样，最多持续 seconds 秒 (上一次的结果被清除)."""
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+        self.include_idle = include_idle
+        self.started_at, self.stopped_at = time.time(), None
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(time.monotonic() + seconds,), name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+    
+    def stop(self) -> None:
+        """停止采样并等待采样线程退出."""
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+    
+    def _run(self, deadline: float) -> None:
+        own = threading.get_ident()
+        try:
+            while time.monotonic() < deadline and not self._stop.wait(self.interval):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    if not self.include_idle and (
+                        (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name) in _IDLE_LEAVES
+                    ):
+                        continue
+                    stack = []
+                    while frame is not None and len(stack) < self.max_depth:
+                        stack.append(_frame_label(frame.f_code))
+                        frame = frame.f_back
+                    stack.append(names.get(ident, f"thread-{ident}").replace(";", ":"))
+                    key = ";".join(reversed(stack))
+                    with self._lock:
+                        self._stacks[key] += 1
+                with self._lock:
+                    self.samples += 1
+        finally:
+            self.stopped_at = time.time()
+    
+    def collapsed(self) -> str:
+        """折叠栈格式的结果 (可直接用于 flamegraph.pl / speedscope)."""
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+    
+    def status(self) -> Dict[str, Any]:
+        """当前状态."""
+        with self._lock:
+            stacks = len(self._stacks)
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "include_idle": self.include_idle,
+            "samples": self.samples,
+            "stacks": stacks,
+            "started_at": self.started_at,
+            "stopped_at": self.stopped_at,
+        }
+
+
+_profiler = Singleton(
+    "profiler",
+    lambda: SamplingProfiler(interval=get_settings().profiling_interval_ms / 1000),
+    close=SamplingProfiler.stop
+)
+
+
+def get_profiler() -> SamplingProfiler:
+    """获取采样分析器单例."""
+    return _profiler.get()
+
+
+class RequestProfilerMiddleware:
+    """ASGI中间件: 带 X-Profile 和有效管理员令牌的请求在cProfile下运行，返回pstats报告."""
+    
+    def __init__(self, app):
+        self.app = app
+        # cProfile hooks the whole thread; only one request can own it
+        self._busy = threading.Lock()
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not get_settings().profiling_enabled:
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        sort_key = headers.get(b"x-profile")
+        if sort_key is None or not check_admin_token(headers.get(b"x-admin-token", b"").decode()):
+            await self.app(scope, receive, send)
+            return
+        sort_key = sort_key.decode()
+        if sort_key not in _PSTATS_SORT_KEYS:
+            sort_key = "cumulative"
+        
+        if not self._busy.acquire(blocking=False):
+            await self._respond(
+                send, 409, "application/json",
+                json.dumps({"detail": "已有请求正在分析"}, ensure_ascii=False), None
+            )
+            return
+        
+        status = 500
+        
+        async def capture(message):
+            # Only the status is kept; the body is replaced by the report
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+        
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                await self.app(scope, receive, capture)
+            finally:
+                profile.disable()
+        finally:
+            self._busy.release()
+        elapsed = time.perf_counter() - started
+        
+        report = io.StringIO()
+        report.write(f"{scope['method']} {scope['path']} -> {status} in {elapsed * 1000:.1f}ms\n\n")
+        pstats.Stats(profile, stream=report).sort_stats(sort_key).print_stats(
+            get_settings().profiling_report_lines
+        )
+        await self._respond(send, 200, "text/plain; charset=utf-8", report.getvalue(), status)
+    
+    @staticmethod
+    async def _respond(send, status: int, content_type: str, body: str, profiled: Optional[int]):
+        data = body.encode("utf-8")
+        headers = [
+            (b"content-type", content_type.encode()),
+            (b"content-length", str(len(data)).encode()),
+        ]
+        if profiled is not None:
+            headers.append((b"x-profiled-status", str(profiled).encode()))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": data})
@@ -0,0 +1,124 @@
+"""Process-wide singletons with guarded one-time initialization and ordered shutdown."""
+import asyncio
+import inspect
+import threading
+from typing import Any, Awaitable, Callable, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Instances in the order they finished initializing; closed in reverse, so
+# a service is closed before the resources it was built on
+_created: List["_Slot"] = []
+_created_lock = threading.Lock()
+
+# Bound on shutdown passes, in case closing resources keeps recreating each other
+_CLOSE_PASSES = 3
+
+
+class _Slot(Generic[T]):
+    """单例实例及其关闭方法."""
+    
+    def __init__(self, name: str, close: Optional[Callable[[T], Any]] = None):
+        self.name = name
+        self._close = close
+        self._instance: Optional[T] = None
+    
+    def _set(self, instance: T) -> T:
+        self._instance = instance
+        with _created_lock:
+            _created.append(self)
+        return instance
+    
+    def peek(self) -> Optional[T]:
+        """已创建的实例，未创建时返回None (不会触发创建)."""
+        return self._instance
+    
+    async def close(self) -> None:
+        """关闭并清除实例."""
+        instance, self._instance = self._instance, None
+        with _created_lock:
+            if self in _created:
+                _created.remove(self)
+        if instance is not None and self._close is not None:
+            result = self._close(instance)
+            if inspect.isawaitable(result):
+                await result
+
+
+class Singleton(_Slot[T]):
+    """线程安全的惰性单例: 并发的首次调用 (请求线程池、预加载线程) 只创建一次."""
+    
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[], T],
+        close: Optional[Callable[[T], Any]] = None
+    ):
+        super().__init__(name, close)
+        self._factory = factory
+        self._lock = threading.Lock()
+    
+    def get(self) -> T:
+        """获取实例，首次调用时创建."""
+        instance = self._instance
+        if instance is None:
+            with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._set(self._factory())
+        return instance
+
+
+class AsyncSingleton(_Slot[T]):
+    """异步初始化的惰性单例，由 asyncio.Lock 保证只初始化一次."""
+    
+    def __init__(
+        self,
+        name: str,
+        factory: Callable[[], Awaitable[T]],
+        close: Optional[Callable[[T], Any]] = None
+    ):
+        super().__init__(name, close)
+        self._factory = factory
+        self._lock: Optional[asyncio.Lock] = None
+    
+    async def get(self) -> T:
+        """获取实例，首次调用时创建."""
+        instance = self._instance
+        if instance is None:
+            # Created on first use so it belongs to the running loop
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                instance = self._instance
+                if instance is None:
+                    instance = self._set(await self._factory())
+        return instance
+    
+    async def close(self) -> None:
+        """关闭并清除实例."""
+        await super().close()
+        self._lock = None
+
+
+async def close_all() -> List[str]:
+    """按创建的逆序关闭有关闭方法的单例，返回关闭顺序.
+    
+    没有关闭方法的单例保持可用，后关闭的资源 (例如写完缓冲时的回调) 仍可使用它们。
+    """
+    closed = []
+    # Draining a resource can recreate one closed before it (spans emitted
+    # while the history buffer flushes bring the tracer back), so repeat
+    # until nothing new was created
+    for _ in range(_CLOSE_PASSES):
+        with _created_lock:
+            slots = [slot for slot in reversed(_created) if slot._close is not None]
+        if not slots:
+            break
+        for slot in slots:
+            try:
+                await slot.close()
+            except Exception as e:
+                print(f"⚠️ Closing {slot.name} failed: {e}")
+            closed.append(slot.name)
+    return closed
@@ -0,0 +1,224 @@
+"""Response encoding: fast JSON, compression and field projection.
+
+- ``FastJSONResponse`` serializes with orjson when it is installed (falls
+  back to the standard library encoder) and is the app's default response
+  class;
+- ``CompressionMiddleware`` compresses compressible responses above a size
+  threshold with brotli (when installed and accepted) or gzip. Streaming
+  responses are flushed per chunk so NDJSON lines are not held back;
+- ``field_selector`` / ``project`` implement the ``fields=`` query
+  parameter on list endpoints, so clients can ask for slim payloads;
+- ``etag_matches`` compares ``If-None-Match`` with a response's ETag for
+  conditional GETs answered with 304.
+"""
+import zlib
+from functools import lru_cache
+from typing import Callable, Iterable, List, Optional, Set, Type
+from fastapi import HTTPException, Query
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+from starlette.datastructures import MutableHeaders
+from app.config import get_settings
+
+# For URLs whose content never changes (content hash or version in the URL)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_COMPRESSIBLE_TYPES = {
+    "application/json", "application/x-ndjson", "application/javascript",
+    "application/xml", "image/svg+xml",
+}
+
+
+def _fast_json_response() -> Type[JSONResponse]:
+    """orjson 可用时使用 ORJSONResponse，否则回退到标准库 json."""
+    try:
+        import orjson  # noqa: F401
+    except ImportError:
+        return JSONResponse
+    return ORJSONResponse
+
+
+FastJSONResponse = _fast_json_response()
+
+
+@lru_cache(maxsize=1)
+def brotli_available() -> bool:
+    """是否安装了 brotli."""
+    try:
+        import brotli  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """根据 Accept-Encoding 选择压缩算法 (优先br)，都不接受时返回None."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    
+    wildcard = accepted.get("*", 0.0)
+    if brotli_available() and accepted.get("br", wildcard) > 0:
+        return "br"
+    if accepted.get("gzip", wildcard) > 0:
+        return "gzip"
+    return None
+
+
+def _compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return (
+        media_type.startswith("text/")
+        or media_type in _COMPRESSIBLE_TYPES
+        or media_type.endswith("+json")
+    )
+
+
+class _GzipEncoder:
+    """gzip 增量压缩."""
+    
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+    
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliEncoder:
+    """brotli 增量压缩."""
+    
+    def __init__(self, quality: int):
+        import brotli
+        self._compressor = brotli.Compressor(quality=quality)
+    
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+    
+    def flush(self) -> bytes:
+        return self._compressor.flush()
+    
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """ASGI中间件: 按客户端支持的编码压缩超过阈值的文本类响应."""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        settings = get_settings()
+        if scope["type"] != "http" or not settings.compression_enabled:
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1")
+        encoding = choose_encoding(accept_encoding) if accept_encoding else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        
+        start = None
+        encoder = None
+        passthrough = False
+        
+        async def send_compressed(message):
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+            
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                headers = MutableHeaders(raw=start["headers"])
+                eligible = (
+                    start["status"] not in (204, 304)
+                    and "content-encoding" not in headers
+                    and _compressible(headers.get("content-type", ""))
+                )
+                if eligible:
+                    headers.add_vary_header("Accept-Encoding")
+                if not eligible or (not more_body and len(body) < settings.compression_minimum_size):
+                    passthrough = True
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                
+                encoder = (
+                    _BrotliEncoder(settings.compression_brotli_quality) if encoding == "br"
+                    else _GzipEncoder(settings.compression_gzip_level)
+                )
+                headers["Content-Encoding"] = encoding
+                if not more_body:
+                    data = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(data))
+                    await send(start)
+                    start = None
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                # Streamed: length unknown until the end, send chunked
+                if "content-length" in headers:
+                    del headers["Content-Length"]
+                await send(start)
+                start = None
+            
+            # Flush every chunk so streamed lines reach the client promptly
+            data = encoder.compress(body) + (encoder.flush() if more_body else encoder.finish())
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+        
+        await self.app(scope, receive, send_compressed)
+
+
+def field_selector(model: Type[BaseModel]) -> Callable[..., Optional[Set[str]]]:
+    """创建 fields= 查询参数的依赖: 逗号分隔的字段名，未知字段返回400."""
+    known = set(model.model_fields)
+    
+    def select_fields(
+        fields: Optional[str] = Query(None, description="只返回这些字段，逗号分隔，例如 id,name,price")
+    ) -> Optional[Set[str]]:
+        if not fields:
+            return None
+        selected = {name.strip() for name in fields.split(",") if name.strip()}
+        unknown = selected - known
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"未知字段: {', '.join(sorted(unknown))}")
+        return selected or None
+    
+    return select_fields
+
+
+def project(items: Iterable[BaseModel], fields: Set[str]) -> List[dict]:
+    """只保留选中字段的可序列化字典."""
+    return [item.model_dump(mode="json", include=fields) for item in items]
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否包含该ETag (弱比较，压缩后的响应也能命中)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == target for tag in if_none_match.split(","))
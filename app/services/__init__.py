@@ -2,6 +2,8 @@
 from .deepseek_service import DeepSeekService, get_deepseek_service
 from .rag_service import RAGService, get_rag_service
 from .recommendation import RecommendationService, get_recommendation_service
+from .warmup import WarmupService, get_warmup_service
+from .taste_profile import TasteProfileService, get_taste_profile_service
 
 __all__ = [
     "DeepSeekService",
@@ -10,4 +12,8 @@ __all__ = [
     "get_rag_service",
     "RecommendationService",
     "get_recommendation_service",
+    "WarmupService",
+    "get_warmup_service",
+    "TasteProfileService",
+    "get_taste_profile_service",
 ]
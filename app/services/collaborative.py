@@ -0,0 +1,256 @@
+"""Collaborative filtering over food history ratings (implicit ALS)."""
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from app.config import get_settings
+from app.registry import Singleton
+
+if TYPE_CHECKING:
+    # Only training needs scipy; online scoring is plain numpy
+    from scipy import sparse
+
+# Seconds between checks for a newer model file on disk
+_RELOAD_CHECK_INTERVAL = 60.0
+
+# Max elements of the precomputed (n, k, k) outer products of the fixed side
+_OUTER_BUDGET = 1 << 24
+
+# Rows per batched solve, bounding the (rows, k, k) working set
+_SOLVE_CHUNK = 4096
+
+
+def rating_confidence(rating: Optional[int]) -> Tuple[float, float]:
+    """将评分转换为 (偏好, 置信度): 低分是有把握的负反馈，未评分是较弱的正反馈."""
+    if rating is None:
+        return 1.0, 1.0
+    if rating >= 3:
+        return 1.0, float(rating - 1)
+    return 0.0, float(4 - rating)
+
+
+def build_rating_matrix(
+    rows: Iterable[Tuple[str, str, Optional[int]]]
+) -> Tuple["sparse.csr_matrix", "sparse.csr_matrix", List[str], List[str]]:
+    """由 (user_id, food_id, rating) 构建偏好矩阵和置信度矩阵 (稀疏结构相同)."""
+    from scipy import sparse
+    
+    user_index: Dict[str, int] = {}
+    item_index: Dict[str, int] = {}
+    cells: Dict[Tuple[int, int], List[float]] = {}
+    
+    for user_id, food_id, rating in rows:
+        preference, confidence = rating_confidence(rating)
+        key = (
+            user_index.setdefault(user_id, len(user_index)),
+            item_index.setdefault(food_id, len(item_index))
+        )
+        # Repeat meals add confidence; the pair is preferred if any rating was positive
+        cell = cells.setdefault(key, [0.0, 0.0])
+        cell[0] = max(cell[0], preference)
+        cell[1] += confidence
+    
+    shape = (len(user_index), len(item_index))
+    if not cells:
+        empty = sparse.csr_matrix(shape, dtype=np.float32)
+        return empty, empty.copy(), [], []
+    
+    keys = np.array(list(cells), dtype=np.int64)
+    values = np.array(list(cells.values()), dtype=np.float32)
+    order = np.lexsort((keys[:, 1], keys[:, 0]))
+    keys, values = keys[order], values[order]
+    
+    indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys[:, 0], minlength=shape[0]), out=indptr[1:])
+    preference = sparse.csr_matrix((values[:, 0], keys[:, 1], indptr), shape=shape)
+    confidence = sparse.csr_matrix((values[:, 1], keys[:, 1], indptr), shape=shape)
+    return preference, confidence, list(user_index), list(item_index)
+
+
+def _transpose_pair(
+    preference: "sparse.csr_matrix", confidence: "sparse.csr_matrix"
+) -> Tuple["sparse.csr_matrix", "sparse.csr_matrix"]:
+    """转置两个结构相同的矩阵，保留偏好为0的元素."""
+    from scipy import sparse
+    
+    # Transpose entry positions (never zero) and gather both value arrays through them
+    positions = sparse.csr_matrix(
+        (np.arange(1, confidence.nnz + 1), confidence.indices, confidence.indptr),
+        shape=confidence.shape
+    ).T.tocsr()
+    positions.sort_indices()
+    order = positions.data - 1
+    structure = (positions.indices, positions.indptr)
+    shape = positions.shape
+    return (
+        sparse.csr_matrix((preference.data[order], *structure), shape=shape),
+        sparse.csr_matrix((confidence.data[order], *structure), shape=shape),
+    )
+
+
+def _solve_side(
+    fixed: np.ndarray,
+    preference: "sparse.csr_matrix",
+    confidence: "sparse.csr_matrix",
+    regularization: float,
+    alpha: float
+) -> np.ndarray:
+    """固定一侧因子，批量求解另一侧每一行的加权最小二乘问题."""
+    from scipy import sparse
+    
+    n_rows, factors = preference.shape[0], fixed.shape[1]
+    gram = fixed.T @ fixed + regularization * np.eye(factors, dtype=fixed.dtype)
+    
+    # A_u = Y^T Y + Y^T (C_u - I) Y + λI and b_u = Y^T C_u p_u for every row u
+    weight = (alpha * confidence.data).astype(fixed.dtype)
+    structure = (confidence.indices, confidence.indptr)
+    weights = sparse.csr_matrix((weight, *structure), shape=confidence.shape)
+    targets = sparse.csr_matrix(
+        (preference.data * (1 + weight), *structure), shape=confidence.shape
+    )
+    b = np.asarray(targets @ fixed)
+    
+    if fixed.shape[0] * factors * factors > _OUTER_BUDGET:
+        # Few, dense rows (e.g. foods rated by many users): one small product per row
+        solved = np.zeros((n_rows, factors), dtype=fixed.dtype)
+        for row in range(n_rows):
+            lo, hi = confidence.indptr[row], confidence.indptr[row + 1]
+            y = fixed[confidence.indices[lo:hi]]
+            a = gram + (y * weight[lo:hi, None]).T @ y
+            solved[row] = np.linalg.solve(a, b[row])
+        return solved
+    
+    # Many sparse rows: precompute every y y^T once and combine them with a sparse product
+    outer = np.einsum("ik,il->ikl", fixed, fixed).reshape(fixed.shape[0], -1)
+    solved = np.empty((n_rows, factors), dtype=fixed.dtype)
+    for start in range(0, n_rows, _SOLVE_CHUNK):
+        rows = slice(start, min(start + _SOLVE_CHUNK, n_rows))
+        a = np.asarray(weights[rows] @ outer).reshape(-1, factors, factors) + gram
+        solved[rows] = np.linalg.solve(a, b[rows, :, None])[..., 0]
+    return solved
+
+
+def train_als(
+    preference: "sparse.csr_matrix",
+    confidence: "sparse.csr_matrix",
+    factors: int = 32,
+    regularization: float = 0.1,
+    alpha: float = 2.0,
+    iterations: int = 10,
+    seed: int = 0
+) -> Tuple[np.ndarray, np.ndarray]:
+    """隐式反馈ALS (Hu, Koren & Volinsky 2008)，返回用户因子和物品因子."""
+    rng = np.random.default_rng(seed)
+    n_users, n_items = preference.shape
+    user_factors = (rng.standard_normal((n_users, factors)) * 0.01).astype(np.float32)
+    item_factors = (rng.standard_normal((n_items, factors)) * 0.01).astype(np.float32)
+    
+    preference_t, confidence_t = _transpose_pair(preference, confidence)
+    
+    for _ in range(iterations):
+        user_factors = _solve_side(item_factors, preference, confidence, regularization, alpha)
+        item_factors = _solve_side(user_factors, preference_t, confidence_t, regularization, alpha)
+    return user_factors, item_factors
+
+
+@dataclass
+class CFModel:
+    """训练好的协同过滤模型."""
+    user_ids: List[str]
+    item_ids: List[str]
+    user_factors: np.ndarray
+    item_factors: np.ndarray
+    trained_at: float
+    
+    def __post_init__(self):
+        self._user_index = {user_id: i for i, user_id in enumerate(self.user_ids)}
+        self._item_index = {item_id: i for i, item_id in enumerate(self.item_ids)}
+    
+    def save(self, path: str) -> None:
+        """保存模型，写入临时文件后原子替换."""
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(target.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(
+                f,
+                user_ids=np.array(self.user_ids),
+                item_ids=np.array(self.item_ids),
+                user_factors=self.user_factors,
+                item_factors=self.item_factors,
+                trained_at=np.array(self.trained_at)
+            )
+        os.replace(tmp, target)
+    
+    @classmethod
+    def load(cls, path: str) -> "CFModel":
+        """从磁盘加载模型."""
+        with np.load(path) as data:
+            return cls(
+                user_ids=data["user_ids"].tolist(),
+                item_ids=data["item_ids"].tolist(),
+                user_factors=data["user_factors"],
+                item_factors=data["item_factors"],
+                trained_at=float(data["trained_at"])
+            )
+    
+    def score(self, user_id: str, food_ids: List[str]) -> np.ndarray:
+        """预测用户对一组食物的偏好，未知用户或食物得分为0."""
+        scores = np.zeros(len(food_ids), dtype=np.float32)
+        user = self._user_index.get(user_id)
+        if user is None:
+            return scores
+        
+        positions = [(i, self._item_index.get(food_id)) for i, food_id in enumerate(food_ids)]
+        known = [(i, item) for i, item in positions if item is not None]
+        if known:
+            rows, items = zip(*known)
+            scores[list(rows)] = self.item_factors[list(items)] @ self.user_factors[user]
+        return scores
+
+
+class CFScorer:
+    """在线打分，模型文件更新后自动重新加载."""
+    
+    def __init__(self, model_path: Optional[str] = None):
+        """Initialize scorer; no model file means every score is 0."""
+        self.settings = get_settings()
+        self.model_path = model_path or self.settings.cf_model_path
+        self.model: Optional[CFModel] = None
+        self._mtime = 0.0
+        self._checked_at = 0.0
+    
+    def _refresh(self) -> None:
+        """检查模型文件是否有更新."""
+        now = time.monotonic()
+        if now - self._checked_at < _RELOAD_CHECK_INTERVAL and self._checked_at:
+            return
+        self._checked_at = now
+        
+        try:
+            mtime = os.path.getmtime(self.model_path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.model = CFModel.load(self.model_path)
+            self._mtime = mtime
+    
+    def score(self, user_id: str, food_ids: List[str]) -> Dict[str, float]:
+        """返回 food_id -> CF得分."""
+        if not self.settings.cf_enabled:
+            return {}
+        self._refresh()
+        if self.model is None or not food_ids:
+            return {}
+        return dict(zip(food_ids, self.model.score(user_id, food_ids).tolist()))
+
+
+# Global instance
+_cf_scorer = Singleton("cf_scorer", CFScorer)
+
+
+def get_cf_scorer() -> CFScorer:
+    """获取协同过滤打分器单例."""
+    return _cf_scorer.get()
@@ -1,7 +1,9 @@
 """DeepSeek API service with context management."""
-from openai import AsyncOpenAI
 from typing import List, Dict, Optional
 from app.config import get_settings
+from app.metrics import LLM_REQUESTS, LLM_SECONDS, STAGE_SECONDS, record_llm_usage, timed
+from app.registry import Singleton
+from app.tracing import span
 from app.models import FoodItem, UserPreferences, FitnessGoal
 
 
@@ -10,6 +12,9 @@ class DeepSeekService:
     
     def __init__(self):
         """Initialize DeepSeek API client."""
+        # Imported here; the openai package is slow to import
+        from openai import AsyncOpenAI
+        
         self.settings = get_settings()
         self.client = AsyncOpenAI(
             api_key=self.settings.deepseek_api_key,
@@ -18,6 +23,34 @@ class DeepSeekService:
         self.model = self.settings.deepseek_model
         self.temperature = self.settings.temperature
     
+    async def close(self) -> None:
+        """关闭HTTP连接池."""
+        await self.client.close()
+    
+    async def _complete(self, operation: str, messages: List[Dict[str, str]], max_tokens: int) -> str:
+        """调用补全接口，记录耗时、结果和token用量."""
+        with span(
+            f"llm.{operation}", model=self.model, messages=len(messages), max_tokens=max_tokens
+        ) as current:
+            try:
+                with timed(LLM_SECONDS, operation=operation):
+                    response = await self.client.chat.completions.create(
+                        model=self.model,
+                        messages=messages,
+                        temperature=self.temperature,
+                        max_tokens=max_tokens
+                    )
+            except Exception:
+                LLM_REQUESTS.inc(operation=operation, status="error")
+                raise
+            LLM_REQUESTS.inc(operation=operation, status="ok")
+            usage = getattr(response, "usage", None)
+            record_llm_usage(operation, usage)
+            if usage is not None:
+                current.set_attribute("prompt_tokens", usage.prompt_tokens or 0)
+                current.set_attribute("completion_tokens", usage.completion_tokens or 0)
+            return response.choices[0].message.content
+    
     def _build_system_prompt(self) -> str:
         """构建系统提示词."""
         return """你是西交利物浦大学的AI营养顾问助手。你的任务是根据学生的健康目标和饮食偏好，
@@ -41,7 +74,8 @@ class DeepSeekService:
         self,
         preferences: Optional[UserPreferences],
         meal_type: str,
-        recent_history: Optional[List[str]] = None
+        recent_history: Optional[List[str]] = None,
+        taste_summary: Optional[List[str]] = None
     ) -> str:
         """构建用户上下文信息."""
         context = f"餐次: {meal_type}\n\n"
@@ -69,6 +103,11 @@ class DeepSeekService:
             for item in recent_history[:10]:  # 最近10条
                 context += f"- {item}\n"
         
+        if taste_summary:
+            context += f"\n口味画像（根据饮食历史和评分统计）:\n"
+            for item in taste_summary:
+                context += f"- {item}\n"
+        
         return context
     
     def _format_food_items(self, foods: List[FoodItem]) -> str:
@@ -93,16 +132,20 @@ class DeepSeekService:
         preferences: Optional[UserPreferences] = None,
         meal_type: str = "午餐",
         recent_history: Optional[List[str]] = None,
-        custom_requirements: Optional[str] = None
+        custom_requirements: Optional[str] = None,
+        taste_summary: Optional[List[str]] = None
     ) -> str:
         """生成食物推荐."""
         
-        # Build messages
-        messages = [
-            {"role": "system", "content": self._build_system_prompt()},
-            {"role": "user", "content": self._build_user_context(preferences, meal_type, recent_history)},
-            {"role": "user", "content": self._format_food_items(available_foods)}
-        ]
+        # Build messages (the user context and food list are the costly parts)
+        with timed(STAGE_SECONDS, stage="prompt_build"):
+            messages = [
+                {"role": "system", "content": self._build_system_prompt()},
+                {"role": "user", "content": self._build_user_context(
+                    preferences, meal_type, recent_history, taste_summary
+                )},
+                {"role": "user", "content": self._format_food_items(available_foods)}
+            ]
         
         # Add custom requirements if provided
         if custom_requirements:
@@ -138,14 +181,68 @@ class DeepSeekService:
         })
         
         # Call API
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=self.temperature,
-            max_tokens=1000
+        return await self._complete("recommendation", messages, max_tokens=1000)
+    
+    async def generate_daily_plan(
+        self,
+        foods_by_meal: Dict[str, List[FoodItem]],
+        calorie_targets: Optional[Dict[str, int]] = None,
+        preferences: Optional[UserPreferences] = None,
+        recent_history: Optional[List[str]] = None,
+        custom_requirements: Optional[str] = None,
+        taste_summary: Optional[List[str]] = None
+    ) -> str:
+        """一次调用生成全天各餐次的推荐."""
+        meal_types = list(foods_by_meal)
+        calorie_targets = calorie_targets or {}
+        
+        with timed(STAGE_SECONDS, stage="prompt_build"):
+            messages = [
+                {"role": "system", "content": self._build_system_prompt()},
+                {"role": "user", "content": self._build_user_context(
+                    preferences, "、".join(meal_types), recent_history, taste_summary
+                )}
+            ]
+            
+            for meal_type, foods in foods_by_meal.items():
+                header = f"## {meal_type}"
+                if meal_type in calorie_targets:
+                    header += f" (目标约{calorie_targets[meal_type]}kcal)"
+                messages.append({
+                    "role": "user",
+                    "content": f"{header}\n{self._format_food_items(foods)}"
+                })
+        
+        if custom_requirements:
+            messages.append({
+                "role": "user",
+                "content": f"额外要求: {custom_requirements}"
+            })
+        
+        meal_sections = "\n".join(
+            f"**{meal_type}推荐：**\n1. [菜名] - [食堂名]\n..." for meal_type in meal_types
         )
+        messages.append({
+            "role": "user",
+            "content": f"""请为每个餐次分别从该餐次的可选食物中推荐1-3道菜，组成营养均衡的一日三餐，并尽量贴合各餐次的卡路里目标。
+
+请按以下格式回复：
+
+{meal_sections}
+
+**营养分析：**
+- 全天总卡路里: XXX kcal
+- 全天总蛋白质: XX g
+
+**推荐理由：**
+[解释这一天的搭配如何符合用户的健康目标]
+
+**饮食建议：**
+[给出一些实用的饮食建议]
+"""
+        })
         
-        return response.choices[0].message.content
+        return await self._complete("daily_plan", messages, max_tokens=1500)
     
     async def chat(
         self,
@@ -162,23 +259,13 @@ class DeepSeekService:
         
         messages.append({"role": "user", "content": user_message})
         
-        response = await self.client.chat.completions.create(
-            model=self.model,
-            messages=messages,
-            temperature=self.temperature,
-            max_tokens=500
-        )
-        
-        return response.choices[0].message.content
+        return await self._complete("chat", messages, max_tokens=500)
 
 
 # Global instance
-_deepseek_service: Optional[DeepSeekService] = None
+_deepseek_service = Singleton("deepseek_service", DeepSeekService, close=DeepSeekService.close)
 
 
 def get_deepseek_service() -> DeepSeekService:
     """获取DeepSeek服务单例."""
-    global _deepseek_service
-    if _deepseek_service is None:
-        _deepseek_service = DeepSeekService()
-    return _deepseek_service
+    return _deepseek_service.get()
@@ -1,7 +1,20 @@
 """RAG (Retrieval-Augmented Generation) service."""
-from typing import List, Optional, Dict
-from app.models import FoodItem, UserPreferences
+from typing import List, Optional, Dict, Tuple
+from app.cache import TTLCache
+from app.config import get_settings
+from app.metrics import REGISTRY, STAGE_SECONDS, timed
+from app.registry import Singleton
+from app.tracing import span
+from app.models import FoodItem, UserPreferences, TasteProfile
 from app.database import get_vector_db
+from app.database.lexical_index import reciprocal_rank_fusion
+from app.services.taste_profile import profile_score
+from app.services.collaborative import get_cf_scorer
+
+
+def preference_signature(preferences: Optional[UserPreferences]) -> str:
+    """偏好签名，偏好完全相同的请求共享检索和推荐结果."""
+    return preferences.model_dump_json() if preferences else ""
 
 
 class RAGService:
@@ -9,7 +22,17 @@ class RAGService:
     
     def __init__(self):
         """Initialize RAG service."""
+        self.settings = get_settings()
         self.vector_db = get_vector_db()
+        self.cf_scorer = get_cf_scorer()
+        
+        # Ranked retrieval results keyed by (menu version, meal, preferences, requirements, n);
+        # a menu change moves lookups to new keys, old entries age out
+        self.cache = TTLCache(
+            maxsize=self.settings.retrieval_cache_size,
+            ttl=self.settings.retrieval_cache_ttl
+        )
+        REGISTRY.register_cache("retrieval", self.cache)
     
     def _build_search_query(
         self,
@@ -41,6 +64,45 @@ class RAGService:
         
         return " ".join(query_parts)
     
+    def search_foods_many(
+        self,
+        queries: List[str],
+        n_results: int = 10,
+        filters: Optional[Dict] = None
+    ) -> List[List[FoodItem]]:
+        """混合检索: 向量结果和BM25结果用RRF融合，精确查询跳过嵌入模型."""
+        if self.settings.retrieval_mode != "hybrid":
+            # Includes the query embedding (timed separately by the numpy backend)
+            with timed(STAGE_SECONDS, stage="vector_query"):
+                return self.vector_db.search_foods_many(queries, n_results, filters)
+        
+        # The lexical side ignores metadata filters; post-filtering covers them
+        with timed(STAGE_SECONDS, stage="lexical_query"):
+            lexical = self.vector_db.lexical_search_many(queries, n_results)
+        
+        # Queries made only of known names, ingredients and tags are answered lexically
+        needs_vector = [
+            i for i, query in enumerate(queries)
+            if not lexical[i] or not self.vector_db.is_exact_query(query)
+        ]
+        with timed(STAGE_SECONDS, stage="vector_query"):
+            vector = dict(zip(needs_vector, self.vector_db.search_foods_many(
+                [queries[i] for i in needs_vector], n_results, filters
+            ) if needs_vector else []))
+        
+        results = []
+        for i, lexical_foods in enumerate(lexical):
+            if i not in vector:
+                results.append(lexical_foods)
+                continue
+            foods = {food.id: food for food in vector[i] + lexical_foods}
+            fused = reciprocal_rank_fusion(
+                [[food.id for food in vector[i]], [food.id for food in lexical_foods]],
+                k=self.settings.rrf_k
+            )
+            results.append([foods[food_id] for food_id in fused[:n_results]])
+        return results
+    
     def _build_filters(
         self,
         meal_type: str,
@@ -97,15 +159,26 @@ class RAGService:
     def _rank_foods_by_goal(
         self,
         foods: List[FoodItem],
-        preferences: Optional[UserPreferences] = None
+        preferences: Optional[UserPreferences] = None,
+        profile: Optional[TasteProfile] = None
     ) -> List[FoodItem]:
-        """根据健康目标对食物进行排序."""
-        if not preferences:
+        """根据健康目标和口味画像对食物进行排序."""
+        if not preferences and not (profile and profile.history_count):
             return foods
         
+        # One batched dot product for all candidates
+        cf_scores = (
+            self.cf_scorer.score(profile.user_id, [food.id for food in foods])
+            if profile else {}
+        )
+        
         def score_food(food: FoodItem) -> float:
             """给食物评分."""
-            score = 0.0
+            score = profile_score(profile, food)
+            score += cf_scores.get(food.id, 0.0) * self.settings.cf_weight
+            
+            if not preferences:
+                return score
             
             if preferences.goal == "减脂":
                 # Prefer low calorie, high protein, low fat
@@ -144,45 +217,145 @@ class RAGService:
         
         return sorted(foods, key=score_food, reverse=True)
     
+    def _filter_and_rank(
+        self,
+        foods: List[FoodItem],
+        meal_type: str,
+        preferences: Optional[UserPreferences],
+        n_results: int
+    ) -> List[FoodItem]:
+        """过滤并排序检索结果."""
+        # Post-process filtering
+        with timed(STAGE_SECONDS, stage="post_filter"):
+            filtered_foods = self._post_filter_foods(foods, meal_type, preferences)
+        
+        # Rank by goal
+        with timed(STAGE_SECONDS, stage="rank"):
+            ranked_foods = self._rank_foods_by_goal(filtered_foods, preferences)
+        
+        # Return top results
+        return ranked_foods[:n_results]
+    
+    def personalize(
+        self,
+        foods: List[FoodItem],
+        preferences: Optional[UserPreferences],
+        profile: Optional[TasteProfile]
+    ) -> List[FoodItem]:
+        """按用户口味画像重新排序 (共享的) 检索结果."""
+        if not profile or not profile.history_count:
+            return foods
+        with timed(STAGE_SECONDS, stage="rank"):
+            return self._rank_foods_by_goal(foods, preferences, profile)
+    
     async def retrieve_relevant_foods(
         self,
         meal_type: str,
         preferences: Optional[UserPreferences] = None,
         custom_requirements: Optional[str] = None,
-        n_results: int = 20
+        n_results: int = 20,
+        profile: Optional[TasteProfile] = None
     ) -> List[FoodItem]:
-        """检索相关食物."""
+        """检索相关食物，传入口味画像时按画像个性化排序."""
+        with span("rag.retrieve", meal_type=meal_type, n_results=n_results) as current:
+            cache_key = (
+                self.vector_db.menu_version(), meal_type, preference_signature(preferences),
+                custom_requirements, n_results
+            )
+            cached = self.cache.get(cache_key)
+            current.set_attribute("cache_hit", cached is not None)
+            if cached is not None:
+                current.set_attribute("candidates", len(cached))
+                return self.personalize(cached, preferences, profile)
+            
+            with timed(STAGE_SECONDS, stage="query_build"):
+                # Build search query
+                query = self._build_search_query(meal_type, preferences, custom_requirements)
+                
+                # Build filters
+                filters = self._build_filters(meal_type, preferences)
+            
+            # Search in vector database (and the keyword index in hybrid mode)
+            foods = self.search_foods_many(
+                [query],
+                n_results=n_results * 2,  # Get more for filtering
+                filters=filters
+            )[0]
+            current.set_attribute("retrieved", len(foods))
+            
+            # The cache holds the shared segment ranking; personalization is applied per call
+            ranked_foods = self._filter_and_rank(foods, meal_type, preferences, n_results)
+            self.cache.set(cache_key, ranked_foods)
+            current.set_attribute("candidates", len(ranked_foods))
+            return self.personalize(ranked_foods, preferences, profile)
+    
+    async def retrieve_relevant_foods_many(
+        self,
+        meal_types: List[str],
+        preferences: Optional[UserPreferences] = None,
+        custom_requirements: Optional[str] = None,
+        n_results: int = 20,
+        profile: Optional[TasteProfile] = None
+    ) -> Dict[str, List[FoodItem]]:
+        """一次批量向量检索多个餐次的相关食物."""
+        results = await self.retrieve_relevant_foods_batch(
+            [(meal_type, preferences) for meal_type in meal_types],
+            custom_requirements=custom_requirements,
+            n_results=n_results
+        )
+        return {
+            meal_type: self.personalize(foods, preferences, profile)
+            for meal_type, foods in zip(meal_types, results)
+        }
+    
+    async def retrieve_relevant_foods_batch(
+        self,
+        requests: List[Tuple[str, Optional[UserPreferences]]],
+        custom_requirements: Optional[str] = None,
+        n_results: int = 20
+    ) -> List[List[FoodItem]]:
+        """一次批量向量检索多组 (餐次, 偏好) 的相关食物."""
+        if not requests:
+            return []
         
-        # Build search query
-        query = self._build_search_query(meal_type, preferences, custom_requirements)
+        menu_version = self.vector_db.menu_version()
+        cache_keys = [
+            (menu_version, meal_type, preference_signature(preferences), custom_requirements, n_results)
+            for meal_type, preferences in requests
+        ]
+        results: List[Optional[List[FoodItem]]] = [self.cache.get(key) for key in cache_keys]
+        missing = [i for i, cached in enumerate(results) if cached is None]
+        if not missing:
+            return results
         
-        # Build filters
-        filters = self._build_filters(meal_type, preferences)
+        with timed(STAGE_SECONDS, stage="query_build"):
+            queries = [
+                self._build_search_query(requests[i][0], requests[i][1], custom_requirements)
+                for i in missing
+            ]
+            
+            # One multi-query call shares a single filter; meal availability
+            # and preferences are checked per request in post-filtering
+            filters = self._build_filters(*requests[missing[0]])
         
-        # Search in vector database
-        foods = self.vector_db.search_foods(
-            query=query,
+        found = self.search_foods_many(
+            queries=queries,
             n_results=n_results * 2,  # Get more for filtering
             filters=filters
         )
         
-        # Post-process filtering
-        filtered_foods = self._post_filter_foods(foods, meal_type, preferences)
-        
-        # Rank by goal
-        ranked_foods = self._rank_foods_by_goal(filtered_foods, preferences)
+        for i, foods in zip(missing, found):
+            meal_type, preferences = requests[i]
+            results[i] = self._filter_and_rank(foods, meal_type, preferences, n_results)
+            self.cache.set(cache_keys[i], results[i])
         
-        # Return top results
-        return ranked_foods[:n_results]
+        return results
 
 
 # Global instance
-_rag_service: Optional[RAGService] = None
+_rag_service = Singleton("rag_service", RAGService)
 
 
 def get_rag_service() -> RAGService:
     """获取RAG服务单例."""
-    global _rag_service
-    if _rag_service is None:
-        _rag_service = RAGService()
-    return _rag_service
+    return _rag_service.get()
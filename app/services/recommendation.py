@@ -1,39 +1,104 @@
 """Recommendation service that combines RAG and DeepSeek."""
-from typing import List, Optional
+from typing import List, Optional, Dict, AsyncIterator
+import asyncio
 import re
+from app.cache import TTLCache
+from app.config import get_settings
+from app.metrics import REGISTRY, STAGE_SECONDS, timed
+from app.registry import Singleton
+from app.tracing import span
 from app.models import (
-    FoodItem, FoodRecommendation, NutritionInfo,
-    UserPreferences, RecommendationRequest
+    FoodItem, FoodRecommendation, NutritionInfo, DailyMealPlan, BatchRecommendationResult,
+    User, UserPreferences, RecommendationRequest, DailyPlanRequest,
+    BatchRecommendationRequest
 )
-from app.services.rag_service import get_rag_service
+from app.services.rag_service import get_rag_service, preference_signature
 from app.services.deepseek_service import get_deepseek_service
+from app.services.taste_profile import get_taste_profile_service
 from app.database import get_user_db
 
+# Share of the daily calorie target assigned to each meal
+MEAL_CALORIE_SPLIT = {
+    "早餐": 0.3,
+    "午餐": 0.4,
+    "晚餐": 0.3,
+    "加餐": 0.1,
+}
+
 
 class RecommendationService:
     """推荐服务，整合RAG和AI生成."""
     
     def __init__(self):
         """Initialize recommendation service."""
+        self.settings = get_settings()
         self.rag_service = get_rag_service()
         self.deepseek_service = get_deepseek_service()
+        self.taste_profiles = get_taste_profile_service()
+        
+        # AI recommendations for users without history, keyed by (menu version, meal, preferences)
+        self.cache = TTLCache(
+            maxsize=self.settings.recommendation_cache_size,
+            ttl=self.settings.recommendation_cache_ttl
+        )
+        REGISTRY.register_cache("recommendation", self.cache)
+        
+        # Segment recommendations being computed, so concurrent misses share one LLM call
+        self._segment_flights: Dict[tuple, asyncio.Task] = {}
     
-    async def _get_user_history_summary(self, user_id: str) -> List[str]:
-        """获取用户历史摘要."""
-        user_db = await get_user_db()
-        history = await user_db.get_user_history(user_id, limit=20)
+    @property
+    def use_llm(self) -> bool:
+        """是否调用大模型生成推荐 (local模式下不调用)."""
+        return self.settings.recommendation_mode != "local"
+    
+    def _resolve_preferences(
+        self,
+        request_preferences: Optional[UserPreferences],
+        user: Optional[User]
+    ) -> Optional[UserPreferences]:
+        """使用请求中的偏好，否则使用用户保存的偏好."""
+        if request_preferences:
+            return request_preferences
+        if user and user.preferences:
+            return user.preferences
+        return None
+    
+    def _split_calorie_targets(
+        self,
+        meal_types: List[str],
+        preferences: Optional[UserPreferences]
+    ) -> Dict[str, int]:
+        """将每日卡路里目标按餐次分配."""
+        if not preferences or not preferences.daily_calories_target:
+            return {}
         
-        return [
-            f"{h.food_name} ({h.canteen}) - {h.meal_type} - 评分: {h.rating or '未评分'}"
-            for h in history
-        ]
+        weights = {meal: MEAL_CALORIE_SPLIT.get(meal, 0.1) for meal in meal_types}
+        total_weight = sum(weights.values())
+        
+        # Normalize so the planned meals add up to the daily target
+        return {
+            meal: round(preferences.daily_calories_target * weight / total_weight)
+            for meal, weight in weights.items()
+        }
     
-    def _parse_ai_response(
+    def _meal_calorie_budget(
         self,
-        ai_response: str,
+        meal_type: str,
+        preferences: Optional[UserPreferences]
+    ) -> Optional[int]:
+        """单个餐次的卡路里预算."""
+        if not preferences or not preferences.daily_calories_target:
+            return None
+        return round(
+            preferences.daily_calories_target * MEAL_CALORIE_SPLIT.get(meal_type, 0.1)
+        )
+    
+    def _match_foods(
+        self,
+        text: str,
         available_foods: List[FoodItem]
-    ) -> tuple[List[FoodItem], str, str]:
-        """解析AI响应，提取推荐的食物."""
+    ) -> List[FoodItem]:
+        """从文本中匹配推荐的食物."""
         recommended_foods = []
         
         # Create food name to object mapping
@@ -42,7 +107,7 @@ class RecommendationService:
         # Extract food names from response
         # Look for patterns like "1. 鸡胸肉沙拉 - 食堂一"
         food_pattern = r'\d+\.\s*([^-\n]+?)\s*-'
-        matches = re.findall(food_pattern, ai_response)
+        matches = re.findall(food_pattern, text)
         
         for match in matches:
             food_name = match.strip()
@@ -53,30 +118,53 @@ class RecommendationService:
                         recommended_foods.append(food)
                     break
         
-        # Extract reasoning and tips
-        reasoning = ""
-        tips = ""
-        
-        # Extract reasoning section
-        reasoning_match = re.search(
-            r'\*\*推荐理由[：:]\*\*\s*(.+?)(?=\*\*|$)',
+        return recommended_foods
+    
+    def _extract_section(self, ai_response: str, title: str) -> str:
+        """提取 **标题：** 格式的段落."""
+        match = re.search(
+            rf'\*\*{re.escape(title)}[：:]\*\*\s*(.+?)(?=\*\*|$)',
             ai_response,
             re.DOTALL
         )
-        if reasoning_match:
-            reasoning = reasoning_match.group(1).strip()
+        return match.group(1).strip() if match else ""
+    
+    def _parse_ai_response(
+        self,
+        ai_response: str,
+        available_foods: List[FoodItem]
+    ) -> tuple[List[FoodItem], str, str]:
+        """解析AI响应，提取推荐的食物."""
+        recommended_foods = self._match_foods(ai_response, available_foods)
         
-        # Extract tips section
-        tips_match = re.search(
-            r'\*\*饮食建议[：:]\*\*\s*(.+?)(?=\*\*|$)',
-            ai_response,
-            re.DOTALL
-        )
-        if tips_match:
-            tips = tips_match.group(1).strip()
+        # Extract reasoning and tips
+        reasoning = self._extract_section(ai_response, "推荐理由")
+        tips = self._extract_section(ai_response, "饮食建议")
         
         return recommended_foods, reasoning or ai_response, tips
     
+    def _select_foods_locally(
+        self,
+        ranked_foods: List[FoodItem],
+        calorie_budget: Optional[int] = None,
+        max_items: int = 3
+    ) -> List[FoodItem]:
+        """不调用大模型，按排序结果在卡路里预算内选择食物."""
+        if calorie_budget is None:
+            return ranked_foods[:max_items]
+        
+        selected = []
+        remaining = calorie_budget
+        for food in ranked_foods:
+            if len(selected) >= max_items:
+                break
+            if food.nutrition.calories <= remaining:
+                selected.append(food)
+                remaining -= food.nutrition.calories
+        
+        # Always recommend something, even if the budget is very tight
+        return selected or ranked_foods[:1]
+    
     def _calculate_total_nutrition(self, foods: List[FoodItem]) -> NutritionInfo:
         """计算总营养."""
         total_calories = sum(f.nutrition.calories for f in foods)
@@ -95,56 +183,164 @@ class RecommendationService:
             sodium=round(total_sodium, 1) if total_sodium > 0 else None
         )
     
+    def _empty_recommendation(self) -> FoodRecommendation:
+        """没有候选食物时的推荐结果."""
+        return FoodRecommendation(
+            food_items=[],
+            total_nutrition=NutritionInfo(
+                calories=0, protein=0, carbs=0, fat=0
+            ),
+            reasoning="抱歉，没有找到符合要求的食物。",
+            tips="请尝试调整您的偏好设置或选择其他餐次。"
+        )
+    
+    def _local_recommendation(
+        self,
+        relevant_foods: List[FoodItem],
+        calorie_budget: Optional[int] = None
+    ) -> FoodRecommendation:
+        """local模式下根据RAG排序结果生成推荐."""
+        foods = self._select_foods_locally(relevant_foods, calorie_budget)
+        return FoodRecommendation(
+            food_items=foods,
+            total_nutrition=self._calculate_total_nutrition(foods),
+            reasoning="根据您的健康目标和偏好，从菜单中为您挑选了评分最高的菜品。",
+            tips=None
+        )
+    
     async def get_recommendation(
         self,
         request: RecommendationRequest
     ) -> FoodRecommendation:
         """获取食物推荐."""
         
-        # Get user data
-        user_db = await get_user_db()
-        user = await user_db.get_user(request.user_id)
-        
-        # Use request preferences or user's saved preferences
-        preferences = request.preferences
-        if not preferences and user and user.preferences:
-            preferences = user.preferences
-        
-        # Get user history for context
-        history_summary = await self._get_user_history_summary(request.user_id)
-        
-        # Retrieve relevant foods using RAG
-        relevant_foods = await self.rag_service.retrieve_relevant_foods(
-            meal_type=request.meal_type,
-            preferences=preferences,
-            custom_requirements=request.custom_requirements,
-            n_results=15
+        with span(
+            "recommendation.get", user_id=request.user_id, meal_type=request.meal_type
+        ) as current:
+            # Get user data
+            user_db = await get_user_db()
+            with timed(STAGE_SECONDS, stage="get_user"):
+                user = await user_db.get_user(request.user_id)
+            
+            # Use request preferences or user's saved preferences
+            preferences = self._resolve_preferences(request.preferences, user)
+            with timed(STAGE_SECONDS, stage="history"):
+                profile = await self.taste_profiles.get_profile(request.user_id)
+            
+            # Retrieve relevant foods using RAG, ranked for this user's taste
+            relevant_foods = await self.rag_service.retrieve_relevant_foods(
+                meal_type=request.meal_type,
+                preferences=preferences,
+                custom_requirements=request.custom_requirements,
+                n_results=15,
+                profile=profile
+            )
+            current.set_attribute("candidates", len(relevant_foods))
+            
+            if not relevant_foods:
+                # Fallback: return empty recommendation
+                return self._empty_recommendation()
+            
+            if not self.use_llm:
+                current.set_attribute("path", "local")
+                calorie_budget = self._meal_calorie_budget(request.meal_type, preferences)
+                return self._local_recommendation(relevant_foods, calorie_budget)
+            
+            # Compact taste summary for the prompt
+            taste_summary = await self.taste_profiles.summarize(profile, [request.meal_type])
+            
+            # Without personal context the result only depends on the segment
+            if not taste_summary and not request.custom_requirements:
+                current.set_attribute("path", "segment")
+                return await self.warm_segment(request.meal_type, preferences, relevant_foods)
+            
+            current.set_attribute("path", "llm")
+            return await self._generate_recommendation(
+                relevant_foods,
+                preferences,
+                request.meal_type,
+                taste_summary,
+                request.custom_requirements
+            )
+    
+    async def warm_segment(
+        self,
+        meal_type: str,
+        preferences: Optional[UserPreferences],
+        relevant_foods: Optional[List[FoodItem]] = None
+    ) -> FoodRecommendation:
+        """获取 (餐次, 偏好) 分组的推荐，结果写入缓存供无历史的用户复用."""
+        cache_key = (
+            self.rag_service.vector_db.menu_version(), meal_type, preference_signature(preferences)
         )
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        flight = self._segment_flights.get(cache_key)
+        if flight is None:
+            flight = asyncio.create_task(
+                self._compute_segment(cache_key, meal_type, preferences, relevant_foods)
+            )
+            self._segment_flights[cache_key] = flight
+            flight.add_done_callback(lambda _: self._segment_flights.pop(cache_key, None))
+        # A cancelled caller must not cancel the result other callers are waiting for
+        return await asyncio.shield(flight)
+    
+    async def _compute_segment(
+        self,
+        cache_key: tuple,
+        meal_type: str,
+        preferences: Optional[UserPreferences],
+        relevant_foods: Optional[List[FoodItem]]
+    ) -> FoodRecommendation:
+        """计算分组推荐并写入缓存."""
+        if relevant_foods is None:
+            relevant_foods = await self.rag_service.retrieve_relevant_foods(
+                meal_type=meal_type,
+                preferences=preferences,
+                n_results=15
+            )
         
         if not relevant_foods:
-            # Fallback: return empty recommendation
-            return FoodRecommendation(
-                food_items=[],
-                total_nutrition=NutritionInfo(
-                    calories=0, protein=0, carbs=0, fat=0
-                ),
-                reasoning="抱歉，没有找到符合要求的食物。",
-                tips="请尝试调整您的偏好设置或选择其他餐次。"
+            return self._empty_recommendation()
+        
+        if self.use_llm:
+            recommendation = await self._generate_recommendation(
+                relevant_foods, preferences, meal_type, []
+            )
+        else:
+            recommendation = self._local_recommendation(
+                relevant_foods, self._meal_calorie_budget(meal_type, preferences)
             )
         
+        self.cache.set(cache_key, recommendation)
+        return recommendation
+    
+    async def _generate_recommendation(
+        self,
+        relevant_foods: List[FoodItem],
+        preferences: Optional[UserPreferences],
+        meal_type: str,
+        taste_summary: List[str],
+        custom_requirements: Optional[str] = None
+    ) -> FoodRecommendation:
+        """调用DeepSeek从候选食物中生成推荐."""
+        
         # Generate recommendation using DeepSeek
         ai_response = await self.deepseek_service.generate_recommendation(
             available_foods=relevant_foods,
             preferences=preferences,
-            meal_type=request.meal_type,
-            recent_history=history_summary,
-            custom_requirements=request.custom_requirements
+            meal_type=meal_type,
+            custom_requirements=custom_requirements,
+            taste_summary=taste_summary
         )
         
         # Parse AI response
-        recommended_foods, reasoning, tips = self._parse_ai_response(
-            ai_response, relevant_foods
-        )
+        with timed(STAGE_SECONDS, stage="response_parse"):
+            recommended_foods, reasoning, tips = self._parse_ai_response(
+                ai_response, relevant_foods
+            )
         
         # If parsing failed, use top foods from RAG
         if not recommended_foods:
@@ -160,15 +356,195 @@ class RecommendationService:
             reasoning=reasoning,
             tips=tips or None
         )
+    
+    async def get_daily_plan(self, request: DailyPlanRequest) -> DailyMealPlan:
+        """获取全天餐食计划，所有餐次共用一次检索和一次AI调用."""
+        
+        # Get user data once for all meals
+        user_db = await get_user_db()
+        with timed(STAGE_SECONDS, stage="get_user"):
+            user = await user_db.get_user(request.user_id)
+        preferences = self._resolve_preferences(request.preferences, user)
+        with timed(STAGE_SECONDS, stage="history"):
+            profile = await self.taste_profiles.get_profile(request.user_id)
+        
+        calorie_targets = self._split_calorie_targets(request.meal_types, preferences)
+        
+        # Retrieve candidates for every meal in one batched vector query
+        foods_by_meal = await self.rag_service.retrieve_relevant_foods_many(
+            meal_types=request.meal_types,
+            preferences=preferences,
+            custom_requirements=request.custom_requirements,
+            n_results=10,
+            profile=profile
+        )
+        
+        candidate_meals = {meal: foods for meal, foods in foods_by_meal.items() if foods}
+        reasoning = ""
+        tips = ""
+        
+        if candidate_meals and self.use_llm:
+            ai_response = await self.deepseek_service.generate_daily_plan(
+                foods_by_meal=candidate_meals,
+                calorie_targets=calorie_targets,
+                preferences=preferences,
+                custom_requirements=request.custom_requirements,
+                taste_summary=await self.taste_profiles.summarize(profile, list(candidate_meals))
+            )
+            
+            with timed(STAGE_SECONDS, stage="response_parse"):
+                reasoning = self._extract_section(ai_response, "推荐理由") or ai_response
+                tips = self._extract_section(ai_response, "饮食建议")
+                
+                selected_by_meal = {
+                    meal: self._match_foods(
+                        self._extract_section(ai_response, f"{meal}推荐"), foods
+                    )
+                    for meal, foods in candidate_meals.items()
+                }
+        else:
+            reasoning = "根据您的健康目标和各餐次的卡路里分配，从菜单中为您挑选了评分最高的菜品。"
+            selected_by_meal = {}
+        
+        meals = {}
+        chosen_ids = set()
+        for meal_type in request.meal_types:
+            foods = candidate_meals.get(meal_type)
+            if not foods:
+                meals[meal_type] = self._empty_recommendation()
+                continue
+            
+            # Fall back to the local pick when the AI response names nothing usable;
+            # local picks skip dishes already chosen for an earlier meal
+            selected = selected_by_meal.get(meal_type) or self._select_foods_locally(
+                [food for food in foods if food.id not in chosen_ids] or foods,
+                calorie_targets.get(meal_type)
+            )
+            chosen_ids.update(food.id for food in selected)
+            meals[meal_type] = FoodRecommendation(
+                food_items=selected,
+                total_nutrition=self._calculate_total_nutrition(selected),
+                reasoning=reasoning,
+                tips=tips or None
+            )
+        
+        all_foods = [food for meal in meals.values() for food in meal.food_items]
+        
+        return DailyMealPlan(
+            meals=meals,
+            total_nutrition=self._calculate_total_nutrition(all_foods),
+            reasoning=reasoning,
+            tips=tips or None
+        )
+    
+    async def get_recommendations_batch(
+        self,
+        request: BatchRecommendationRequest
+    ) -> AsyncIterator[BatchRecommendationResult]:
+        """批量获取多个用户的推荐，按完成顺序逐个返回."""
+        user_ids = list(dict.fromkeys(request.user_ids))
+        
+        # Load all users and their taste profiles in bulk
+        user_db = await get_user_db()
+        users = await user_db.get_users(user_ids)
+        profiles = await self.taste_profiles.get_profiles(user_ids)
+        
+        # Group users with identical preferences so they share retrieval
+        groups: Dict[str, List[str]] = {}
+        group_preferences: Dict[str, Optional[UserPreferences]] = {}
+        for user_id in user_ids:
+            preferences = self._resolve_preferences(None, users.get(user_id))
+            signature = preference_signature(preferences)
+            groups.setdefault(signature, []).append(user_id)
+            group_preferences[signature] = preferences
+        
+        signatures = list(groups)
+        candidates = await self.rag_service.retrieve_relevant_foods_batch(
+            [(request.meal_type, group_preferences[sig]) for sig in signatures],
+            custom_requirements=request.custom_requirements,
+            n_results=15
+        )
+        candidates_by_signature = dict(zip(signatures, candidates))
+        
+        if not self.use_llm:
+            for signature, user_group in groups.items():
+                preferences = group_preferences[signature]
+                calorie_budget = self._meal_calorie_budget(request.meal_type, preferences)
+                for user_id in user_group:
+                    foods = self.rag_service.personalize(
+                        candidates_by_signature[signature], preferences, profiles.get(user_id)
+                    )
+                    recommendation = (
+                        self._local_recommendation(foods, calorie_budget)
+                        if foods else self._empty_recommendation()
+                    )
+                    yield BatchRecommendationResult(
+                        user_id=user_id, recommendation=recommendation
+                    )
+            return
+        
+        semaphore = asyncio.Semaphore(max(1, self.settings.batch_llm_concurrency))
+        
+        # One segment recommendation per preference group, shared by its users
+        segment_tasks: Dict[str, asyncio.Task] = {}
+        
+        async def segment(signature: str) -> FoodRecommendation:
+            async with semaphore:
+                return await self.warm_segment(
+                    request.meal_type,
+                    group_preferences[signature],
+                    candidates_by_signature[signature]
+                )
+        
+        async def recommend(user_id: str, signature: str) -> BatchRecommendationResult:
+            preferences = group_preferences[signature]
+            profile = profiles.get(user_id)
+            foods = self.rag_service.personalize(
+                candidates_by_signature[signature], preferences, profile
+            )
+            if not foods:
+                return BatchRecommendationResult(
+                    user_id=user_id, recommendation=self._empty_recommendation()
+                )
+            taste_summary = await self.taste_profiles.summarize(profile, [request.meal_type])
+            try:
+                if not taste_summary and not request.custom_requirements:
+                    if signature not in segment_tasks:
+                        segment_tasks[signature] = asyncio.create_task(segment(signature))
+                    recommendation = await asyncio.shield(segment_tasks[signature])
+                else:
+                    async with semaphore:
+                        recommendation = await self._generate_recommendation(
+                            foods,
+                            preferences,
+                            request.meal_type,
+                            taste_summary,
+                            request.custom_requirements
+                        )
+                return BatchRecommendationResult(
+                    user_id=user_id, recommendation=recommendation
+                )
+            except Exception as e:
+                return BatchRecommendationResult(user_id=user_id, error=str(e))
+        
+        tasks = [
+            asyncio.create_task(recommend(user_id, signature))
+            for signature, user_group in groups.items()
+            for user_id in user_group
+        ]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # Stop outstanding LLM calls if the client disconnects mid-stream
+            for task in [*tasks, *segment_tasks.values()]:
+                task.cancel()
 
 
 # Global instance
-_recommendation_service: Optional[RecommendationService] = None
+_recommendation_service = Singleton("recommendation_service", RecommendationService)
 
 
 def get_recommendation_service() -> RecommendationService:
     """获取推荐服务单例."""
-    global _recommendation_service
-    if _recommendation_service is None:
-        _recommendation_service = RecommendationService()
-    return _recommendation_service
+    return _recommendation_service.get()
@@ -0,0 +1,241 @@
+"""Incrementally maintained user taste profiles."""
+import asyncio
+from datetime import datetime
+from typing import Dict, List, Optional
+from app.config import get_settings
+from app.registry import Singleton
+from app.models import FoodItem, FoodHistory, MealMacros, TasteProfile
+from app.database import UserDatabase, VectorDatabase, get_user_db, get_vector_db
+
+# Eating something without rating it is a mild positive signal
+_UNRATED_WEIGHT = 0.25
+
+# Ranking weights, on the same scale as the goal scores in RAGService
+AFFINITY_WEIGHT = 30.0
+CANTEEN_WEIGHT = 10.0
+REPEAT_PENALTY = 40.0
+
+
+def rating_weight(rating: Optional[int]) -> float:
+    """将1-5分的评分映射为 [-1, 1] 的权重."""
+    if rating is None:
+        return _UNRATED_WEIGHT
+    return (rating - 3) / 2
+
+
+def apply_history(
+    profile: TasteProfile,
+    history: FoodHistory,
+    food: Optional[FoodItem],
+    recent_items: int = 10
+) -> None:
+    """将一条饮食历史计入画像，耗时与历史总量无关."""
+    weight = rating_weight(history.rating)
+    profile.history_count += 1
+    profile.canteen_counts[history.canteen] = profile.canteen_counts.get(history.canteen, 0) + 1
+    
+    # Foods that have since left the menu still count towards canteen and recency
+    if food is not None:
+        for tag in food.tags:
+            profile.tag_affinity[tag] = profile.tag_affinity.get(tag, 0.0) + weight
+        for ingredient in food.ingredients:
+            profile.ingredient_affinity[ingredient] = (
+                profile.ingredient_affinity.get(ingredient, 0.0) + weight
+            )
+        
+        # Running means per meal
+        macros = profile.meal_macros.setdefault(history.meal_type, MealMacros())
+        macros.count += 1
+        macros.calories += (food.nutrition.calories - macros.calories) / macros.count
+        macros.protein += (food.nutrition.protein - macros.protein) / macros.count
+        macros.carbs += (food.nutrition.carbs - macros.carbs) / macros.count
+        macros.fat += (food.nutrition.fat - macros.fat) / macros.count
+    
+    if history.food_id in profile.recent_food_ids:
+        profile.recent_food_ids.remove(history.food_id)
+    profile.recent_food_ids.insert(0, history.food_id)
+    del profile.recent_food_ids[recent_items:]
+    profile.updated_at = datetime.now()
+
+
+def profile_score(profile: Optional[TasteProfile], food: FoodItem) -> float:
+    """根据口味画像给食物打分，用于个性化排序."""
+    if not profile or not profile.history_count:
+        return 0.0
+    
+    count = profile.history_count
+    affinities = [profile.tag_affinity.get(tag, 0.0) / count for tag in food.tags]
+    affinities.extend(
+        profile.ingredient_affinity.get(ingredient, 0.0) / count
+        for ingredient in food.ingredients
+    )
+    
+    score = 0.0
+    if affinities:
+        score += sum(affinities) / len(affinities) * AFFINITY_WEIGHT
+    score += profile.canteen_counts.get(food.canteen, 0) / count * CANTEEN_WEIGHT
+    if food.id in profile.recent_food_ids:
+        score -= REPEAT_PENALTY
+    return score
+
+
+class TasteProfileService:
+    """口味画像服务，随饮食历史写入增量更新画像."""
+    
+    def __init__(self):
+        """Initialize taste profile service."""
+        self.settings = get_settings()
+        self.user_db: Optional[UserDatabase] = None
+    
+    @property
+    def vector_db(self) -> VectorDatabase:
+        """向量数据库，首次使用时才加载 (attach 在启动时调用，不应等待模型加载)."""
+        return get_vector_db()
+    
+    async def _get_user_db(self) -> UserDatabase:
+        """获取关联的用户数据库，未指定时使用全局实例."""
+        return self.user_db or await get_user_db()
+    
+    async def attach(self, user_db: Optional[UserDatabase] = None) -> None:
+        """注册到用户数据库，每批饮食历史写入后更新画像."""
+        if user_db is not None:
+            self.user_db = user_db
+        (await self._get_user_db()).add_history_listener(self.on_histories)
+    
+    async def _get_foods(self, food_ids: List[str]) -> List[FoodItem]:
+        """在线程中按ID查询食物; 首次访问会加载向量数据库，不能阻塞事件循环."""
+        if not food_ids:
+            return []
+        return await asyncio.to_thread(lambda: self.vector_db.get_foods_by_ids(food_ids))
+    
+    async def _foods(self, histories: List[FoodHistory]) -> Dict[str, FoodItem]:
+        """批量查询历史中的食物."""
+        food_ids = list(dict.fromkeys(h.food_id for h in histories))
+        return {food.id: food for food in await self._get_foods(food_ids)}
+    
+    def build_profile(
+        self, user_id: str, histories: List[FoodHistory], foods: Dict[str, FoodItem]
+    ) -> TasteProfile:
+        """由饮食历史 (最新在前) 和其中的食物完整构建画像."""
+        profile = TasteProfile(user_id=user_id)
+        for history in reversed(histories):
+            apply_history(
+                profile, history, foods.get(history.food_id), self.settings.taste_recent_items
+            )
+        return profile
+    
+    async def _build_profiles(
+        self, user_db: UserDatabase, user_ids: List[str]
+    ) -> Dict[str, TasteProfile]:
+        """从数据库中的历史记录构建画像，只保存有历史的用户."""
+        histories = await user_db.get_users_history(
+            user_ids, limit=self.settings.taste_backfill_limit
+        )
+        # Users without history (or unknown ids) get an empty profile that is
+        # cached but not stored; their first history write builds the real one
+        profiles = {user_id: TasteProfile(user_id=user_id) for user_id in user_ids}
+        foods = await self._foods([row for rows in histories.values() for row in rows])
+        built = [
+            self.build_profile(user_id, histories[user_id], foods)
+            for user_id in user_ids if histories.get(user_id)
+        ]
+        if built:
+            await user_db.save_taste_profiles(built)
+        profiles.update((profile.user_id, profile) for profile in built)
+        user_db.cache_taste_profiles(
+            [profile for profile in profiles.values() if not profile.history_count]
+        )
+        return profiles
+    
+    async def get_profile(self, user_id: str) -> TasteProfile:
+        """获取用户口味画像，首次访问时由历史记录构建."""
+        profiles = await self.get_profiles([user_id])
+        return profiles[user_id]
+    
+    async def get_profiles(self, user_ids: List[str]) -> Dict[str, TasteProfile]:
+        """批量获取口味画像."""
+        user_db = await self._get_user_db()
+        profiles = await user_db.get_taste_profiles(user_ids)
+        missing = [user_id for user_id in dict.fromkeys(user_ids) if user_id not in profiles]
+        if missing:
+            profiles.update(await self._build_profiles(user_db, missing))
+        return profiles
+    
+    async def on_histories(self, histories: List[FoodHistory]) -> None:
+        """饮食历史写入回调: 增量更新相关用户的画像."""
+        user_db = await self._get_user_db()
+        by_user: Dict[str, List[FoodHistory]] = {}
+        for history in sorted(histories, key=lambda h: h.timestamp):
+            by_user.setdefault(history.user_id, []).append(history)
+        
+        profiles = await user_db.get_taste_profiles(list(by_user))
+        
+        # Users seen for the first time (or cached with an empty profile) are
+        # built from stored history, which already includes this batch
+        missing = [
+            user_id for user_id in by_user
+            if user_id not in profiles or not profiles[user_id].history_count
+        ]
+        if missing:
+            await self._build_profiles(user_db, missing)
+        
+        foods = await self._foods(histories)
+        updated = []
+        for user_id, rows in by_user.items():
+            if user_id in missing:
+                continue
+            profile = profiles[user_id]
+            for history in rows:
+                apply_history(
+                    profile, history, foods.get(history.food_id), self.settings.taste_recent_items
+                )
+            updated.append(profile)
+        await user_db.save_taste_profiles(updated)
+    
+    async def summarize(
+        self,
+        profile: Optional[TasteProfile],
+        meal_types: Optional[List[str]] = None,
+        top_n: int = 5
+    ) -> List[str]:
+        """将画像压缩为几行提示词摘要."""
+        if not profile or not profile.history_count:
+            return []
+        
+        lines = []
+        affinities = {**profile.ingredient_affinity, **profile.tag_affinity}
+        ranked = sorted(affinities, key=affinities.get, reverse=True)
+        liked = [name for name in ranked[:top_n] if affinities[name] > 0]
+        disliked = [name for name in reversed(ranked[-top_n:]) if affinities[name] < 0]
+        if liked:
+            lines.append(f"偏爱: {'、'.join(liked)}")
+        if disliked:
+            lines.append(f"评价较低: {'、'.join(disliked)}")
+        
+        canteens = sorted(profile.canteen_counts.items(), key=lambda item: item[1], reverse=True)
+        lines.append("常去食堂: " + "、".join(
+            f"{canteen}({count}次)" for canteen, count in canteens[:3]
+        ))
+        
+        for meal_type in meal_types or list(profile.meal_macros):
+            macros = profile.meal_macros.get(meal_type)
+            if macros and macros.count:
+                lines.append(
+                    f"{meal_type}平均摄入: {macros.calories:.0f}kcal, 蛋白质{macros.protein:.0f}g, "
+                    f"碳水{macros.carbs:.0f}g, 脂肪{macros.fat:.0f}g"
+                )
+        
+        recent = await self._get_foods(profile.recent_food_ids[:top_n])
+        if recent:
+            lines.append(f"最近吃过 (尽量避免重复): {'、'.join(food.name for food in recent)}")
+        
+        return lines
+
+
+# Global instance
+_taste_profile_service = Singleton("taste_profile_service", TasteProfileService)
+
+
+def get_taste_profile_service() -> TasteProfileService:
+    """获取口味画像服务单例."""
+    return _taste_profile_service.get()
@@ -0,0 +1,124 @@
+"""Scheduled cache warmup before meal peaks."""
+import asyncio
+from datetime import datetime, timedelta, time as dt_time
+from typing import List, Optional, Tuple
+from app.config import get_settings
+from app.registry import Singleton
+from app.models import UserPreferences, FitnessGoal
+from app.services.rag_service import preference_signature
+from app.services.recommendation import RecommendationService, get_recommendation_service
+from app.database import get_user_db
+
+
+def parse_schedule(schedule: str) -> List[Tuple[str, dt_time]]:
+    """解析预热时间表，格式为 "午餐@11:15,晚餐@17:15"."""
+    entries = []
+    for item in schedule.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        meal_type, _, at = item.partition("@")
+        hour, _, minute = at.partition(":")
+        entries.append((meal_type.strip(), dt_time(int(hour), int(minute or 0))))
+    return entries
+
+
+class WarmupService:
+    """在用餐高峰前预先计算常见分组的检索结果和推荐."""
+    
+    def __init__(self):
+        """Initialize warmup service."""
+        self.settings = get_settings()
+        self.schedule = parse_schedule(self.settings.warmup_schedule)
+    
+    @property
+    def recommendation_service(self) -> RecommendationService:
+        """推荐服务，首次预热时才创建."""
+        return get_recommendation_service()
+    
+    async def _segments(self) -> List[Optional[UserPreferences]]:
+        """枚举需要预热的偏好分组: 目标 × 食堂，以及最常见的用户偏好."""
+        vector_db = self.recommendation_service.rag_service.vector_db
+        canteens = sorted({food.canteen for food in vector_db.get_all_foods()})
+        
+        segments: List[Optional[UserPreferences]] = [None]
+        for goal in FitnessGoal:
+            segments.append(UserPreferences(goal=goal))
+            segments.extend(
+                UserPreferences(goal=goal, preferred_canteens=[canteen])
+                for canteen in canteens
+            )
+        
+        if self.settings.warmup_top_n > 0:
+            user_db = await get_user_db()
+            segments.extend(await user_db.get_top_preferences(self.settings.warmup_top_n))
+        
+        # Drop duplicates while keeping order
+        unique = {}
+        for preferences in segments:
+            unique.setdefault(preference_signature(preferences), preferences)
+        return list(unique.values())
+    
+    async def warm(self, meal_type: str) -> int:
+        """预热一个餐次，返回预热的分组数量."""
+        segments = await self._segments()
+        
+        # Fill the retrieval cache for all segments in one batched vector query
+        await self.recommendation_service.rag_service.retrieve_relevant_foods_batch(
+            [(meal_type, preferences) for preferences in segments],
+            n_results=15
+        )
+        
+        semaphore = asyncio.Semaphore(max(1, self.settings.batch_llm_concurrency))
+        
+        async def warm_one(preferences: Optional[UserPreferences]) -> None:
+            async with semaphore:
+                await self.recommendation_service.warm_segment(meal_type, preferences)
+        
+        results = await asyncio.gather(
+            *(warm_one(preferences) for preferences in segments),
+            return_exceptions=True
+        )
+        failed = sum(1 for result in results if isinstance(result, Exception))
+        if failed:
+            print(f"⚠️  Warmup for {meal_type}: {failed} segments failed")
+        return len(segments) - failed
+    
+    def next_run(self, now: Optional[datetime] = None) -> Optional[Tuple[datetime, str]]:
+        """计算下一次预热的时间和餐次."""
+        if not self.schedule:
+            return None
+        
+        now = now or datetime.now()
+        candidates = []
+        for meal_type, at in self.schedule:
+            run_at = datetime.combine(now.date(), at)
+            if run_at <= now:
+                run_at += timedelta(days=1)
+            candidates.append((run_at, meal_type))
+        return min(candidates)
+    
+    async def run_forever(self) -> None:
+        """按时间表循环执行预热."""
+        while True:
+            next_run = self.next_run()
+            if next_run is None:
+                return
+            
+            run_at, meal_type = next_run
+            await asyncio.sleep(max(0.0, (run_at - datetime.now()).total_seconds()))
+            
+            try:
+                warmed = await self.warm(meal_type)
+                print(f"🔥 Warmed {warmed} segments for {meal_type}")
+            except Exception as e:
+                print(f"⚠️  Warmup for {meal_type} failed: {e}")
+
+
+# Global instance
+_warmup_service = Singleton("warmup_service", WarmupService)
+
+
+def get_warmup_service() -> WarmupService:
+    """获取预热服务单例."""
+    return _warmup_service.get()
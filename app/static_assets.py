@@ -0,0 +1,112 @@
+"""Content-hashed URLs for the static frontend.
+
+HTML pages are served with their ``/static/...`` references rewritten to
+``/static/<name>.<hash><ext>``. Those URLs change whenever the file does,
+so they are cached for a year as immutable; the pages themselves and
+unhashed asset URLs are revalidated on every visit (ETag / 304), so a
+repeat visit costs one conditional request.
+"""
+import hashlib
+import re
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from starlette.staticfiles import StaticFiles
+from app.responses import IMMUTABLE_CACHE_CONTROL
+
+_HASH_LENGTH = 12
+_HASHED_NAME = re.compile(
+    r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<suffix>\.[^./]+)$" % _HASH_LENGTH
+)
+_STATIC_REFERENCE = re.compile(r"""(?P<quote>["'])/static/(?P<path>[^"'?#]+)(?P=quote)""")
+
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+
+class StaticAssets:
+    """静态目录中文件的内容哈希 (按修改时间和大小缓存)."""
+    
+    def __init__(self, directory: Path, prefix: str = "/static"):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self._digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._sources: Dict[str, Tuple[Tuple[int, int], str, Tuple[str, ...]]] = {}
+        self._pages: Dict[str, Tuple[Any, bytes, str]] = {}
+    
+    def _file(self, relative: str) -> Optional[Path]:
+        """目录内的文件，路径越界或不存在时返回None."""
+        path = (self.directory / relative).resolve()
+        if self.directory.resolve() not in path.parents or not path.is_file():
+            return None
+        return path
+    
+    def digest(self, relative: str) -> Optional[str]:
+        """文件内容哈希的前12位."""
+        path = self._file(relative)
+        if path is None:
+            return None
+        stat = path.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._digests.get(relative)
+        if cached is None or cached[0] != key:
+            cached = (key, hashlib.sha256(path.read_bytes()).hexdigest()[:_HASH_LENGTH])
+            self._digests[relative] = cached
+        return cached[1]
+    
+    def url(self, relative: str) -> str:
+        """带内容哈希的URL; 文件不存在时返回原URL."""
+        digest = self.digest(relative)
+        if digest is None:
+            return f"{self.prefix}/{relative}"
+        path = Path(relative)
+        return f"{self.prefix}/{path.with_name(f'{path.stem}.{digest}{path.suffix}').as_posix()}"
+    
+    def resolve(self, relative: str) -> Tuple[str, bool]:
+        """把带哈希的路径还原为文件路径，并返回哈希是否与当前内容一致."""
+        path = Path(relative)
+        match = _HASHED_NAME.match(path.name)
+        if match is None or self._file(relative) is not None:
+            return relative, False
+        original = path.with_name(match["stem"] + match["suffix"]).as_posix()
+        return original, self.digest(original) == match["hash"]
+    
+    def render_page(self, relative: str) -> Optional[Tuple[bytes, str]]:
+        """HTML页面 (静态资源引用替换为带哈希的URL) 及其ETag."""
+        path = self._file(relative)
+        if path is None:
+            return None
+        stat = path.stat()
+        source = self._sources.get(relative)
+        if source is None or source[0] != (stat.st_mtime_ns, stat.st_size):
+            text = path.read_text(encoding="utf-8")
+            references = tuple(dict.fromkeys(m["path"] for m in _STATIC_REFERENCE.finditer(text)))
+            source = ((stat.st_mtime_ns, stat.st_size), text, references)
+            self._sources[relative] = source
+        
+        # Referenced assets can change without the page changing
+        key = (source[0], tuple(self.url(reference) for reference in source[2]))
+        cached = self._pages.get(relative)
+        if cached is None or cached[0] != key:
+            body = _STATIC_REFERENCE.sub(
+                lambda m: f"{m['quote']}{self.url(m['path'])}{m['quote']}", source[1]
+            ).encode("utf-8")
+            cached = (key, body, f'"{hashlib.sha256(body).hexdigest()[:_HASH_LENGTH]}"')
+            self._pages[relative] = cached
+        return cached[1], cached[2]
+
+
+class HashedStaticFiles(StaticFiles):
+    """支持带哈希URL的静态文件: 哈希匹配时长期缓存，否则每次重新验证."""
+    
+    def __init__(self, assets: StaticAssets, **kwargs):
+        super().__init__(directory=str(assets.directory), **kwargs)
+        self.assets = assets
+    
+    async def get_response(self, path: str, scope):
+        original, current = self.assets.resolve(path)
+        response = await super().get_response(original, scope)
+        if response.status_code in (200, 304):
+            # A stale hash still gets the current file, but must not be pinned
+            response.headers["Cache-Control"] = (
+                IMMUTABLE_CACHE_CONTROL if current else REVALIDATE_CACHE_CONTROL
+            )
+        return response
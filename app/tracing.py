@@ -0,0 +1,297 @@
+"""Request-scoped tracing with OpenTelemetry-compatible spans.
+
+Spans nest through a context variable, so children created in awaited
+coroutines, gathered tasks and ``asyncio.to_thread`` calls attach to the
+right parent. Finished spans go to a pluggable exporter; with the default
+no-op exporter ``span()`` returns a shared inert object and costs one
+attribute lookup.
+"""
+import contextvars
+import json
+import random
+import threading
+import time
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+from app.config import get_settings
+from app.registry import Singleton
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class Span:
+    """一个计时的操作，带父子关系和属性."""
+    
+    __slots__ = (
+        "tracer", "name", "attributes", "trace_id", "span_id", "parent_id",
+        "start_ns", "end_ns", "error", "_token"
+    )
+    
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.error: Optional[str] = None
+    
+    def set_attribute(self, key: str, value: Any) -> None:
+        """设置属性 (数量、token数等)."""
+        self.attributes[key] = value
+    
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        # W3C trace context sizes: 16-byte trace ID, 8-byte span ID
+        self.trace_id = parent.trace_id if parent else f"{random.getrandbits(128):032x}"
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        return self
+    
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.end_ns = time.time_ns()
+        _current_span.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        exporter = self.tracer.exporter
+        if exporter is not None:
+            exporter.export(self)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典."""
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "attributes": self.attributes,
+        }
+        if self.error:
+            record["error"] = self.error
+        return record
+
+
+class _NoopSpan:
+    """追踪关闭时使用的空span."""
+    
+    __slots__ = ()
+    
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+    
+    def __enter__(self) -> "_NoopSpan":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter:
+    """导出已结束的span; 默认丢弃 (no-op)."""
+    
+    def export(self, span: Span) -> None:
+        """导出一个span."""
+    
+    def shutdown(self) -> None:
+        """写完缓冲并释放资源."""
+
+
+class ConsoleSpanExporter(SpanExporter):
+    """每个span输出一行JSON到标准输出."""
+    
+    def export(self, span: Span) -> None:
+        """导出一个span."""
+        print(json.dumps(span.to_dict(), ensure_ascii=False, default=str), flush=True)
+
+
+class FileSpanExporter(SpanExporter):
+    """每个span追加一行JSON到文件."""
+    
+    def __init__(self, path: str):
+        """Open the trace file for appending."""
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+    
+    def export(self, span: Span) -> None:
+        """导出一个span."""
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+    
+    def shutdown(self) -> None:
+        """关闭文件."""
+        with self._lock:
+            self._file.close()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """OTLP/JSON 属性值."""
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class OTLPSpanExporter(SpanExporter):
+    """以 OTLP/HTTP JSON 批量发送span到收集器 (如 OpenTelemetry Collector、Jaeger).
+    
+    请求路径上只做入队，后台线程按间隔或批大小发送; 收集器不可用时丢弃该批。
+    """
+    
+    def __init__(
+        self,
+        endpoint: str,
+        service_name: str,
+        batch_size: int = 256,
+        interval: float = 2.0,
+        max_queue_size: int = 4096
+    ):
+        """Start the background sender."""
+        import httpx
+        
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_queue_size = max_queue_size
+        self._client = httpx.Client(timeout=5.0)
+        self._queue: List[Span] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+    
+    def export(self, span: Span) -> None:
+        """入队一个span; 队列已满时丢弃."""
+        with self._lock:
+            if len(self._queue) >= self.max_queue_size:
+                return
+            self._queue.append(span)
+            full = len(self._queue) >= self.batch_size
+        if full:
+            self._wake.set()
+    
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        """构建 ExportTraceServiceRequest."""
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": self.service_name}}
+            ]},
+            "scopeSpans": [{
+                "scope": {"name": "app.tracing"},
+                "spans": [{
+                    "traceId": span.trace_id,
+                    "spanId": span.span_id,
+                    "parentSpanId": span.parent_id or "",
+                    "name": span.name,
+                    "kind": 1,  # SPAN_KIND_INTERNAL
+                    "startTimeUnixNano": str(span.start_ns),
+                    "endTimeUnixNano": str(span.end_ns),
+                    "attributes": [
+                        {"key": key, "value": _otlp_value(value)}
+                        for key, value in span.attributes.items()
+                    ],
+                    # STATUS_CODE_ERROR / STATUS_CODE_UNSET
+                    "status": {"code": 2, "message": span.error} if span.error else {},
+                } for span in spans],
+            }],
+        }]}
+    
+    def _flush(self) -> None:
+        """发送队列中的全部span."""
+        with self._lock:
+            spans, self._queue = self._queue, []
+        for start in range(0, len(spans), self.batch_size):
+            try:
+                self._client.post(
+                    self.endpoint, json=self._payload(spans[start:start + self.batch_size])
+                ).raise_for_status()
+            except Exception as e:
+                print(f"⚠️ Exporting spans to {self.endpoint} failed: {e}")
+    
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self._flush()
+    
+    def shutdown(self) -> None:
+        """停止后台线程并发送剩余的span."""
+        self._stopped = True
+        self._wake.set()
+        self._thread.join()
+        self._flush()
+        self._client.close()
+
+
+class Tracer:
+    """创建span并交给导出器; 没有导出器时所有span都是空操作."""
+    
+    def __init__(self, exporter: Optional[SpanExporter] = None):
+        """Initialize with an exporter, or none to disable tracing."""
+        self.exporter = exporter
+    
+    def span(self, name: str, **attributes: Any):
+        """开始一个span: ``with tracer.span("rag.retrieve", meal_type=...) as span: ...``."""
+        if self.exporter is None:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+    
+    def close(self) -> None:
+        """关闭导出器，之后的span都是空操作."""
+        exporter, self.exporter = self.exporter, None
+        if exporter is not None:
+            exporter.shutdown()
+
+
+def create_exporter(settings=None) -> Optional[SpanExporter]:
+    """按 tracing_exporter 创建导出器，none 时返回None."""
+    settings = settings or get_settings()
+    kind = settings.tracing_exporter
+    if kind == "none":
+        return None
+    if kind == "console":
+        return ConsoleSpanExporter()
+    if kind == "file":
+        return FileSpanExporter(settings.tracing_file_path)
+    if kind == "otlp":
+        return OTLPSpanExporter(settings.tracing_otlp_endpoint, settings.app_name)
+    raise ValueError(f"Unsupported tracing exporter: {kind}")
+
+
+# Global instance
+_tracer = Singleton("tracer", lambda: Tracer(create_exporter()), close=Tracer.close)
+
+
+def get_tracer() -> Tracer:
+    """获取追踪器单例."""
+    return _tracer.get()
+
+
+def span(name: str, **attributes: Any):
+    """在当前追踪上下文中开始一个子span."""
+    return _tracer.get().span(name, **attributes)
+
+
+def traced(name: str) -> Callable:
+    """为异步方法创建同名span."""
+    def decorate(func: Callable) -> Callable:
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,80 @@
+"""Benchmark collaborative filtering training time and online scoring latency.
+
+Run from the repository root:
+    
+    python -m benchmarks.bench_cf --users 100000 --foods 400
+"""
+import argparse
+import time
+import numpy as np
+from app.services.collaborative import CFModel, build_rating_matrix, train_als
+
+
+def synthetic_ratings(users: int, foods: int, per_user: int, seed: int = 0):
+    """生成带有口味分群结构的合成评分数据."""
+    rng = np.random.default_rng(seed)
+    clusters = 12
+    # Each taste cluster favours a random slice of the menu
+    favourites = [rng.choice(foods, size=foods // 8, replace=False) for _ in range(clusters)]
+    user_cluster = rng.integers(0, clusters, size=users)
+    
+    for user in range(users):
+        liked = favourites[user_cluster[user]]
+        n_liked = int(per_user * 0.7)
+        picks = np.concatenate([
+            rng.choice(liked, size=n_liked),
+            rng.integers(0, foods, size=per_user - n_liked),
+        ])
+        for food in picks:
+            in_cluster = food in liked
+            rated = rng.random() < 0.6
+            rating = int(rng.integers(4, 6) if in_cluster else rng.integers(1, 4)) if rated else None
+            yield f"u{user}", f"f{food}", rating
+
+
+def percentile_ms(samples, q: float) -> float:
+    return float(np.percentile(samples, q) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--foods", type=int, default=400)
+    parser.add_argument("--per-user", type=int, default=20)
+    parser.add_argument("--factors", type=int, default=32)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=10_000)
+    args = parser.parse_args()
+    
+    ratings = list(synthetic_ratings(args.users, args.foods, args.per_user))
+    
+    started = time.perf_counter()
+    preference, confidence, user_ids, item_ids = build_rating_matrix(ratings)
+    build_s = time.perf_counter() - started
+    print(f"matrix: {len(user_ids)} users x {len(item_ids)} foods, "
+          f"{confidence.nnz} nonzeros, built in {build_s:.2f}s")
+    
+    started = time.perf_counter()
+    user_factors, item_factors = train_als(
+        preference, confidence, factors=args.factors, iterations=args.iterations
+    )
+    train_s = time.perf_counter() - started
+    print(f"train:  {args.iterations} iterations, k={args.factors}: {train_s:.2f}s "
+          f"({train_s / args.iterations:.2f}s/iteration)")
+    
+    model = CFModel(user_ids, item_ids, user_factors, item_factors, time.time())
+    rng = np.random.default_rng(1)
+    samples = []
+    for _ in range(args.queries):
+        user_id = user_ids[rng.integers(len(user_ids))]
+        food_ids = [item_ids[i] for i in rng.integers(0, len(item_ids), size=args.candidates)]
+        t0 = time.perf_counter()
+        model.score(user_id, food_ids)
+        samples.append(time.perf_counter() - t0)
+    print(f"score:  {args.candidates} candidates, p50 {percentile_ms(samples, 50):.3f}ms, "
+          f"p99 {percentile_ms(samples, 99):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""End-to-end load test of /api/recommend and /api/chat against a stub LLM.
+
+Starts the stub DeepSeek server (``benchmarks.stub_llm``) and the app under
+uvicorn on a synthetic menu in a temporary data directory, then drives each
+endpoint with a fixed number of concurrent clients for a fixed time.
+Reports requests per second and p50/p95/p99 latency per endpoint, the
+server's startup time (until /ready) and peak RSS, and the mean time per
+pipeline stage taken from /metrics over each run.
+
+Run from the repository root (the app needs the configured embedding model):
+    
+    python -m benchmarks.bench_e2e --foods 2000 --concurrency 32 --duration 30 \\
+        --out results/e2e.json
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+import httpx
+import numpy as np
+from benchmarks.menu import generate_menu
+from benchmarks.results import latency_summary, new_result, peak_rss_mb, print_latency, write_result
+
+_MEALS = ("早餐", "午餐", "晚餐")
+_QUESTIONS = (
+    "减脂期间晚餐应该怎么吃？", "增肌需要每天吃多少蛋白质？", "早餐吃什么比较健康？",
+    "食堂里哪些菜适合控糖？", "运动后应该多久吃饭？", "素食怎么保证蛋白质摄入？",
+)
+_REQUIREMENTS = ("不要太油", "想吃面食", "预算20元以内", "多一点蔬菜", "想喝汤", None)
+_STAGE_LINE = re.compile(
+    r'^(pipeline_stage_duration_seconds|llm_request_duration_seconds)_(sum|count)'
+    r'\{(?:stage|operation)="([^"]+)"\} (\S+)$', re.MULTILINE
+)
+
+
+def free_port() -> int:
+    """获取一个空闲端口."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def seed_index(foods: int, seed: int) -> None:
+    """把合成菜单写入 (环境变量指定的) 向量数据库."""
+    from app.database import get_vector_db
+    get_vector_db().add_food_items(generate_menu(foods, seed=seed))
+
+
+def recommend_payloads(count: int, personal_share: float, rng: np.random.Generator) -> List[dict]:
+    """推荐请求: 一部分带个性化要求 (绕过分组缓存、调用LLM)，其余可命中缓存."""
+    from benchmarks.bench_micro import sample_preferences
+    # Preferences only need the menu's canteens and ingredients
+    preferences = sample_preferences(generate_menu(200), rng, 16)
+    payloads = []
+    for i in range(count):
+        payload = {
+            "user_id": f"bench_user_{rng.integers(1000)}",
+            "meal_type": _MEALS[i % 3],
+            "preferences": preferences[rng.integers(len(preferences))].model_dump(mode="json"),
+        }
+        if rng.random() < personal_share:
+            payload["custom_requirements"] = _REQUIREMENTS[rng.integers(len(_REQUIREMENTS) - 1)]
+        payloads.append(payload)
+    return payloads
+
+
+def chat_payloads(count: int, rng: np.random.Generator) -> List[dict]:
+    """聊天请求."""
+    return [{"message": _QUESTIONS[rng.integers(len(_QUESTIONS))]} for _ in range(count)]
+
+
+def stage_totals(metrics_text: str) -> Dict[str, Tuple[float, float]]:
+    """从 /metrics 读取各阶段 (以及LLM调用) 的累计耗时和次数."""
+    totals: Dict[str, List[float]] = {}
+    for family, field, label, value in _STAGE_LINE.findall(metrics_text):
+        name = label if family.startswith("pipeline") else f"llm_{label}"
+        entry = totals.setdefault(name, [0.0, 0.0])
+        entry[0 if field == "sum" else 1] += float(value)
+    return {name: (total, count) for name, (total, count) in totals.items()}
+
+
+async def wait_ready(base_url: str, timeout: float) -> Tuple[float, float]:
+    """等待服务开始监听和 /ready 返回200，返回两个耗时 (秒)."""
+    started = time.perf_counter()
+    listening = None
+    async with httpx.AsyncClient(base_url=base_url, timeout=5.0) as client:
+        while time.perf_counter() - started < timeout:
+            try:
+                response = await client.get("/ready")
+                listening = listening or time.perf_counter() - started
+                if response.status_code == 200:
+                    return listening, time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f"Server at {base_url} not ready after {timeout}s")
+
+
+async def run_load(
+    base_url: str,
+    path: str,
+    payloads: List[dict],
+    concurrency: int,
+    duration: float
+) -> Tuple[List[float], int, float]:
+    """并发客户端循环发送请求，返回 (成功请求耗时, 失败数, 实际时长)."""
+    samples: List[float] = []
+    errors = 0
+    counter = itertools.count()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+        deadline = time.perf_counter() + duration
+        
+        async def client_loop():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                payload = payloads[next(counter) % len(payloads)]
+                sent = time.perf_counter()
+                try:
+                    response = await client.post(path, json=payload)
+                    ok = response.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                if ok:
+                    samples.append(time.perf_counter() - sent)
+                else:
+                    errors += 1
+        
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return samples, errors, elapsed
+
+
+async def benchmark(args, base_url: str, server_pid: int, result: dict) -> None:
+    """等待服务就绪后依次压测各接口."""
+    listening, ready = await wait_ready(base_url, args.ready_timeout)
+    result["startup_s"]["server_listening"] = listening
+    result["startup_s"]["server_ready"] = ready
+    print(f"🚀 Server listening after {listening:.2f}s, ready after {ready:.2f}s")
+    
+    rng = np.random.default_rng(args.seed)
+    scenarios = {
+        "recommend": ("/api/recommend", recommend_payloads(2000, args.personal_share, rng)),
+        "chat": ("/api/chat", chat_payloads(2000, rng)),
+    }
+    
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        for name, (path, payloads) in scenarios.items():
+            # Warm connections, caches and lazily loaded components
+            await run_load(base_url, path, payloads, min(args.concurrency, 4), args.warmup)
+            
+            before = stage_totals((await client.get("/metrics")).text)
+            samples, errors, elapsed = await run_load(
+                base_url, path, payloads, args.concurrency, args.duration
+            )
+            after = stage_totals((await client.get("/metrics")).text)
+            
+            result["latency"][name] = latency_summary(samples)
+            result["throughput"][name] = len(samples) / elapsed
+            result["stages"][name] = {
+                stage: (total - before.get(stage, (0.0, 0.0))[0]) * 1000 / count_delta
+                for stage, (total, count) in after.items()
+                for count_delta in [count - before.get(stage, (0.0, 0.0))[1]]
+                if count_delta > 0
+            }
+            print_latency(name, result["latency"][name])
+            print(f"{'':16} {result['throughput'][name]:.1f} req/s, {errors} errors")
+            for stage, mean_ms in sorted(result["stages"][name].items(), key=lambda x: -x[1]):
+                print(f"{'':18} {stage:16} mean {mean_ms:.3f}ms")
+    
+    result["rss_mb"]["server"] = peak_rss_mb(str(server_pid))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--foods", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0, help="每个接口的压测时长 (秒)")
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--personal-share", type=float, default=0.5,
+                        help="带个性化要求 (必然调用LLM) 的推荐请求比例")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=60.0)
+    parser.add_argument("--ready-timeout", type=float, default=600.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="结果JSON路径")
+    parser.add_argument("--seed-index", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.seed_index:
+        seed_index(args.foods, args.seed)
+        return
+    
+    result = new_result("e2e", {k: v for k, v in vars(args).items() if k != "seed_index"})
+    with tempfile.TemporaryDirectory() as tmp:
+        stub_port, app_port = free_port(), free_port()
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite+aiosqlite:///{os.path.join(tmp, 'users.db')}",
+            "VECTOR_DB_PATH": os.path.join(tmp, "chroma"),
+            "NUMPY_INDEX_PATH": os.path.join(tmp, "numpy"),
+            "CF_MODEL_PATH": os.path.join(tmp, "cf_model.npz"),
+            "DEEPSEEK_API_BASE": f"http://127.0.0.1:{stub_port}/v1",
+            "DEEPSEEK_API_KEY": "bench",
+            "WARMUP_ENABLED": "False",
+            "METRICS_ENABLED": "True",
+        }
+        
+        print(f"🍜 Indexing {args.foods} synthetic foods...")
+        subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_e2e", "--seed-index",
+             "--foods", str(args.foods), "--seed", str(args.seed)],
+            env=env, check=True
+        )
+        
+        processes = []
+        try:
+            processes.append(subprocess.Popen([
+                sys.executable, "-m", "benchmarks.stub_llm", "--port", str(stub_port),
+                "--latency-ms", str(args.llm_latency_ms),
+                "--tokens-per-second", str(args.llm_tokens_per_second),
+            ], env=env))
+            server = subprocess.Popen([
+                sys.executable, "-m", "uvicorn", "app.main:app",
+                "--host", "127.0.0.1", "--port", str(app_port), "--log-level", "warning",
+            ], env=env)
+            processes.append(server)
+            
+            asyncio.run(benchmark(args, f"http://127.0.0.1:{app_port}", server.pid, result))
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=30)
+    
+    if result["rss_mb"].get("server"):
+        print(f"📈 Server peak RSS {result['rss_mb']['server']:.0f}MB")
+    write_result(result, args.out)
+
+
+if __name__ == "__main__":
+    main()
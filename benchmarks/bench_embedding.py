@@ -0,0 +1,148 @@
+"""Accuracy versus latency of quantized query embedding and vector storage.
+
+The menu is embedded once with the float32 model. Each combination of
+query model (float32 / dynamic int8) and scan storage (float32 / float16 /
+int8, quantized scans rescored in float32) is then compared with the
+float32/float32 baseline on menu queries built the way RAGService builds
+them: recall@k of the retrieved foods and per-query latency.
+
+Run from the repository root (needs the configured embedding model):
+    
+    python -m benchmarks.bench_embedding --k 10
+"""
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from app.config import get_settings
+from app.models import FoodItem, FitnessGoal, UserPreferences
+from app.database.numpy_vector_db import NumpyVectorDatabase
+from app.database.vector_db import load_embedding_model
+from app.services.rag_service import RAGService
+from benchmarks.bench_vector_db import synthetic_menu, unit_vectors
+
+_MENU_DIR = Path(__file__).resolve().parent.parent / "data" / "canteens"
+_MODELS = ("none", "int8")
+_STORAGES = ("float32", "float16", "int8")
+
+
+def load_menu():
+    """读取 data/canteens 下的全部菜单."""
+    foods = {}
+    for path in sorted(_MENU_DIR.glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            for item in json.load(f):
+                foods[item["id"]] = FoodItem.model_validate(item)
+    return list(foods.values())
+
+
+def menu_queries(foods):
+    """用户检索查询 (餐次 x 目标 x 饮食限制) 以及菜名、标签和食材查询."""
+    # Query building needs no service state
+    rag = RAGService.__new__(RAGService)
+    queries = []
+    for meal_type in ("早餐", "午餐", "晚餐"):
+        for goal in FitnessGoal:
+            for restrictions in ([], ["无辣"], ["素食"]):
+                preferences = UserPreferences(goal=goal, dietary_restrictions=restrictions)
+                queries.append(rag._build_search_query(meal_type, preferences))
+    terms = {food.name for food in foods}
+    terms.update(tag for food in foods for tag in food.tags)
+    terms.update(ingredient for food in foods for ingredient in food.ingredients)
+    return queries + sorted(terms)
+
+
+def percentile_ms(samples, q: float) -> float:
+    return float(np.percentile(samples, q) * 1000)
+
+
+def open_index(path: Path, storage: str, model) -> NumpyVectorDatabase:
+    """在 path 下打开一个指定存储精度的索引."""
+    settings = get_settings()
+    settings.numpy_index_path = str(path)
+    settings.vector_storage = storage
+    database = NumpyVectorDatabase()
+    database._embedding_model = model
+    return database
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=3, help="每条查询的计时次数")
+    parser.add_argument("--synthetic-foods", type=int, default=3000,
+                        help="扫描延迟测试的合成向量数量")
+    args = parser.parse_args()
+    
+    settings = get_settings()
+    foods = load_menu()
+    queries = menu_queries(foods)
+    print(f"menu:   {len(foods)} foods, {len(queries)} queries, k={args.k}")
+    
+    models = {
+        quantization: load_embedding_model(
+            settings.model_copy(update={"embedding_quantization": quantization})
+        )
+        for quantization in _MODELS
+    }
+    
+    # Single-query encode latency, as served for an uncached request
+    query_vectors = {}
+    for quantization, model in models.items():
+        samples, vectors = [], []
+        for query in queries:
+            for _ in range(args.repeats):
+                t0 = time.perf_counter()
+                vector = model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+                samples.append(time.perf_counter() - t0)
+            vectors.append(vector[0])
+        query_vectors[quantization] = np.array(vectors, dtype=np.float32)
+        print(f"encode  model={quantization:5} p50 {percentile_ms(samples, 50):.2f}ms, "
+              f"p99 {percentile_ms(samples, 99):.2f}ms")
+    
+    cosine = np.sum(query_vectors["none"] * query_vectors["int8"], axis=1)
+    print(f"int8 vs float32 query vectors: mean cosine {cosine.mean():.4f}, "
+          f"min {cosine.min():.4f}")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        baseline = None
+        for storage in _STORAGES:
+            database = open_index(Path(tmp) / storage, storage, models["none"])
+            database.add_food_items(foods)
+            for quantization in _MODELS:
+                samples, results = [], []
+                for vector in query_vectors[quantization]:
+                    t0 = time.perf_counter()
+                    found = database.search_by_vectors(vector[None, :], args.k)[0]
+                    samples.append(time.perf_counter() - t0)
+                    results.append([food.id for food in found])
+                baseline = baseline or results
+                recall = np.mean([
+                    len(set(got) & set(want)) / max(len(want), 1)
+                    for got, want in zip(results, baseline)
+                ])
+                top1 = np.mean([got[:1] == want[:1] for got, want in zip(results, baseline)])
+                print(f"search  model={quantization:5} storage={storage:7} "
+                      f"recall@{args.k} {recall:.3f}, top-1 {top1:.3f}, "
+                      f"scan p50 {percentile_ms(samples, 50):.3f}ms")
+        
+        # Scan cost at a larger menu, independent of the model
+        synthetic = synthetic_menu(args.synthetic_foods)
+        vectors = unit_vectors(args.synthetic_foods, query_vectors["none"].shape[1], seed=0)
+        probes = unit_vectors(200, vectors.shape[1], seed=1)
+        for storage in _STORAGES:
+            database = open_index(Path(tmp) / f"synthetic-{storage}", storage, None)
+            database.add_food_vectors(synthetic, vectors)
+            samples = []
+            for probe in probes:
+                t0 = time.perf_counter()
+                database.search_by_vectors(probe[None, :], args.k)
+                samples.append(time.perf_counter() - t0)
+            print(f"scan    {args.synthetic_foods} foods storage={storage:7} "
+                  f"p50 {percentile_ms(samples, 50):.3f}ms, p99 {percentile_ms(samples, 99):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""Micro-benchmarks for the recommendation pipeline stages.
+
+Times post-filtering, goal ranking, prompt building, AI response parsing
+and vector search on a synthetic menu (``benchmarks.menu``). Candidate
+lists, preferences and taste profiles vary between calls the way they do
+between requests; replies to parse come from the stub LLM's renderer.
+Result names match the ``stage`` labels of the pipeline metrics.
+
+Run from the repository root (vector search needs the configured
+embedding model; ``--skip-search`` leaves it out):
+    
+    python -m benchmarks.bench_micro --foods 2000 --out results/micro.json
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, List, Sequence
+import numpy as np
+from benchmarks.menu import generate_menu
+from benchmarks.results import latency_summary, new_result, peak_rss_mb, print_latency, write_result
+from benchmarks.stub_llm import render_reply
+
+_MEALS = ("早餐", "午餐", "晚餐")
+
+
+def sample_preferences(menu, rng: np.random.Generator, count: int):
+    """生成一组不同目标、过敏、忌口和食堂偏好的用户偏好."""
+    from app.models import FitnessGoal, UserPreferences
+    canteens = sorted({food.canteen for food in menu})
+    ingredients = sorted({item for food in menu for item in food.ingredients})
+    goals = list(FitnessGoal)
+    preferences = []
+    for _ in range(count):
+        preferences.append(UserPreferences(
+            goal=goals[rng.integers(len(goals))],
+            daily_calories_target=int(rng.integers(1500, 2800)),
+            allergies=[ingredients[rng.integers(len(ingredients))]] if rng.random() < 0.3 else [],
+            disliked_foods=["辣"] if rng.random() < 0.2 else [],
+            preferred_canteens=(
+                list(rng.choice(canteens, size=3, replace=False)) if rng.random() < 0.2 else []
+            ),
+        ))
+    return preferences
+
+
+def sample_profiles(menu, rng: np.random.Generator, count: int):
+    """生成有饮食历史的口味画像."""
+    from app.models import TasteProfile
+    tags = sorted({tag for food in menu for tag in food.tags})
+    ingredients = sorted({item for food in menu for item in food.ingredients})
+    canteens = sorted({food.canteen for food in menu})
+    return [
+        TasteProfile(
+            user_id=f"bench_user_{i}",
+            history_count=int(rng.integers(5, 200)),
+            tag_affinity={tag: float(rng.normal()) for tag in rng.choice(tags, 8)},
+            ingredient_affinity={item: float(rng.normal()) for item in rng.choice(ingredients, 12)},
+            canteen_counts={canteen: int(rng.integers(1, 20)) for canteen in rng.choice(canteens, 3)},
+            recent_food_ids=[menu[j].id for j in rng.integers(len(menu), size=10)],
+        )
+        for i in range(count)
+    ]
+
+
+def measure(call: Callable, cases: Sequence, iterations: int, warmup: int = 20) -> List[float]:
+    """对循环取用的输入逐次计时 (秒)."""
+    for i in range(min(warmup, iterations)):
+        call(*cases[i % len(cases)])
+    samples = []
+    for i in range(iterations):
+        args = cases[i % len(cases)]
+        started = time.perf_counter()
+        call(*args)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--foods", type=int, default=2000)
+    parser.add_argument("--candidates", type=int, default=15, help="n_results; 检索取两倍候选")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--search-queries", type=int, default=300)
+    parser.add_argument("--skip-search", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="结果JSON路径")
+    args = parser.parse_args()
+    
+    result = new_result("micro", vars(args))
+    rng = np.random.default_rng(args.seed)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # Settings are read at first use; keep the benchmark off the real data
+        os.environ["VECTOR_DB_PATH"] = os.path.join(tmp, "chroma")
+        os.environ["NUMPY_INDEX_PATH"] = os.path.join(tmp, "numpy")
+        os.environ["CF_MODEL_PATH"] = os.path.join(tmp, "cf_model.npz")
+        os.environ.setdefault("DEEPSEEK_API_KEY", "bench")
+        
+        from app.config import get_settings
+        from app.database import get_vector_db
+        from app.services.collaborative import get_cf_scorer
+        from app.services.deepseek_service import DeepSeekService
+        from app.services.rag_service import RAGService
+        from app.services.recommendation import RecommendationService
+        
+        menu = generate_menu(args.foods, seed=args.seed)
+        print(f"🍜 Synthetic menu: {len(menu)} foods")
+        
+        # The stages need no vector database, prompt formatting and parsing no client
+        rag = RAGService.__new__(RAGService)
+        rag.settings, rag.cf_scorer = get_settings(), get_cf_scorer()
+        deepseek = DeepSeekService.__new__(DeepSeekService)
+        recommender = RecommendationService.__new__(RecommendationService)
+        
+        preferences = sample_preferences(menu, rng, 64)
+        profiles = sample_profiles(menu, rng, 64)
+        width = args.candidates * 2
+        candidate_lists = [
+            [menu[j] for j in rng.choice(len(menu), width, replace=False)] for _ in range(256)
+        ]
+        requests = [
+            (candidate_lists[i], _MEALS[i % 3], preferences[i % 64], profiles[i % 64])
+            for i in range(256)
+        ]
+        
+        post_filter = [(foods, meal, prefs) for foods, meal, prefs, _ in requests]
+        rank = [
+            (rag._post_filter_foods(foods, meal, prefs) or foods, prefs, profile)
+            for foods, meal, prefs, profile in requests
+        ]
+        prompt_build = [
+            (foods[:args.candidates], prefs, meal, [f"偏好标签: {', '.join(foods[0].tags)}"])
+            for foods, meal, prefs, _ in requests
+        ]
+        
+        def build_prompt(foods, prefs, meal, summary):
+            deepseek._build_user_context(prefs, meal, taste_summary=summary)
+            deepseek._format_food_items(foods)
+        
+        response_parse = []
+        for foods, prefs, meal, summary in prompt_build[:64]:
+            messages = [
+                {"role": "user", "content": deepseek._format_food_items(foods)},
+                {"role": "user", "content": "请按以下格式回复：\n**推荐菜品：**"},
+            ]
+            response_parse.append((render_reply(messages, rng), foods))
+        
+        benches = {
+            "post_filter": (rag._post_filter_foods, post_filter),
+            "rank": (rag._rank_foods_by_goal, rank),
+            "prompt_build": (build_prompt, prompt_build),
+            "response_parse": (recommender._parse_ai_response, response_parse),
+        }
+        for name, (call, cases) in benches.items():
+            result["latency"][name] = latency_summary(measure(call, cases, args.iterations))
+            print_latency(name, result["latency"][name])
+        
+        if not args.skip_search:
+            vector_db = get_vector_db()
+            started = time.perf_counter()
+            vector_db.add_food_items(menu)
+            result["startup_s"]["index_build"] = time.perf_counter() - started
+            
+            queries = [
+                (rag._build_search_query(meal, prefs), width)
+                for _, meal, prefs, _ in requests
+            ]
+            started = time.perf_counter()
+            vector_db.search_foods(*queries[0])
+            result["startup_s"]["first_search"] = time.perf_counter() - started
+            
+            samples = measure(vector_db.search_foods, queries, args.search_queries, warmup=5)
+            result["latency"]["vector_search"] = latency_summary(samples)
+            print_latency("vector_search", result["latency"]["vector_search"])
+    
+    result["rss_mb"]["process"] = peak_rss_mb()
+    print(f"📈 Peak RSS {result['rss_mb']['process']:.0f}MB")
+    write_result(result, args.out)
+
+
+if __name__ == "__main__":
+    main()
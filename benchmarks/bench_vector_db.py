@@ -0,0 +1,155 @@
+"""Benchmark the ChromaDB and NumPy vector backends: query latency, RSS and cold start.
+
+Both backends index the same synthetic menu with the same random unit
+vectors, so only the index layer is measured (the embedding model is
+identical for both and excluded). Each backend is opened in a fresh
+subprocess so cold start and peak RSS are not shared.
+
+Run from the repository root:
+    
+    python -m benchmarks.bench_vector_db --foods 3000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+import numpy as np
+from benchmarks.results import peak_rss_mb
+
+_MENU_PATH = Path(__file__).resolve().parent.parent / "data" / "canteens" / "sample_menu.json"
+_BACKENDS = ("chroma", "numpy")
+
+
+def synthetic_menu(foods: int):
+    """将示例菜单复制扩充到指定数量."""
+    from app.models import FoodItem
+    with open(_MENU_PATH, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    return [
+        FoodItem.model_validate({**base[i % len(base)], "id": f"bench_{i}"})
+        for i in range(foods)
+    ]
+
+
+def unit_vectors(rows: int, dim: int, seed: int) -> np.ndarray:
+    """生成归一化的随机向量."""
+    vectors = np.random.default_rng(seed).standard_normal((rows, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def build(path: Path, foods: int, dim: int) -> None:
+    """为两个后端写入相同的索引."""
+    menu = synthetic_menu(foods)
+    vectors = unit_vectors(foods, dim, seed=0)
+    
+    import chromadb
+    from chromadb.config import Settings as ChromaSettings
+    from app.database.vector_db import _encode_food_metadata
+    from app.database.numpy_vector_db import NumpyVectorDatabase
+    
+    client = chromadb.PersistentClient(
+        path=str(path / "chroma"), settings=ChromaSettings(anonymized_telemetry=False)
+    )
+    collection = client.get_or_create_collection(
+        name="food_items", metadata={"hnsw:space": "cosine"}
+    )
+    for start in range(0, foods, 1000):
+        batch = menu[start:start + 1000]
+        collection.add(
+            ids=[food.id for food in batch],
+            embeddings=vectors[start:start + 1000].tolist(),
+            metadatas=[_encode_food_metadata(food) for food in batch],
+        )
+    
+    NumpyVectorDatabase().add_food_vectors(menu, vectors)
+
+
+def worker(backend: str, path: Path, queries: int, dim: int, n_results: int) -> dict:
+    """在子进程中打开一个后端并测量; 返回结果字典."""
+    query_vectors = unit_vectors(queries, dim, seed=1)
+    started = time.perf_counter()
+    
+    if backend == "chroma":
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        from app.database.vector_db import _decode_food_metadata
+        
+        collection = chromadb.PersistentClient(
+            path=str(path / "chroma"), settings=ChromaSettings(anonymized_telemetry=False)
+        ).get_collection("food_items")
+        
+        def search(vector):
+            result = collection.query(
+                query_embeddings=[vector.tolist()], n_results=n_results, include=["metadatas"]
+            )
+            return [_decode_food_metadata(m) for m in result["metadatas"][0]]
+    else:
+        from app.database.numpy_vector_db import NumpyVectorDatabase
+        database = NumpyVectorDatabase()
+        
+        def search(vector):
+            return database.search_by_vectors(vector[None, :], n_results)[0]
+    
+    search(query_vectors[0])
+    cold_start = time.perf_counter() - started
+    
+    samples = []
+    for vector in query_vectors:
+        t0 = time.perf_counter()
+        search(vector)
+        samples.append(time.perf_counter() - t0)
+    
+    return {
+        "backend": backend,
+        "cold_start_s": cold_start,
+        "p50_ms": float(np.percentile(samples, 50) * 1000),
+        "p99_ms": float(np.percentile(samples, 99) * 1000),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--foods", type=int, default=3000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--n-results", type=int, default=10)
+    parser.add_argument("--worker", choices=_BACKENDS, help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.worker:
+        result = worker(args.worker, Path(args.path), args.queries, args.dim, args.n_results)
+        print(json.dumps(result))
+        return
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp)
+        # Settings are read at first use, so the NumPy backend picks this up in every process
+        os.environ["NUMPY_INDEX_PATH"] = str(path / "numpy")
+        
+        started = time.perf_counter()
+        build(path, args.foods, args.dim)
+        print(f"index:  {args.foods} foods x {args.dim} dims, built in "
+              f"{time.perf_counter() - started:.2f}s")
+        
+        for backend in _BACKENDS:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_vector_db",
+                 "--worker", backend, "--path", tmp,
+                 "--queries", str(args.queries), "--dim", str(args.dim),
+                 "--n-results", str(args.n_results)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{backend:7} cold start {result['cold_start_s']:.2f}s, "
+                  f"p50 {result['p50_ms']:.3f}ms, p99 {result['p99_ms']:.3f}ms, "
+                  f"peak RSS {result['peak_rss_mb']:.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
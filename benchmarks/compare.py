@@ -0,0 +1,178 @@
+"""Compare two benchmark result files and fail on performance regressions.
+
+Reads result JSON written by the benchmarks (``benchmarks.results``) for a
+base and a head run and checks every metric present in both:
+
+- latency: one-sided Mann–Whitney U test on the raw samples (is head
+  slower?) plus a minimum relative change of the median, so a
+  significant but negligible shift does not fail the gate;
+- throughput, peak RSS and startup time: relative change beyond a
+  threshold (single values, no samples to test);
+- pipeline stages: relative change of the mean time per stage, ignoring
+  stages below an absolute floor.
+
+Exits 1 when any metric regresses, 2 when the files are not comparable.
+    
+    python -m benchmarks.compare results/base.json results/head.json
+"""
+import argparse
+import json
+import sys
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+
+@dataclass
+class Thresholds:
+    """回归判定阈值 (相对变化)."""
+    alpha: float = 0.01  # Mann–Whitney 显著性水平
+    latency: float = 0.10  # 中位数变慢超过10%
+    throughput: float = 0.10  # 吞吐下降超过10%
+    rss: float = 0.15
+    startup: float = 0.20
+    stage: float = 0.20
+    min_stage_ms: float = 0.05  # 两次运行都低于该值的阶段不判定
+    min_startup_s: float = 0.1
+
+
+@dataclass
+class Check:
+    """一项指标的比较结果."""
+    section: str
+    name: str
+    base: float
+    head: float
+    change: float  # Relative change, positive = larger in head
+    verdict: str  # ok / regression / improvement
+    p_value: Optional[float] = None
+
+
+def _relative(base: float, head: float) -> float:
+    return (head - base) / base if base else 0.0
+
+
+def _verdict(change: float, threshold: float, higher_is_worse: bool = True) -> str:
+    worse = change if higher_is_worse else -change
+    if worse > threshold:
+        return "regression"
+    if worse < -threshold:
+        return "improvement"
+    return "ok"
+
+
+def compare_latency(
+    name: str,
+    base: Dict[str, Any],
+    head: Dict[str, Any],
+    limits: Thresholds
+) -> Check:
+    """比较两组耗时样本: 显著变慢且中位数变化超过阈值才算回归."""
+    from scipy.stats import mannwhitneyu
+    
+    base_samples = np.asarray(base.get("samples") or [], dtype=np.float64)
+    head_samples = np.asarray(head.get("samples") or [], dtype=np.float64)
+    base_p50 = base.get("p50", float(np.median(base_samples)) if len(base_samples) else 0.0)
+    head_p50 = head.get("p50", float(np.median(head_samples)) if len(head_samples) else 0.0)
+    change = _relative(base_p50, head_p50)
+    
+    if len(base_samples) < 5 or len(head_samples) < 5:
+        # Too few samples to test; fall back to the median threshold alone
+        return Check("latency", name, base_p50, head_p50, change, _verdict(change, limits.latency))
+    
+    slower = mannwhitneyu(head_samples, base_samples, alternative="greater").pvalue
+    faster = mannwhitneyu(head_samples, base_samples, alternative="less").pvalue
+    verdict = "ok"
+    if slower < limits.alpha and change > limits.latency:
+        verdict = "regression"
+    elif faster < limits.alpha and change < -limits.latency:
+        verdict = "improvement"
+    p_value = slower if change >= 0 else faster
+    return Check("latency", name, base_p50, head_p50, change, verdict, float(p_value))
+
+
+def compare_results(base: Dict[str, Any], head: Dict[str, Any], limits: Thresholds) -> List[Check]:
+    """比较两次运行中都存在的全部指标."""
+    checks = []
+    for name in sorted(base.get("latency", {}).keys() & head.get("latency", {}).keys()):
+        checks.append(compare_latency(name, base["latency"][name], head["latency"][name], limits))
+    
+    for section, threshold, higher_is_worse, floor in (
+        ("throughput", limits.throughput, False, 0.0),
+        ("rss_mb", limits.rss, True, 0.0),
+        ("startup_s", limits.startup, True, limits.min_startup_s),
+    ):
+        values_base, values_head = base.get(section, {}), head.get(section, {})
+        for name in sorted(values_base.keys() & values_head.keys()):
+            old, new = values_base[name], values_head[name]
+            if old is None or new is None:
+                continue
+            change = _relative(old, new)
+            verdict = "ok" if max(old, new) < floor else _verdict(change, threshold, higher_is_worse)
+            checks.append(Check(section, name, old, new, change, verdict))
+    
+    for scenario in sorted(base.get("stages", {}).keys() & head.get("stages", {}).keys()):
+        stages_base, stages_head = base["stages"][scenario], head["stages"][scenario]
+        for stage in sorted(stages_base.keys() & stages_head.keys()):
+            old, new = stages_base[stage], stages_head[stage]
+            change = _relative(old, new)
+            verdict = (
+                "ok" if max(old, new) < limits.min_stage_ms else _verdict(change, limits.stage)
+            )
+            checks.append(Check("stages", f"{scenario}.{stage}", old, new, change, verdict))
+    return checks
+
+
+def print_report(base: Dict[str, Any], head: Dict[str, Any], checks: List[Check]) -> None:
+    """打印比较表."""
+    print(f"base: {base.get('benchmark')} @ {base.get('commit')} ({base.get('timestamp')})")
+    print(f"head: {head.get('benchmark')} @ {head.get('commit')} ({head.get('timestamp')})")
+    marks = {"ok": "  ", "regression": "❌", "improvement": "🚀"}
+    for check in checks:
+        p_value = f"  p={check.p_value:.2g}" if check.p_value is not None else ""
+        print(f"{marks[check.verdict]} {check.section:10} {check.name:28} "
+              f"{check.base:12.3f} -> {check.head:12.3f}  {check.change:+7.1%}{p_value}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    defaults = Thresholds()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    for field, value in asdict(defaults).items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=float, default=value)
+    parser.add_argument("--json", help="把比较结果写入JSON文件")
+    args = parser.parse_args(argv)
+    
+    with open(args.base, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(args.head, "r", encoding="utf-8") as f:
+        head = json.load(f)
+    if base.get("benchmark") != head.get("benchmark"):
+        print(f"❌ Cannot compare {base.get('benchmark')} results with {head.get('benchmark')}")
+        return 2
+    if base.get("config") != head.get("config"):
+        print("⚠️ Benchmark configurations differ; comparing anyway")
+    
+    limits = Thresholds(**{field: getattr(args, field) for field in asdict(defaults)})
+    checks = compare_results(base, head, limits)
+    print_report(base, head, checks)
+    
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump([asdict(check) for check in checks], f, ensure_ascii=False, indent=2)
+    
+    if not checks:
+        print("⚠️ No metrics in common")
+        return 2
+    regressions = [check for check in checks if check.verdict == "regression"]
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s): "
+              + ", ".join(f"{check.section}.{check.name}" for check in regressions))
+        return 1
+    print(f"✅ No regressions in {len(checks)} metrics")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
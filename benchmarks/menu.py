@@ -0,0 +1,139 @@
+"""Synthetic canteen menus shaped like the real one.
+
+Canteen, category and meal-slot frequencies, and each category's dishes,
+ingredients, tags, prices and nutrition, are taken from the menus in
+``data/canteens``. Generated dishes are variations of a real dish of the
+sampled category (a cooking style, jittered nutrition and price, some
+tags swapped within the category), so filters, ranking and retrieval see
+realistic distributions at any menu size.
+
+Run from the repository root to write a menu file:
+    
+    python -m benchmarks.menu --size 2000 --out /tmp/menu.json
+"""
+import argparse
+import json
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+from app.models import FoodItem
+
+_MENU_DIR = Path(__file__).resolve().parent.parent / "data" / "canteens"
+
+# Cooking styles prefixed to dish names, with the tags they imply
+_STYLES: Dict[str, List[str]] = {
+    "": [], "招牌": [], "家常": [], "秘制": [], "番茄": ["酸甜"], "黑椒": [],
+    "红烧": ["重口味"], "清蒸": ["清淡", "低脂"], "香煎": ["烤制"], "蒜蓉": [],
+    "麻辣": ["辣", "重口味"], "宫保": ["辣"], "咖喱": ["重口味"], "照烧": ["日式"],
+    "菌菇": ["素食"], "轻食": ["低卡", "健康"],
+}
+
+
+def load_reference_menu() -> List[dict]:
+    """读取 data/canteens 下的全部菜单."""
+    foods = {}
+    for path in sorted(_MENU_DIR.glob("*.json")):
+        with open(path, "r", encoding="utf-8") as f:
+            for item in json.load(f):
+                foods[item["id"]] = item
+    return list(foods.values())
+
+
+def _weights(counter: Counter) -> tuple:
+    keys = sorted(counter)
+    weights = np.array([counter[key] for key in keys], dtype=np.float64)
+    return keys, weights / weights.sum()
+
+
+def generate_menu(
+    size: int,
+    seed: int = 0,
+    canteens: Optional[int] = None,
+    reference: Optional[List[dict]] = None
+) -> List[FoodItem]:
+    """生成指定数量的菜品; canteens 多于真实食堂数时补充按Zipf分布的虚构食堂."""
+    reference = reference or load_reference_menu()
+    rng = np.random.default_rng(seed)
+    
+    canteen_names, canteen_weights = _weights(Counter(food["canteen"] for food in reference))
+    if canteens and canteens > len(canteen_names):
+        # Extra canteens get Zipf-like shares of the traffic behind the real ones
+        extra = [f"第{i}食堂" for i in range(1, canteens - len(canteen_names) + 1)]
+        extra_weights = 0.3 / np.arange(2, len(extra) + 2)
+        canteen_names = canteen_names + extra
+        canteen_weights = np.concatenate([canteen_weights, extra_weights])
+        canteen_weights = canteen_weights / canteen_weights.sum()
+    
+    categories, category_weights = _weights(Counter(food["category"] for food in reference))
+    dishes = {category: [f for f in reference if f["category"] == category] for category in categories}
+    category_tags = {
+        category: sorted({tag for dish in dishes[category] for tag in dish["tags"]})
+        for category in categories
+    }
+    category_ingredients = {
+        category: sorted({item for dish in dishes[category] for item in dish["ingredients"]})
+        for category in categories
+    }
+    styles = list(_STYLES)
+    
+    menu = []
+    names: Counter = Counter()
+    for i in range(size):
+        category = categories[rng.choice(len(categories), p=category_weights)]
+        base = dishes[category][rng.integers(len(dishes[category]))]
+        style = styles[rng.integers(len(styles))] if rng.random() < 0.7 else ""
+        
+        name = f"{style}{base['name']}" if style not in base["name"] else base["name"]
+        names[name] += 1
+        if names[name] > 1:
+            name = f"{name}·{names[name]}"
+        
+        tags = [tag for tag in base["tags"] if rng.random() < 0.85] + _STYLES[style]
+        if rng.random() < 0.3:
+            tags.append(category_tags[category][rng.integers(len(category_tags[category]))])
+        ingredients = list(base["ingredients"])
+        if rng.random() < 0.4:
+            pool = category_ingredients[category]
+            ingredients.append(pool[rng.integers(len(pool))])
+        
+        # Nutrition varies by portion and recipe; keep values positive and rounded
+        nutrition = {
+            key: round(float(value * rng.lognormal(0.0, 0.15)), 1)
+            for key, value in base["nutrition"].items() if value is not None
+        }
+        menu.append(FoodItem(
+            id=f"syn_{i:06d}",
+            name=name,
+            canteen=canteen_names[rng.choice(len(canteen_names), p=canteen_weights)],
+            category=category,
+            price=round(float(base["price"] * rng.uniform(0.8, 1.3)) * 2) / 2,
+            nutrition=nutrition,
+            ingredients=list(dict.fromkeys(ingredients)),
+            tags=list(dict.fromkeys(tags)),
+            available_meals=list(base["available_meals"]),
+            description=base.get("description"),
+        ))
+    return menu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--canteens", type=int, default=None)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    
+    menu = generate_menu(args.size, args.seed, args.canteens)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump([food.model_dump() for food in menu], f, ensure_ascii=False, indent=2)
+    
+    print(f"✅ Wrote {len(menu)} foods to {args.out}")
+    for field in ("canteen", "category"):
+        counts = Counter(getattr(food, field) for food in menu).most_common(5)
+        print(f"   {field}: " + ", ".join(f"{key} {count}" for key, count in counts))
+
+
+if __name__ == "__main__":
+    main()
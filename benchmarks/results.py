@@ -0,0 +1,102 @@
+"""Shared helpers for benchmark result files.
+
+Every benchmark writes one JSON document with the same top-level
+sections, so runs can be compared between commits
+(``python -m benchmarks.compare base.json head.json``):
+    
+    {
+      "benchmark": "micro", "commit": "...", "timestamp": "...", "config": {...},
+      "latency":    {name: {"unit": "ms", "n", "mean", "p50", "p95", "p99", "samples"}},
+      "throughput": {name: requests per second},
+      "rss_mb":     {name: peak resident set size},
+      "startup_s":  {name: seconds until ready},
+      "stages":     {scenario: {stage: mean ms}}
+    }
+"""
+import json
+import platform
+import resource
+import subprocess
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
+
+
+def latency_summary(samples: List[float]) -> Dict[str, Any]:
+    """汇总一组耗时样本 (秒)，保留毫秒样本供统计检验."""
+    ms = np.asarray(samples, dtype=np.float64) * 1000
+    if not len(ms):
+        return {"unit": "ms", "n": 0, "samples": []}
+    return {
+        "unit": "ms",
+        "n": int(len(ms)),
+        "mean": float(ms.mean()),
+        "p50": float(np.percentile(ms, 50)),
+        "p95": float(np.percentile(ms, 95)),
+        "p99": float(np.percentile(ms, 99)),
+        "samples": [round(float(value), 4) for value in ms],
+    }
+
+
+def peak_rss_mb(pid: str = "self") -> Optional[float]:
+    """进程的峰值RSS (MB); 只有 /proc 时才能读取其他进程."""
+    # ru_maxrss survives exec, so a child would report the parent's peak
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if pid == "self":
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+def git_commit() -> Optional[str]:
+    """当前提交 (工作区有改动时加 -dirty 后缀)."""
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty", "--abbrev=12"],
+            check=True, capture_output=True, text=True,
+            cwd=Path(__file__).resolve().parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def new_result(benchmark: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """创建空的结果文档."""
+    return {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": config,
+        "latency": {},
+        "throughput": {},
+        "rss_mb": {},
+        "startup_s": {},
+        "stages": {},
+    }
+
+
+def write_result(result: Dict[str, Any], path: Optional[str]) -> None:
+    """写入结果文件; 未指定路径时不写入."""
+    if not path:
+        return
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    print(f"💾 Results written to {path}")
+
+
+def print_latency(name: str, summary: Dict[str, Any]) -> None:
+    """打印一行耗时摘要."""
+    if not summary["n"]:
+        print(f"{name:16} no samples")
+        return
+    print(f"{name:16} n={summary['n']:<6} p50 {summary['p50']:.3f}ms  "
+          f"p95 {summary['p95']:.3f}ms  p99 {summary['p99']:.3f}ms")
@@ -0,0 +1,136 @@
+"""Local stand-in for the DeepSeek chat completions API.
+
+Answers ``POST /v1/chat/completions`` in the OpenAI response format after
+a simulated delay: time to first token (with log-normal jitter) plus the
+completion length divided by the token rate. Replies pick dishes from
+the 【菜名】 blocks in the prompt and follow the format the prompt asks
+for, so the recommendation parser sees realistic input; ``usage`` is
+filled in with estimated token counts.
+
+Run from the repository root and point the app at it:
+    
+    python -m benchmarks.stub_llm --port 8900 --latency-ms 400 --tokens-per-second 60
+    DEEPSEEK_API_BASE=http://127.0.0.1:8900/v1 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import re
+import time
+import uuid
+from typing import Dict, List
+import numpy as np
+from fastapi import FastAPI
+from pydantic import BaseModel
+
+_DISH_PATTERN = re.compile(r"【(.+?)】")
+_MEAL_SECTION = re.compile(r"^## (\S+)", re.MULTILINE)
+
+
+class CompletionRequest(BaseModel):
+    """补全请求 (只使用需要的字段)."""
+    model: str = "deepseek-chat"
+    messages: List[Dict[str, str]]
+    max_tokens: int = 1000
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数 (中文约1.5字符一个token)."""
+    return max(1, round(len(text) / 1.5))
+
+
+def _recommendation_block(names: List[str]) -> str:
+    return "\n".join(f"{i}. {name} - 食堂" for i, name in enumerate(names, 1))
+
+
+def render_reply(messages: List[Dict[str, str]], rng: np.random.Generator) -> str:
+    """按提示要求的格式生成回复."""
+    analysis = (
+        "\n\n**营养分析：**\n- 总卡路里: 650 kcal\n- 总蛋白质: 42 g\n"
+        "\n**推荐理由：**\n这些菜品蛋白质充足、脂肪适中，符合您的健康目标。"
+        "\n\n**饮食建议：**\n细嚼慢咽，注意补充水分，晚餐适量减少主食。"
+    )
+    instruction = messages[-1]["content"] if messages else ""
+    
+    if "推荐菜品" in instruction:
+        dishes = _DISH_PATTERN.findall("\n".join(m["content"] for m in messages))
+        if not dishes:
+            return "菜单中没有合适的菜品。" + analysis
+        count = min(len(dishes), int(rng.integers(2, 5)))
+        picks = [dishes[i] for i in sorted(rng.choice(len(dishes), count, replace=False))]
+        return "**推荐菜品：**\n" + _recommendation_block(picks) + analysis
+    
+    sections = []
+    for message in messages:
+        meal = _MEAL_SECTION.match(message["content"])
+        dishes = _DISH_PATTERN.findall(message["content"])
+        if meal and dishes:
+            count = min(len(dishes), int(rng.integers(1, 4)))
+            picks = [dishes[i] for i in sorted(rng.choice(len(dishes), count, replace=False))]
+            sections.append(f"**{meal.group(1)}推荐：**\n" + _recommendation_block(picks))
+    if sections:
+        return "\n\n".join(sections) + analysis
+    
+    # Free-form chat answer
+    return "建议以优质蛋白和全谷物为主，搭配足量蔬菜，少油少盐。" * int(rng.integers(2, 6))
+
+
+def create_app(
+    latency_ms: float = 400.0,
+    tokens_per_second: float = 60.0,
+    jitter: float = 0.2,
+    seed: int = 0
+) -> FastAPI:
+    """创建桩服务; jitter 为首token延迟的对数正态分布标准差."""
+    app = FastAPI(title="DeepSeek stub")
+    rng = np.random.default_rng(seed)
+    
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def chat_completions(request: CompletionRequest):
+        text = render_reply(request.messages, rng)
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in request.messages)
+        completion_tokens = min(estimate_tokens(text), request.max_tokens)
+        
+        delay = latency_ms / 1000 * rng.lognormal(0.0, jitter) if latency_ms else 0.0
+        if tokens_per_second:
+            delay += completion_tokens / tokens_per_second
+        await asyncio.sleep(delay)
+        
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+    
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=400.0, help="首token延迟 (中位数)")
+    parser.add_argument("--tokens-per-second", type=float, default=60.0, help="0 表示不模拟生成耗时")
+    parser.add_argument("--jitter", type=float, default=0.2)
+    args = parser.parse_args()
+    
+    import uvicorn
+    uvicorn.run(
+        create_app(args.latency_ms, args.tokens_per_second, args.jitter),
+        host=args.host, port=args.port, log_level="warning"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,17 @@
 """Test API endpoints."""
 import pytest
+import sentence_transformers
 from httpx import AsyncClient
+from pydantic import ValidationError
+from app.config import get_settings
+from app.database import get_user_db, get_vector_db
+from app.database.numpy_vector_db import NumpyVectorDatabase
+from app.database.user_db import UserDatabase
 from app.main import app
+from app.models import DailyPlanRequest
+from app.services import RAGService, get_rag_service
+from app.services.recommendation import RecommendationService
+from tests.test_numpy_vector_db import _CharEncoder, _food
 
 
 @pytest.mark.asyncio
@@ -23,3 +33,91 @@ async def test_health():
         assert response.status_code == 200
         data = response.json()
         assert data["status"] == "healthy"
+
+
+@pytest.mark.asyncio
+async def test_history_cursor_errors(tmp_path, monkeypatch):
+    """Only a malformed cursor is a 400; failures while reading the page are 500s."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    db = UserDatabase(f"sqlite+aiosqlite:///{tmp_path / 'users.db'}")
+    await db.init_db()
+    
+    async def broken_page(*args, **kwargs):
+        raise ValueError("row failed validation")
+    
+    app.dependency_overrides[get_user_db] = lambda: db
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            bad_cursor = await client.get("/api/user/u1/history", params={"cursor": "%%%"})
+            monkeypatch.setattr(db, "get_user_history_page", broken_page)
+            failed = await client.get("/api/user/u1/history")
+    finally:
+        app.dependency_overrides.clear()
+        await db.close()
+    
+    assert bad_cursor.status_code == 400 and "游标" in bad_cursor.json()["detail"]
+    assert failed.status_code == 500 and "游标" not in failed.json()["detail"]
+
+
+@pytest.mark.asyncio
+async def test_history_batch_size_is_bounded():
+    """Oversized (and empty) history batches are rejected before touching the database."""
+    row = {"user_id": "u1", "food_id": "a", "food_name": "牛肉面", "canteen": "一食堂", "meal_type": "午餐"}
+    app.dependency_overrides[get_user_db] = lambda: None
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            too_many = await client.post("/api/user/history/batch", json=[row] * 1001)
+            empty = await client.post("/api/user/history/batch", json=[])
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert too_many.status_code == 422 and empty.status_code == 422
+
+
+@pytest.fixture
+def menu_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(sentence_transformers, "SentenceTransformer", _CharEncoder)
+    monkeypatch.setattr(get_settings(), "numpy_index_path", str(tmp_path / "index"))
+    db = NumpyVectorDatabase()
+    db.add_food_items([_food("a", "牛肉面"), _food("b", "番茄鸡蛋汤"), _food("c", "紫米粥")])
+    monkeypatch.setattr("app.services.rag_service.get_vector_db", lambda: db)
+    app.dependency_overrides[get_vector_db] = lambda: db
+    app.dependency_overrides[get_rag_service] = RAGService
+    yield db
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+async def test_food_lookup_and_batch_search(menu_db):
+    """Lookup keeps request order and skips unknown ids; search answers per query; fields= trims."""
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        lookup = await client.post("/api/foods/lookup", json={"ids": ["c", "missing", "a"]})
+        slim = await client.post(
+            "/api/foods/lookup", params={"fields": "id,name"}, json={"ids": ["b"]}
+        )
+        search = await client.post(
+            "/api/foods/search", params={"fields": "name"},
+            json={"queries": ["番茄鸡蛋汤", "紫米粥"], "n_results": 1}
+        )
+        empty = await client.post("/api/foods/lookup", json={"ids": []})
+        too_many = await client.post("/api/foods/search", json={"queries": ["面"] * 21})
+    
+    assert [food["id"] for food in lookup.json()] == ["c", "a"]
+    assert slim.json() == [{"id": "b", "name": "番茄鸡蛋汤"}]
+    assert search.json() == {"results": [[{"name": "番茄鸡蛋汤"}], [{"name": "紫米粥"}]]}
+    assert empty.status_code == 422 and too_many.status_code == 422
+
+
+def test_daily_plan_meal_types_are_bounded_and_deduplicated():
+    """Meal types are stripped and deduplicated in order; empty or oversized lists are rejected."""
+    request = DailyPlanRequest(user_id="u1", meal_types=["午餐", " 晚餐", "午餐", "晚餐"])
+    
+    assert request.meal_types == ["午餐", "晚餐"]
+    for meal_types in ([], [" "], ["早餐"] * 6):
+        with pytest.raises(ValidationError):
+            DailyPlanRequest(user_id="u1", meal_types=meal_types)
+    
+    # Section titles are built from meal types, so they must match literally
+    service = RecommendationService.__new__(RecommendationService)
+    assert service._extract_section("**午餐(加)推荐：** 牛肉面", "午餐(加)推荐") == "牛肉面"
@@ -0,0 +1,102 @@
+"""Test the benchmark menu generator, stub LLM and regression gate."""
+import numpy as np
+import pytest
+from httpx import AsyncClient
+from benchmarks import compare
+from benchmarks.compare import Thresholds, compare_results
+from benchmarks.menu import generate_menu, load_reference_menu
+from benchmarks.results import latency_summary, new_result, write_result
+from benchmarks.stub_llm import create_app
+from app.services.deepseek_service import DeepSeekService
+from app.services.recommendation import RecommendationService
+
+
+def test_generate_menu_is_deterministic_and_shaped_like_reference():
+    """Same seed gives the same menu; categories and meal slots come from the real menu."""
+    menu = generate_menu(500, seed=3, canteens=12)
+    assert [food.model_dump() for food in menu] == [
+        food.model_dump() for food in generate_menu(500, seed=3, canteens=12)
+    ]
+    assert len({food.id for food in menu}) == 500
+    assert len({food.name for food in menu}) == 500
+    
+    reference = load_reference_menu()
+    assert {food.category for food in menu} <= {food["category"] for food in reference}
+    assert len({food.canteen for food in menu}) == 12
+    meals = {food["category"]: food["available_meals"] for food in reference}
+    assert all(food.available_meals for food in menu)
+    assert any(food.available_meals == meals[food.category] for food in menu)
+
+
+@pytest.mark.asyncio
+async def test_stub_llm_reply_parses_into_menu_foods():
+    """The stub answers in the OpenAI format and names dishes the parser can match."""
+    foods = generate_menu(20, seed=1)
+    deepseek = DeepSeekService.__new__(DeepSeekService)
+    messages = [
+        {"role": "user", "content": deepseek._format_food_items(foods)},
+        {"role": "user", "content": "请按以下格式回复：\n**推荐菜品：**"},
+    ]
+    
+    app = create_app(latency_ms=0, tokens_per_second=0)
+    async with AsyncClient(app=app, base_url="http://stub") as client:
+        response = await client.post(
+            "/v1/chat/completions", json={"model": "deepseek-chat", "messages": messages}
+        )
+    
+    body = response.json()
+    assert body["usage"]["completion_tokens"] > 0
+    recommender = RecommendationService.__new__(RecommendationService)
+    picked, reasoning, tips = recommender._parse_ai_response(
+        body["choices"][0]["message"]["content"], foods
+    )
+    assert 2 <= len(picked) <= 4
+    assert reasoning and tips
+
+
+def _result(latency_ms, rss_mb=900.0, throughput=40.0):
+    """A minimal e2e result document."""
+    result = new_result("e2e", {})
+    result["latency"]["recommend"] = latency_summary([value / 1000 for value in latency_ms])
+    result["rss_mb"]["server"] = rss_mb
+    result["throughput"]["recommend"] = throughput
+    result["stages"]["recommend"] = {"rank": 0.01, "vector_query": 30.0}
+    return result
+
+
+def test_compare_flags_latency_and_rss_regressions(tmp_path):
+    """A significant 30% slowdown and 20% more RSS fail; sub-floor stage noise does not."""
+    rng = np.random.default_rng(0)
+    base_samples = rng.lognormal(np.log(200), 0.2, 400)
+    base = _result(base_samples)
+    head = _result(base_samples * 1.3, rss_mb=1080.0)
+    head["stages"]["recommend"]["rank"] = 0.04
+    
+    checks = {(c.section, c.name): c for c in compare_results(base, head, Thresholds())}
+    assert checks["latency", "recommend"].verdict == "regression"
+    assert checks["latency", "recommend"].p_value < 1e-6
+    assert checks["rss_mb", "server"].verdict == "regression"
+    assert checks["throughput", "recommend"].verdict == "ok"
+    assert checks["stages", "recommend.rank"].verdict == "ok"
+    
+    paths = []
+    for name, result in (("base", base), ("head", head)):
+        paths.append(str(tmp_path / f"{name}.json"))
+        write_result(result, paths[-1])
+    assert compare.main(paths) == 1
+
+
+def test_compare_passes_on_resampled_noise(tmp_path):
+    """Two runs drawn from the same distribution pass."""
+    rng = np.random.default_rng(1)
+    base = _result(rng.lognormal(np.log(200), 0.2, 400))
+    head = _result(rng.lognormal(np.log(200), 0.2, 400), rss_mb=920.0, throughput=38.5)
+    
+    assert all(
+        check.verdict != "regression" for check in compare_results(base, head, Thresholds())
+    )
+    paths = []
+    for name, result in (("base", base), ("head", head)):
+        paths.append(str(tmp_path / f"{name}.json"))
+        write_result(result, paths[-1])
+    assert compare.main(paths) == 0
@@ -0,0 +1,31 @@
+"""Test in-process TTL cache."""
+from app.cache import TTLCache
+
+
+def test_lru_eviction():
+    """Least recently used entries are evicted first."""
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_miss(monkeypatch):
+    """Entries past their TTL are treated as misses."""
+    now = [1000.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("key", "value")
+    
+    now[0] += 30
+    assert cache.get("key") == "value"
+    now[0] += 60
+    assert cache.get("key") is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
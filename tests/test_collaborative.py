@@ -0,0 +1,72 @@
+"""Test collaborative filtering training and scoring."""
+import numpy as np
+from app.models import FitnessGoal, TasteProfile, UserPreferences
+from app.services import collaborative, rag_service
+from app.services.collaborative import CFModel, CFScorer, build_rating_matrix, train_als
+from app.services.rag_service import RAGService
+from tests.test_numpy_vector_db import _food
+
+
+def _ratings():
+    # Two taste groups; u3 has only eaten f1 but belongs to the first group
+    rows = []
+    for user in ("u0", "u1", "u2"):
+        rows += [(user, "f0", 5), (user, "f1", 5), (user, "f2", 4), (user, "f3", 1)]
+    for user in ("u4", "u5", "u6"):
+        rows += [(user, "f3", 5), (user, "f4", 5), (user, "f5", None), (user, "f0", 1)]
+    rows.append(("u3", "f1", 5))
+    return rows
+
+
+def test_als_recommends_within_taste_group(tmp_path):
+    """A sparse user inherits its group's taste and the model round-trips to disk."""
+    preference, confidence, user_ids, item_ids = build_rating_matrix(_ratings())
+    user_factors, item_factors = train_als(preference, confidence, factors=4, iterations=15)
+    
+    path = tmp_path / "cf.npz"
+    CFModel(user_ids, item_ids, user_factors, item_factors, 0.0).save(str(path))
+    model = CFModel.load(str(path))
+    
+    scores = model.score("u3", ["f2", "f4", "unknown"])
+    assert scores[0] > scores[1]
+    assert scores[2] == 0.0
+    assert not model.score("nobody", ["f2"]).any()
+
+
+def test_dense_and_sparse_solvers_agree(monkeypatch):
+    """The per-row and batched solve paths give the same factors."""
+    preference, confidence, _, _ = build_rating_matrix(_ratings())
+    batched = train_als(preference, confidence, factors=4, iterations=2)
+    
+    monkeypatch.setattr(collaborative, "_OUTER_BUDGET", 0)
+    per_row = train_als(preference, confidence, factors=4, iterations=2)
+    
+    for a, b in zip(batched, per_row):
+        np.testing.assert_allclose(a, b, rtol=1e-3, atol=1e-4)
+
+
+def test_cf_scores_reorder_ranking_only_for_known_users(tmp_path, monkeypatch):
+    """A loaded factor model lifts the foods a user is predicted to like; otherwise order is kept."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    path = tmp_path / "cf.npz"
+    monkeypatch.setattr(rag_service, "get_vector_db", lambda: None)
+    monkeypatch.setattr(rag_service, "get_cf_scorer", lambda: CFScorer(model_path=str(path)))
+    rag = RAGService()
+    
+    foods = [_food("a", "牛肉面"), _food("b", "番茄鸡蛋汤"), _food("c", "紫米粥")]
+    preferences = UserPreferences(goal=FitnessGoal.MAINTAIN)
+    
+    def ranked(user_id):
+        profile = TasteProfile(user_id=user_id, history_count=1)
+        return [food.id for food in rag._rank_foods_by_goal(foods, preferences, profile)]
+    
+    assert ranked("u1") == ["a", "b", "c"]
+    
+    CFModel(
+        ["u1"], ["a", "b", "c"], np.array([[1.0, 0.0]]),
+        np.array([[0.0, 0.0], [1.0, 0.0], [0.5, 0.0]]), 0.0
+    ).save(str(path))
+    rag.cf_scorer = CFScorer(model_path=str(path))
+    
+    assert ranked("u1") == ["b", "c", "a"]
+    assert ranked("stranger") == ["a", "b", "c"]
@@ -0,0 +1,43 @@
+"""Test write-behind history buffer."""
+import asyncio
+import pytest
+from app.models import FoodHistory
+from app.database.history_buffer import HistoryWriteBuffer, HistoryBufferFullError
+
+
+def _history(i: int) -> FoodHistory:
+    return FoodHistory(
+        user_id="u1", food_id=f"f{i}", food_name=f"食物{i}", canteen="中心食堂", meal_type="午餐"
+    )
+
+
+@pytest.mark.asyncio
+async def test_batches_and_drains_on_close():
+    """Records are written in size-bounded batches and flushed on close."""
+    batches = []
+    
+    async def write_batch(batch):
+        batches.append(len(batch))
+    
+    buffer = HistoryWriteBuffer(write_batch, max_batch_size=10, flush_interval=5)
+    buffer.start()
+    for i in range(25):
+        await buffer.put(_history(i))
+    await buffer.close()
+    
+    assert sum(batches) == 25
+    assert max(batches) <= 10
+
+
+@pytest.mark.asyncio
+async def test_backpressure_when_full():
+    """A full queue rejects new records after the enqueue timeout."""
+    async def write_batch(batch):
+        pass
+    
+    buffer = HistoryWriteBuffer(write_batch, max_queue_size=1, enqueue_timeout=0.01)
+    await buffer.put(_history(0))
+    with pytest.raises(HistoryBufferFullError):
+        await buffer.put(_history(1))
+    
+    await buffer.close()
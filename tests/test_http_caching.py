@@ -0,0 +1,74 @@
+"""Test ETag caching of menu responses and hashed static asset URLs."""
+import re
+import pytest
+import sentence_transformers
+from httpx import AsyncClient
+from app.config import get_settings
+from app.database import get_vector_db
+from app.database.numpy_vector_db import NumpyVectorDatabase
+from app.main import app
+from tests.test_numpy_vector_db import _CharEncoder, _food
+
+
+@pytest.fixture
+def menu_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(sentence_transformers, "SentenceTransformer", _CharEncoder)
+    monkeypatch.setattr(get_settings(), "numpy_index_path", str(tmp_path / "index"))
+    return NumpyVectorDatabase()
+
+
+@pytest.mark.asyncio
+async def test_food_list_etag_and_version_pinning(menu_db):
+    """Unchanged menus answer conditional requests with 304; v=<version> URLs are immutable."""
+    menu_db.add_food_items([
+        _food("b", "番茄鸡蛋汤"), _food("a", "牛肉面"), _food("c", "牛肉饭", "南区食堂")
+    ])
+    app.dependency_overrides[get_vector_db] = lambda: menu_db
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            listed = await client.get("/api/foods", params={"limit": 2, "fields": "id,name"})
+            etag = listed.headers["etag"]
+            cached = await client.get("/api/foods", headers={"If-None-Match": etag})
+            version = (await client.get("/api/foods/version")).json()
+            pinned = await client.get(
+                "/api/foods", params={"canteen": "南区食堂", "v": version["version"]}
+            )
+            
+            menu_db.add_food_items([_food("a", "紫米粥")])
+            changed = await client.get("/api/foods", headers={"If-None-Match": etag})
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert listed.json() == {
+        "version": version["version"], "total": 3,
+        "items": [{"id": "a", "name": "牛肉面"}, {"id": "b", "name": "番茄鸡蛋汤"}],
+    }
+    assert listed.headers["cache-control"].startswith("public, max-age=")
+    assert cached.status_code == 304 and cached.headers["etag"] == etag
+    assert version["count"] == 3
+    assert [food["id"] for food in pinned.json()["items"]] == ["c"]
+    assert "immutable" in pinned.headers["cache-control"]
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["items"][0]["name"] == "紫米粥"
+
+
+@pytest.mark.asyncio
+async def test_frontend_uses_long_cached_hashed_assets():
+    """The page links assets by content hash; those URLs are immutable, the page revalidates."""
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        page = await client.get("/")
+        revalidated = await client.get("/", headers={"If-None-Match": page.headers["etag"]})
+        
+        css_url = re.search(r'href="(/static/css/app\.[0-9a-f]{12}\.css)"', page.text).group(1)
+        css = await client.get(css_url)
+        stale = await client.get("/static/css/app.000000000000.css")
+        plain = await client.get("/static/css/app.css")
+    
+    assert page.headers["cache-control"] == "no-cache"
+    assert revalidated.status_code == 304
+    assert css.status_code == 200 and "--primary" in css.text
+    assert css.headers["cache-control"] == "public, max-age=31536000, immutable"
+    assert stale.text == css.text and stale.headers["cache-control"] == "no-cache"
+    assert plain.headers["cache-control"] == "no-cache"
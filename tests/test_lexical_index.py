@@ -0,0 +1,49 @@
+"""Test the BM25 keyword index."""
+from app.database.lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+
+def test_tokenize_mixes_cjk_ngrams_and_words():
+    """CJK runs yield unigrams and bigrams; ASCII words stay whole."""
+    assert tokenize("牛肉面 Greek") == ["牛", "肉", "面", "牛肉", "肉面", "greek"]
+
+
+def test_bm25_incremental_updates_and_exact_queries():
+    """Documents can be added, replaced and removed; exact queries use field values."""
+    index = BM25Index()
+    index.add("a", "牛肉面 食材: 牛肉, 面条", ["牛肉面", "牛肉"])
+    index.add("b", "全麦面包 食材: 全麦粉", ["全麦面包"])
+    index.add("c", "番茄鸡蛋汤 食材: 番茄, 鸡蛋", ["番茄鸡蛋汤"])
+    
+    assert [doc_id for doc_id, _ in index.search("牛肉 面")][0] == "a"
+    assert index.is_exact_query("牛肉面")
+    assert not index.is_exact_query("牛肉面 好吃")
+    
+    index.add("a", "麻辣香锅 食材: 辣椒", ["麻辣香锅"])
+    assert not index.is_exact_query("牛肉面")
+    assert "a" not in {doc_id for doc_id, _ in index.search("牛肉")}
+    
+    index.remove("c")
+    assert len(index) == 2
+    assert index.search("番茄") == []
+
+
+def test_negated_terms_do_not_match_what_they_exclude():
+    """"不要辣" finds foods described as not spicy and ranks spicy foods below them."""
+    assert tokenize("不要辣的菜") == ["!辣", "的", "菜", "的菜"]
+    assert tokenize("无糖") == ["!糖"]
+    
+    index = BM25Index()
+    index.add("spicy", "麻辣香锅 标签: 辣, 川菜")
+    index.add("mild", "清蒸鱼 标签: 清淡, 无辣")
+    index.add("chicken", "宫保鸡丁 标签: 微辣, 鸡肉")
+    index.add("soup", "鸡汤 标签: 清淡, 鸡肉")
+    
+    assert [doc_id for doc_id, _ in index.search("不要辣")] == ["mild"]
+    assert [doc_id for doc_id, _ in index.search("鸡肉 不要辣")][0] == "soup"
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    """Items ranked well by both lists come first."""
+    fused = reciprocal_rank_fusion([["x", "y", "z"], ["y", "w"]])
+    assert fused[0] == "y"
+    assert set(fused) == {"x", "y", "z", "w"}
@@ -0,0 +1,50 @@
+"""Test startup preloading and readiness reporting."""
+import pytest
+from httpx import AsyncClient
+from app.lifecycle import ComponentStatus, Lifecycle
+from app.main import app
+
+
+def _fail():
+    raise RuntimeError("model unavailable")
+
+
+@pytest.mark.asyncio
+async def test_preload_records_each_component():
+    """One failing component is reported without stopping the others."""
+    lifecycle = Lifecycle()
+    loaded = []
+    
+    async def load_async():
+        loaded.append("async")
+    
+    await lifecycle.preload([
+        ("broken", _fail),
+        ("sync", lambda: loaded.append("sync")),
+        ("async", load_async),
+    ])
+    
+    assert loaded == ["sync", "async"]
+    assert not lifecycle.ready
+    report = lifecycle.report()
+    assert report["status"] == "degraded"
+    assert report["components"]["broken"]["error"] == "model unavailable"
+    assert report["components"]["sync"]["state"] == "ready"
+
+
+@pytest.mark.asyncio
+async def test_ready_endpoint_waits_for_components(monkeypatch):
+    """/ready returns 503 while a component is loading and 200 afterwards."""
+    lifecycle = Lifecycle()
+    monkeypatch.setattr("app.main.get_lifecycle", lambda: lifecycle)
+    lifecycle.components["vector_db"] = ComponentStatus(state="loading")
+    
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["components"]["vector_db"] == {"state": "loading"}
+        
+        await lifecycle.run("vector_db", lambda: None)
+        response = await client.get("/ready")
+        assert response.status_code == 200
+        assert response.json()["status"] == "ready"
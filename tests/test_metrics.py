@@ -0,0 +1,62 @@
+"""Test metrics collection and the /metrics endpoint."""
+from types import SimpleNamespace
+import pytest
+from httpx import AsyncClient
+from app import metrics
+from app.cache import TTLCache
+from app.config import get_settings
+from app.main import app
+from app.metrics import MetricsRegistry, timed
+from app.services.deepseek_service import DeepSeekService
+
+
+def test_sampled_timer_weights_and_render(monkeypatch):
+    """Sampled observations count 1/rate; skipped ones record nothing."""
+    registry = MetricsRegistry()
+    histogram = registry.histogram("stage_seconds", "Stage latency", ("stage",))
+    cache = TTLCache(maxsize=4, ttl=60)
+    registry.register_cache("retrieval", cache)
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    
+    monkeypatch.setattr(get_settings(), "metrics_sample_rate", 0.5)
+    draws = iter([0.1, 0.9])
+    monkeypatch.setattr(metrics.random, "random", lambda: next(draws))
+    for _ in range(2):
+        with timed(histogram, stage="rank"):
+            pass
+    
+    assert histogram.count(stage="rank") == 2.0
+    text = registry.render()
+    assert 'stage_seconds_bucket{stage="rank",le="+Inf"} 2' in text
+    assert 'stage_seconds_count{stage="rank"} 2' in text
+    assert 'cache_hits_total{cache="retrieval"} 1' in text
+    assert 'cache_hit_ratio{cache="retrieval"} 0.5' in text
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_reports_http_and_llm_usage():
+    """Requests are labelled by route template; completion usage feeds the token counter."""
+    async def create(**kwargs):
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content="好的"))],
+            usage=SimpleNamespace(prompt_tokens=120, completion_tokens=30)
+        )
+    
+    service = DeepSeekService.__new__(DeepSeekService)
+    service.model, service.temperature = "deepseek-chat", 0.7
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    before = metrics.LLM_TOKENS.value(operation="chat", kind="prompt")
+    assert await service.chat("你好") == "好的"
+    assert metrics.LLM_TOKENS.value(operation="chat", kind="prompt") == before + 120
+    
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        await client.get("/health")
+        response = await client.get("/metrics")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'http_request_duration_seconds_count{method="GET",route="/health",status="200"}' in response.text
+    assert 'llm_tokens_total{operation="chat",kind="completion"}' in response.text
+    assert 'llm_requests_total{operation="chat",status="ok"}' in response.text
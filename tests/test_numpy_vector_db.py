@@ -0,0 +1,131 @@
+"""Test the NumPy vector database backend."""
+import numpy as np
+import pytest
+import sentence_transformers
+from app.config import get_settings
+from app.models import FoodItem, NutritionInfo
+from app.database.numpy_vector_db import NumpyVectorDatabase
+from app.services.rag_service import RAGService
+
+
+class _CharEncoder:
+    """Deterministic bag-of-characters embeddings, no model download."""
+    
+    def __init__(self, *args, **kwargs):
+        pass
+    
+    def encode(self, texts, **kwargs):
+        vectors = np.zeros((len(texts), 64), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for char in text:
+                vectors[row, ord(char) % 64] += 1
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _food(food_id: str, name: str, canteen: str = "中心食堂") -> FoodItem:
+    return FoodItem(
+        id=food_id, name=name, canteen=canteen, category="主食", price=10.0,
+        nutrition=NutritionInfo(calories=400, protein=20, carbs=50, fat=10),
+        ingredients=[name], tags=[], available_meals=["午餐"]
+    )
+
+
+@pytest.fixture
+def vector_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(sentence_transformers, "SentenceTransformer", _CharEncoder)
+    monkeypatch.setattr(get_settings(), "numpy_index_path", str(tmp_path / "index"))
+    monkeypatch.setattr(get_settings(), "numpy_index_reload_interval", 0.0)
+    return NumpyVectorDatabase()
+
+
+def test_exact_top_k_and_reload(vector_db):
+    """Search ranks by cosine similarity; the index survives a reopen."""
+    vector_db.add_food_items([
+        _food("a", "牛肉面"), _food("b", "番茄鸡蛋汤"), _food("c", "牛肉饭", "南区食堂")
+    ])
+    
+    assert [f.id for f in vector_db.search_foods("番茄鸡蛋汤", n_results=1)] == ["b"]
+    assert [f.id for f in vector_db.search_foods("牛肉", filters={"canteen": "南区食堂"})] == ["c"]
+    
+    reopened = NumpyVectorDatabase()
+    assert reopened.count() == 3
+    assert reopened.search_foods_many(["番茄鸡蛋汤"], n_results=1)[0][0].id == "b"
+
+
+def test_add_replaces_existing_ids_and_clear(vector_db):
+    """Re-adding an ID overwrites it in place; clear_all empties the index."""
+    vector_db.add_food_items([_food("a", "牛肉面"), _food("b", "番茄鸡蛋汤")])
+    vector_db.add_food_items([_food("a", "紫米粥")])
+    
+    assert vector_db.count() == 2
+    assert vector_db.get_food_by_id("a").name == "紫米粥"
+    assert vector_db.search_foods("紫米粥", n_results=1)[0].id == "a"
+    
+    vector_db.clear_all()
+    assert vector_db.count() == 0
+    assert vector_db.search_foods("紫米粥") == []
+
+
+def test_readers_pick_up_published_versions(vector_db):
+    """A second process-like instance remaps when the writer publishes a new version."""
+    vector_db.add_food_items([_food("a", "牛肉面")])
+    reader = NumpyVectorDatabase()
+    first_version = reader.version
+    assert [f.id for f in reader.get_foods_by_ids(["a", "b"])] == ["a"]
+    
+    vector_db.add_food_items([_food("b", "番茄鸡蛋汤")])
+    vector_db.add_food_items([_food("c", "紫米粥")])
+    
+    assert reader.count() == 3
+    assert reader.version != first_version
+    assert reader.search_foods("番茄鸡蛋汤", n_results=1)[0].id == "b"
+    
+    # Only the current and previous versions are kept on disk
+    assert len(list(vector_db.index_path.glob("index-*.bin"))) == 2
+
+
+def test_menu_version_follows_content(vector_db):
+    """Republishing the same foods keeps the menu version; any change, seen by readers, bumps it."""
+    vector_db.add_food_items([_food("a", "牛肉面"), _food("b", "番茄鸡蛋汤")])
+    reader = NumpyVectorDatabase()
+    version, index_version = reader.menu_version(), reader.version
+    
+    vector_db.add_food_items([_food("b", "番茄鸡蛋汤")])
+    assert reader.menu_version() == version == vector_db.menu_version()
+    assert reader.version != index_version
+    
+    vector_db.add_food_items([_food("b", "番茄鸡蛋汤", "南区食堂")])
+    assert reader.menu_version() != version
+
+
+@pytest.mark.asyncio
+async def test_retrieval_cache_follows_menu_version(vector_db, monkeypatch):
+    """Cached retrievals are not served once the menu changes."""
+    monkeypatch.setattr("app.services.rag_service.get_vector_db", lambda: vector_db)
+    rag = RAGService()
+    vector_db.add_food_items([_food("a", "牛肉面")])
+    
+    first = await rag.retrieve_relevant_foods("午餐")
+    assert [food.name for food in await rag.retrieve_relevant_foods("午餐")] == ["牛肉面"]
+    vector_db.add_food_items([_food("a", "紫米粥")])
+    
+    assert [food.name for food in first] == ["牛肉面"]
+    assert [food.name for food in await rag.retrieve_relevant_foods("午餐")] == ["紫米粥"]
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_quantized_storage_rescores_to_exact_order(vector_db, monkeypatch, storage):
+    """Quantized scans return the same top-k as float32 after rescoring."""
+    foods = [_food(f"f{i}", name) for i, name in enumerate(
+        ["牛肉面", "番茄鸡蛋汤", "牛肉饭", "紫米粥", "鸡腿饭", "青菜豆腐汤", "麻辣香锅", "蛋炒饭"]
+    )]
+    vector_db.add_food_items(foods)
+    queries = ["牛肉", "鸡蛋汤", "米饭", "豆腐"]
+    expected = [[f.id for f in row] for row in vector_db.search_foods_many(queries, n_results=3)]
+    
+    monkeypatch.setattr(get_settings(), "vector_storage", storage)
+    vector_db.add_food_items(foods)
+    assert vector_db._packed.quantized.dtype == np.dtype("<f2" if storage == "float16" else "i1")
+    actual = [[f.id for f in row] for row in vector_db.search_foods_many(queries, n_results=3)]
+    assert actual == expected
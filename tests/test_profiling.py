@@ -0,0 +1,71 @@
+"""Test the sampling profiler and the admin profiling endpoints."""
+import threading
+import time
+import pytest
+from httpx import AsyncClient
+from app.config import get_settings
+from app.main import app
+from app.profiling import SamplingProfiler
+
+
+def _busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_sampling_profiler_collapses_thread_stacks():
+    """Stacks are folded root-first under the thread name, with sample counts."""
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy_loop, args=(stop,), name="busy-worker")
+    worker.start()
+    profiler = SamplingProfiler(interval=0.002)
+    try:
+        profiler.start(seconds=5)
+        time.sleep(0.2)
+        profiler.stop()
+    finally:
+        stop.set()
+        worker.join()
+    
+    assert not profiler.running
+    assert profiler.samples > 10
+    lines = profiler.collapsed().splitlines()
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy and all("_busy_loop (tests/test_profiling.py:" in line for line in busy)
+    assert all(int(line.rsplit(" ", 1)[1]) >= 1 for line in lines)
+    assert "sampling-profiler" not in profiler.collapsed()
+
+
+@pytest.mark.asyncio
+async def test_profiling_endpoints_require_enabled_setting_and_admin_token(monkeypatch):
+    """Disabled: 404 and X-Profile is ignored; enabled: token checked, request gets a pstats report."""
+    settings = get_settings()
+    async with AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.get("/api/admin/profile", headers={"X-Admin-Token": "secret"})
+        assert response.status_code == 404
+        monkeypatch.setattr(settings, "profiling_admin_token", "secret")
+        response = await client.get(
+            "/health", headers={"X-Profile": "cumulative", "X-Admin-Token": "secret"}
+        )
+        assert response.json()["status"] == "healthy"
+        assert "x-profiled-status" not in response.headers
+        
+        monkeypatch.setattr(settings, "profiling_enabled", True)
+        response = await client.get("/health", headers={"X-Profile": "cumulative"})
+        assert response.json()["status"] == "healthy"
+        assert "x-profiled-status" not in response.headers
+        response = await client.get("/api/admin/profile", headers={"X-Admin-Token": "wrong"})
+        assert response.status_code == 403
+        response = await client.post(
+            "/api/admin/profile/start", params={"seconds": 10_000},
+            headers={"X-Admin-Token": "secret"}
+        )
+        assert response.status_code == 400
+        
+        response = await client.get(
+            "/health", headers={"X-Profile": "tottime", "X-Admin-Token": "secret"}
+        )
+        assert response.status_code == 200
+        assert response.headers["x-profiled-status"] == "200"
+        assert response.text.startswith("GET /health -> 200")
+        assert "function calls" in response.text
@@ -0,0 +1,196 @@
+"""Test the recommendation service with a fake retriever and LLM."""
+import asyncio
+import json
+from types import SimpleNamespace
+import pytest
+from httpx import AsyncClient
+from app.config import get_settings
+from app.main import app
+from app.models import (
+    BatchRecommendationRequest, DailyPlanRequest, FitnessGoal, TasteProfile, UserPreferences
+)
+from app.services import recommendation
+from app.services.recommendation import RecommendationService, get_recommendation_service
+from tests.test_numpy_vector_db import _food
+
+
+class _FakeRetriever:
+    """Returns a fixed menu for every retrieval."""
+    
+    def __init__(self, foods):
+        self.foods = foods
+        self.vector_db = SimpleNamespace(menu_version=lambda: "v1")
+        self.calls = 0
+    
+    async def retrieve_relevant_foods_many(self, meal_types, **kwargs):
+        self.calls += 1
+        return {meal_type: list(self.foods) for meal_type in meal_types}
+    
+    async def retrieve_relevant_foods(self, meal_type, preferences=None, n_results=20, **kwargs):
+        return list(self.foods)
+    
+    async def retrieve_relevant_foods_batch(self, requests, custom_requirements=None, n_results=20):
+        return [list(self.foods) for _ in requests]
+    
+    def personalize(self, foods, preferences, profile):
+        return foods
+
+
+class _FakeLLM:
+    """Counts calls; personalized prompts carry the user id as taste summary."""
+    
+    def __init__(self):
+        self.calls = []
+    
+    async def generate_recommendation(self, available_foods, taste_summary=None, **kwargs):
+        self.calls.append(taste_summary)
+        user_id = taste_summary[0] if taste_summary else None
+        await asyncio.sleep(0.05 if user_id == "slow" else 0.01)
+        if user_id == "bad":
+            raise RuntimeError("LLM timeout")
+        return f"1. {available_foods[0].name} - 中心食堂\n**推荐理由：** {user_id or 'segment'}"
+    
+    async def generate_daily_plan(self, foods_by_meal, calorie_targets=None, **kwargs):
+        self.calls.append(calorie_targets)
+        # No 晚餐 section: that meal falls back to the local pick
+        return (
+            "**早餐推荐：**\n1. 紫米粥 - 中心食堂\n"
+            "**午餐推荐：**\n1. 牛肉面 - 中心食堂\n2. 番茄鸡蛋汤 - 中心食堂\n"
+            "**推荐理由：** 早餐清淡，午餐丰富\n**饮食建议：** 多喝水"
+        )
+
+
+class _FakeTasteProfiles:
+    """Users listed in ``history`` have a profile with history, so they get a personal prompt."""
+    
+    def __init__(self, history=()):
+        self.history = set(history)
+    
+    def _profile(self, user_id):
+        return TasteProfile(user_id=user_id, history_count=int(user_id in self.history))
+    
+    async def get_profile(self, user_id):
+        return self._profile(user_id)
+    
+    async def get_profiles(self, user_ids):
+        return {user_id: self._profile(user_id) for user_id in user_ids}
+    
+    async def summarize(self, profile, meal_types=None):
+        return [profile.user_id] if profile and profile.history_count else []
+
+
+class _FakeUsers:
+    """No stored users: everyone falls into the no-preference segment."""
+    
+    async def get_user(self, user_id):
+        return None
+    
+    async def get_users(self, user_ids):
+        return {}
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(get_settings(), "recommendation_mode", "llm")
+    llm = _FakeLLM()
+    retriever = _FakeRetriever([
+        _food("a", "牛肉面"), _food("b", "番茄鸡蛋汤"), _food("c", "紫米粥"), _food("d", "麻婆豆腐")
+    ])
+    
+    async def user_db():
+        return _FakeUsers()
+    
+    monkeypatch.setattr(recommendation, "get_user_db", user_db)
+    monkeypatch.setattr(recommendation, "get_rag_service", lambda: retriever)
+    monkeypatch.setattr(recommendation, "get_deepseek_service", lambda: llm)
+    monkeypatch.setattr(
+        recommendation, "get_taste_profile_service", lambda: _FakeTasteProfiles({"slow", "bad"})
+    )
+    return RecommendationService()
+
+
+@pytest.mark.asyncio
+async def test_batch_shares_one_llm_call_per_segment(service):
+    """Identical new users share one segment call; personal calls fail per user and stream last."""
+    user_ids = [f"u{i}" for i in range(50)] + ["slow", "bad", "u0"]
+    results = [
+        result async for result in service.get_recommendations_batch(
+            BatchRecommendationRequest(user_ids=user_ids, meal_type="午餐")
+        )
+    ]
+    
+    assert sorted(result.user_id for result in results) == sorted(set(user_ids))
+    by_user = {result.user_id: result for result in results}
+    assert by_user["bad"].recommendation is None and "LLM timeout" in by_user["bad"].error
+    assert by_user["slow"].recommendation.reasoning == "slow"
+    segment = {by_user[f"u{i}"].recommendation.model_dump_json() for i in range(50)}
+    assert len(segment) == 1 and by_user["u0"].recommendation.reasoning == "segment"
+    # Streamed in completion order: the slow personal call comes last
+    assert results[-1].user_id == "slow"
+    assert sorted(service.deepseek_service.calls, key=str) == [["bad"], ["slow"], []]
+    
+    # Segment results are cached for later batches and concurrent callers
+    again = await asyncio.gather(*(service.warm_segment("午餐", None) for _ in range(5)))
+    assert len(service.deepseek_service.calls) == 3 and again[0] == by_user["u1"].recommendation
+
+
+@pytest.mark.asyncio
+async def test_concurrent_segment_misses_share_one_call(service):
+    """Concurrent callers of an uncached segment wait for the same LLM call."""
+    results = await asyncio.gather(*(service.warm_segment("晚餐", None) for _ in range(10)))
+    
+    assert len(service.deepseek_service.calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+@pytest.mark.asyncio
+async def test_batch_endpoint_streams_ndjson(service):
+    """The batch endpoint writes one JSON line per unique user."""
+    app.dependency_overrides[get_recommendation_service] = lambda: service
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            response = await client.post(
+                "/api/recommend/batch", json={"user_ids": ["u1", "bad", "u2"], "meal_type": "午餐"}
+            )
+    finally:
+        app.dependency_overrides.clear()
+    
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line["user_id"] for line in lines) == ["bad", "u1", "u2"]
+    assert {line["user_id"]: line["error"] for line in lines}["bad"] == "LLM timeout"
+
+
+def _plan_request():
+    return DailyPlanRequest(
+        user_id="u1",
+        preferences=UserPreferences(goal=FitnessGoal.MAINTAIN, daily_calories_target=2000)
+    )
+
+
+@pytest.mark.asyncio
+async def test_daily_plan_uses_one_retrieval_and_one_llm_call(service):
+    """Calories are split per meal; each meal is parsed from its section or picked locally."""
+    plan = await service.get_daily_plan(_plan_request())
+    
+    assert service.rag_service.calls == 1
+    assert service.deepseek_service.calls == [{"早餐": 600, "午餐": 800, "晚餐": 600}]
+    names = {meal: [food.name for food in rec.food_items] for meal, rec in plan.meals.items()}
+    assert names["早餐"] == ["紫米粥"]
+    assert names["午餐"] == ["牛肉面", "番茄鸡蛋汤"]
+    # Missing section: local pick within 600 kcal, skipping dishes already chosen
+    assert names["晚餐"] == ["麻婆豆腐"]
+    assert plan.reasoning == "早餐清淡，午餐丰富" and plan.tips == "多喝水"
+    assert plan.total_nutrition.calories == 4 * 400
+
+
+@pytest.mark.asyncio
+async def test_local_daily_plan_does_not_repeat_dishes(service, monkeypatch):
+    """Without the LLM every meal gets its own dishes from the shared menu."""
+    monkeypatch.setattr(get_settings(), "recommendation_mode", "local")
+    plan = await service.get_daily_plan(_plan_request())
+    
+    ids = [food.id for rec in plan.meals.values() for food in rec.food_items]
+    assert service.deepseek_service.calls == []
+    assert ids == ["a", "b", "c", "d"]
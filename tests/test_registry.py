@@ -0,0 +1,76 @@
+"""Test guarded singleton initialization and ordered shutdown."""
+import asyncio
+import threading
+import time
+import pytest
+from app import registry
+from app.registry import AsyncSingleton, Singleton
+
+
+def test_concurrent_first_calls_create_once():
+    """Threads racing on a slow factory all get the same single instance."""
+    calls = []
+    
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+    
+    singleton = Singleton("slow", factory)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(singleton.get())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+@pytest.mark.asyncio
+async def test_async_singleton_and_reverse_close_order(monkeypatch):
+    """Concurrent awaits initialize once; close_all closes newest first."""
+    monkeypatch.setattr(registry, "_created", [])
+    calls, closed = [], []
+    
+    async def create():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "engine"
+    
+    database = AsyncSingleton("database", create, close=lambda _: closed.append("database"))
+    results = await asyncio.gather(*(database.get() for _ in range(5)))
+    assert results == ["engine"] * 5 and len(calls) == 1
+    
+    async def close_client(_):
+        closed.append("client")
+    
+    client = Singleton("client", object, close=close_client)
+    client.get()
+    Singleton("no_close", object).get()
+    
+    assert await registry.close_all() == ["client", "database"]
+    assert closed == ["client", "database"]
+    assert database.peek() is None
+
+
+@pytest.mark.asyncio
+async def test_close_all_closes_resources_recreated_during_shutdown(monkeypatch):
+    """A tracer recreated by spans emitted while the database drains is closed too."""
+    monkeypatch.setattr(registry, "_created", [])
+    closed = []
+    
+    tracer = Singleton("tracer", object, close=lambda _: closed.append("tracer"))
+    
+    def drain(_):
+        tracer.get()  # A span emitted while flushing buffered writes
+        closed.append("database")
+    
+    database = Singleton("database", object, close=drain)
+    database.get()
+    tracer.get()
+    
+    assert await registry.close_all() == ["tracer", "database", "tracer"]
+    assert closed == ["tracer", "database", "tracer"]
+    assert tracer.peek() is None and registry._created == []
@@ -0,0 +1,103 @@
+"""Test response compression and field projection."""
+import asyncio
+import gzip
+import zlib
+import pytest
+from httpx import AsyncClient
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+from app.database import get_user_db
+from app.database.user_db import UserDatabase
+from app.main import app
+from app.models import FoodHistory
+from app.responses import CompressionMiddleware
+
+
+def _compressed_app():
+    async def big(request):
+        return JSONResponse({"foods": ["番茄炒蛋"] * 500})
+    
+    async def small(request):
+        return JSONResponse({"ok": True})
+    
+    async def lines(request):
+        async def stream():
+            for i in range(3):
+                yield f'{{"line": {i}}}\n'
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+    
+    inner = Starlette(routes=[Route("/big", big), Route("/small", small), Route("/lines", lines)])
+    return CompressionMiddleware(inner)
+
+
+@pytest.mark.asyncio
+async def test_compression_threshold_and_streaming(monkeypatch):
+    """Large and streamed bodies are gzipped when accepted; small ones and other clients are not."""
+    monkeypatch.setattr("app.responses.brotli_available", lambda: False)
+    async with AsyncClient(app=_compressed_app(), base_url="http://test") as client:
+        response = await client.get("/big", headers={"Accept-Encoding": "br, gzip"})
+        raw = await client.get("/big", headers={"Accept-Encoding": "identity"})
+        small = await client.get("/small", headers={"Accept-Encoding": "gzip"})
+    
+    # Drive the ASGI app directly to see the streamed chunk boundaries
+    messages = []
+    requests = iter([{"type": "http.request", "body": b"", "more_body": False}])
+    
+    async def receive():
+        # After the request body, block like a client that stays connected
+        for message in requests:
+            return message
+        await asyncio.Event().wait()
+    
+    async def send(message):
+        messages.append(message)
+    
+    await _compressed_app()({
+        "type": "http", "method": "GET", "path": "/lines", "raw_path": b"/lines",
+        "query_string": b"", "headers": [(b"accept-encoding", b"gzip")],
+        "http_version": "1.1", "scheme": "http", "server": ("test", 80), "root_path": "",
+    }, receive, send)
+    
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert int(response.headers["content-length"]) < len(raw.content) / 10
+    assert response.json() == raw.json()
+    assert "content-encoding" not in raw.headers
+    assert "content-encoding" not in small.headers and small.json() == {"ok": True}
+    
+    headers = dict(messages[0]["headers"])
+    assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+    chunks = [message["body"] for message in messages[1:]]
+    # Each line is flushed on its own, so the first chunk already decodes
+    assert zlib.decompressobj(zlib.MAX_WBITS | 16).decompress(chunks[0]) == b'{"line": 0}\n'
+    assert gzip.decompress(b"".join(chunks)).decode().count("\n") == 3
+
+
+@pytest.mark.asyncio
+async def test_history_fields_projection(tmp_path, monkeypatch):
+    """fields= trims each row and keeps the cursor header; unknown fields are rejected."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    db = UserDatabase(f"sqlite+aiosqlite:///{tmp_path / 'users.db'}")
+    await db.init_db()
+    await db.add_food_histories([
+        FoodHistory(user_id="u1", food_id=f"f{i}", food_name=f"菜{i}", canteen="一食堂", meal_type="午餐")
+        for i in range(3)
+    ])
+    app.dependency_overrides[get_user_db] = lambda: db
+    try:
+        async with AsyncClient(app=app, base_url="http://test") as client:
+            full = await client.get("/api/user/u1/history", params={"limit": 2})
+            slim = await client.get(
+                "/api/user/u1/history", params={"limit": 2, "fields": "food_name, rating"}
+            )
+            bad = await client.get("/api/user/u1/history", params={"fields": "food_name,password"})
+    finally:
+        app.dependency_overrides.clear()
+        await db.close()
+    
+    assert set(full.json()[0]) > {"food_name", "rating", "timestamp"}
+    assert [set(row) for row in slim.json()] == [{"food_name", "rating"}] * 2
+    assert [row["food_name"] for row in slim.json()] == [row["food_name"] for row in full.json()]
+    assert slim.headers["x-next-cursor"] == full.headers["x-next-cursor"]
+    assert bad.status_code == 400 and "password" in bad.json()["detail"]
@@ -0,0 +1,112 @@
+"""Test incremental taste profile updates."""
+import threading
+from datetime import datetime
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import text
+from app.database.user_db import UserDatabase
+from app.models import FoodItem, FoodHistory, NutritionInfo, TasteProfile
+from app.services.taste_profile import TasteProfileService, apply_history, profile_score
+
+
+def _food(food_id: str, tags, calories: float = 500) -> FoodItem:
+    return FoodItem(
+        id=food_id, name=food_id, canteen="中心食堂", category="主食", price=15.0,
+        nutrition=NutritionInfo(calories=calories, protein=30, carbs=50, fat=10),
+        available_meals=["午餐"], ingredients=[], tags=tags
+    )
+
+
+def _history(food_id: str, rating=None) -> FoodHistory:
+    return FoodHistory(
+        user_id="u1", food_id=food_id, food_name=food_id, canteen="中心食堂",
+        meal_type="午餐", timestamp=datetime(2025, 1, 1), rating=rating
+    )
+
+
+def test_apply_history_updates_running_aggregates():
+    """Ratings weight affinities, macros are running means and recent IDs are deduplicated."""
+    profile = TasteProfile(user_id="u1")
+    apply_history(profile, _history("a", rating=5), _food("a", ["清淡"], calories=400))
+    apply_history(profile, _history("b", rating=1), _food("b", ["辣"], calories=800))
+    apply_history(profile, _history("a"), _food("a", ["清淡"], calories=400), recent_items=2)
+    
+    assert profile.history_count == 3
+    assert profile.tag_affinity == {"清淡": 1.25, "辣": -1.0}
+    assert profile.canteen_counts == {"中心食堂": 3}
+    assert round(profile.meal_macros["午餐"].calories) == 533
+    assert profile.recent_food_ids == ["a", "b"]
+
+
+def test_profile_score_prefers_liked_and_penalizes_repeats():
+    """Liked tags rank higher; recently eaten foods are pushed down."""
+    profile = TasteProfile(user_id="u1")
+    apply_history(profile, _history("x", rating=5), _food("x", ["清淡"]))
+    apply_history(profile, _history("y", rating=1), _food("y", ["辣"]))
+    
+    liked, disliked = _food("c", ["清淡"]), _food("d", ["辣"])
+    assert profile_score(profile, liked) > profile_score(profile, disliked)
+    assert profile_score(profile, _food("x", ["清淡"])) < profile_score(profile, liked)
+    assert profile_score(None, liked) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_reading_profiles_does_not_store_rows_for_users_without_history(tmp_path, monkeypatch):
+    """Unknown ids and users without history get empty profiles in memory only."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    db = UserDatabase(f"sqlite+aiosqlite:///{tmp_path / 'users.db'}")
+    await db.init_db()
+    service = TasteProfileService()
+    service.user_db = db
+    try:
+        profiles = await service.get_profiles(["ghost", "nobody", "ghost"])
+        async with db.engine.connect() as conn:
+            stored = (await conn.execute(text("SELECT COUNT(*) FROM taste_profiles"))).scalar()
+    finally:
+        await db.close()
+    
+    assert set(profiles) == {"ghost", "nobody"}
+    assert all(profile.history_count == 0 for profile in profiles.values())
+    assert stored == 0
+
+
+@pytest.mark.asyncio
+async def test_empty_profiles_are_cached_until_the_first_history_write(tmp_path, monkeypatch):
+    """Repeated reads for a user without history make no history queries; a write rebuilds."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    lookup_threads = []
+    
+    def get_foods_by_ids(ids):
+        lookup_threads.append(threading.get_ident())
+        return [_food("a", ["辣"])]
+    
+    menu = SimpleNamespace(get_foods_by_ids=get_foods_by_ids)
+    monkeypatch.setattr(TasteProfileService, "vector_db", property(lambda self: menu))
+    db = UserDatabase(f"sqlite+aiosqlite:///{tmp_path / 'users.db'}")
+    await db.init_db()
+    service = TasteProfileService()
+    await service.attach(db)
+    
+    queries = []
+    get_users_history = db.get_users_history
+    
+    async def counting_get_users_history(user_ids, limit=20):
+        queries.append(user_ids)
+        return await get_users_history(user_ids, limit=limit)
+    
+    monkeypatch.setattr(db, "get_users_history", counting_get_users_history)
+    try:
+        for _ in range(5):
+            assert (await service.get_profile("u1")).history_count == 0
+        assert len(queries) == 1
+        
+        await db.add_food_histories([_history("a", rating=5)])
+        profile = await service.get_profile("u1")
+        stored = await db.get_taste_profiles(["u1"])
+    finally:
+        await db.close()
+    
+    assert profile.history_count == 1 and stored["u1"] == profile
+    assert len(queries) == 2
+    # Food lookups (which may load the vector database) stay off the event loop
+    assert lookup_threads and threading.get_ident() not in lookup_threads
@@ -0,0 +1,78 @@
+"""Test span nesting and the trace exporters."""
+import asyncio
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import pytest
+from app.tracing import FileSpanExporter, OTLPSpanExporter, Tracer, _NOOP_SPAN
+
+
+@pytest.mark.asyncio
+async def test_spans_nest_across_tasks_and_threads(tmp_path):
+    """Gathered tasks and worker threads attach to the enclosing span; errors are recorded."""
+    assert Tracer().span("off") is _NOOP_SPAN
+    
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer(FileSpanExporter(str(path)))
+    
+    async def child(name):
+        with tracer.span(name):
+            await asyncio.sleep(0)
+    
+    def lookup():
+        with tracer.span("thread"):
+            pass
+    
+    with tracer.span("root", user_id="u1") as root:
+        await asyncio.gather(child("a"), child("b"))
+        await asyncio.to_thread(lookup)
+        with pytest.raises(KeyError):
+            with tracer.span("failing"):
+                raise KeyError("x")
+        root.set_attribute("candidates", 3)
+    tracer.close()
+    
+    spans = {record["name"]: record for record in map(json.loads, path.read_text().splitlines())}
+    assert spans["root"]["parent_id"] is None
+    assert spans["root"]["attributes"] == {"user_id": "u1", "candidates": 3}
+    for name in ("a", "b", "thread", "failing"):
+        assert spans[name]["parent_id"] == spans["root"]["span_id"]
+        assert spans[name]["trace_id"] == spans["root"]["trace_id"]
+    assert spans["failing"]["error"].startswith("KeyError")
+    
+    # Spans after close are dropped instead of writing to the closed file
+    with tracer.span("late"):
+        pass
+
+
+def test_otlp_exporter_posts_batches_on_shutdown():
+    """The OTLP exporter sends OTLP/HTTP JSON with resource and span fields."""
+    received = []
+    
+    class Collector(BaseHTTPRequestHandler):
+        def do_POST(self):
+            received.append(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+            self.send_response(200)
+            self.end_headers()
+        
+        def log_message(self, *args):
+            pass
+    
+    server = HTTPServer(("127.0.0.1", 0), Collector)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        endpoint = f"http://127.0.0.1:{server.server_port}/v1/traces"
+        tracer = Tracer(OTLPSpanExporter(endpoint, "food-api", interval=60))
+        with tracer.span("llm.chat", prompt_tokens=120, cached=False):
+            pass
+        tracer.close()
+    finally:
+        server.shutdown()
+    
+    resource_spans = received[0]["resourceSpans"][0]
+    assert resource_spans["resource"]["attributes"][0]["value"] == {"stringValue": "food-api"}
+    span = resource_spans["scopeSpans"][0]["spans"][0]
+    assert span["name"] == "llm.chat"
+    assert len(span["traceId"]) == 32 and len(span["spanId"]) == 16
+    assert {"key": "prompt_tokens", "value": {"intValue": "120"}} in span["attributes"]
+    assert {"key": "cached", "value": {"boolValue": False}} in span["attributes"]
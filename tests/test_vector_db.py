@@ -0,0 +1,128 @@
+"""Test vector database metadata encoding and the Chroma backend."""
+import json
+import sentence_transformers
+from app.config import get_settings
+from app.models import FoodItem, NutritionInfo
+from app.database.vector_db import VectorDatabase, _encode_food_metadata, _decode_food_metadata
+from tests.test_numpy_vector_db import _CharEncoder
+
+
+def _make_food(**overrides) -> FoodItem:
+    data = dict(
+        id="c1_001",
+        name="鸡胸肉沙拉",
+        canteen="中心食堂",
+        category="荤菜",
+        price=12.0,
+        nutrition=NutritionInfo(calories=320, protein=35, carbs=18, fat=10, fiber=5),
+        ingredients=["鸡胸肉", "生菜"],
+        tags=["高蛋白", "低脂"],
+        available_meals=["午餐", "晚餐"],
+        description="新鲜蔬菜配烤鸡胸肉",
+    )
+    data.update(overrides)
+    return FoodItem(**data)
+
+
+def test_metadata_round_trip():
+    """Compact metadata decodes back to the same food item."""
+    food = _make_food()
+    metadata = _encode_food_metadata(food)
+    
+    assert all(not isinstance(v, (dict, list)) for v in metadata.values())
+    assert None not in metadata.values()
+    assert _decode_food_metadata(metadata).model_dump() == food.model_dump()
+
+
+def test_metadata_round_trip_empty_lists():
+    """Empty list fields survive the delimiter packing."""
+    food = _make_food(ingredients=[], tags=[], description=None)
+    decoded = _decode_food_metadata(_encode_food_metadata(food))
+    
+    assert decoded.ingredients == []
+    assert decoded.tags == []
+    assert decoded.description is None
+
+
+def test_metadata_round_trip_escapes_separator():
+    """List items containing the separator or backslashes decode unchanged."""
+    food = _make_food(ingredients=["米|面", "C:\\盐", "末尾\\"], tags=["|"])
+    decoded = _decode_food_metadata(_encode_food_metadata(food))
+    
+    assert decoded.ingredients == food.ingredients
+    assert decoded.tags == ["|"]
+
+
+def test_decode_legacy_json_metadata():
+    """Rows stored with the old JSON encoding are still readable."""
+    food = _make_food()
+    metadata = food.model_dump()
+    for field in ("nutrition", "ingredients", "tags", "available_meals"):
+        metadata[field] = json.dumps(metadata[field])
+    metadata.pop("description")
+    
+    decoded = _decode_food_metadata(metadata)
+    assert decoded.nutrition == food.nutrition
+    assert decoded.tags == food.tags
+
+
+class _CountingEncoder(_CharEncoder):
+    """Records every text it embeds."""
+    
+    texts = []
+    
+    def encode(self, texts, **kwargs):
+        self.texts.extend(texts)
+        return super().encode(texts, **kwargs)
+
+
+def test_chroma_embeds_with_configured_model(tmp_path, monkeypatch):
+    """Documents and queries are embedded by the configured model, not Chroma's default."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(sentence_transformers, "SentenceTransformer", _CountingEncoder)
+    monkeypatch.setattr(get_settings(), "vector_db_path", str(tmp_path / "chroma"))
+    _CountingEncoder.texts = []
+    
+    db = VectorDatabase()
+    db.add_food_items([
+        _make_food(id="a", name="牛肉面", ingredients=["牛肉", "面条"], tags=[]),
+        _make_food(id="b", name="番茄鸡蛋汤", ingredients=["番茄", "鸡蛋"], tags=[]),
+    ])
+    
+    assert [food.id for food in db.search_foods("番茄鸡蛋汤", n_results=1)] == ["b"]
+    assert len(_CountingEncoder.texts) == 3 and _CountingEncoder.texts[-1] == "番茄鸡蛋汤"
+    assert db.collection.metadata["embedding_model"] == get_settings().embedding_model
+
+
+def test_chroma_menu_version_sees_other_writers(tmp_path, monkeypatch):
+    """A same-size menu rewritten by another instance (init_db.py) changes the version."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(sentence_transformers, "SentenceTransformer", _CharEncoder)
+    monkeypatch.setattr(get_settings(), "vector_db_path", str(tmp_path / "chroma"))
+    writer = VectorDatabase()
+    writer.add_food_items([_make_food(id="a", name="牛肉面")])
+    reader = VectorDatabase()
+    before = reader.menu_version()
+    assert reader.get_food_by_id("a").name == "牛肉面"
+    
+    writer.clear_all()
+    writer.add_food_items([_make_food(id="a", name="紫米粥")])
+    
+    assert reader.menu_version() != before
+    assert reader.menu_version() == writer.menu_version()
+    assert reader.get_food_by_id("a").name == "紫米粥"
+
+
+def test_chroma_add_replaces_existing_ids(tmp_path, monkeypatch):
+    """Re-adding an id updates the stored row, not just the in-process cache."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(sentence_transformers, "SentenceTransformer", _CharEncoder)
+    monkeypatch.setattr(get_settings(), "vector_db_path", str(tmp_path / "chroma"))
+    db = VectorDatabase()
+    db.add_food_items([_make_food(id="a", name="牛肉面"), _make_food(id="b", name="紫米粥")])
+    db.add_food_items([_make_food(id="a", name="番茄鸡蛋汤", price=9.0)])
+    
+    assert db.count() == 2
+    assert db.get_food_by_id("a").name == "番茄鸡蛋汤"
+    assert VectorDatabase().get_food_by_id("a").price == 9.0
+    assert db.search_foods("番茄鸡蛋汤", n_results=1)[0].id == "a"
@@ -0,0 +1,55 @@
+"""Test scheduled cache warmup."""
+from types import SimpleNamespace
+import pytest
+from app.database.user_db import UserDatabase
+from app.models import FitnessGoal, User, UserPreferences
+from app.services import warmup
+from app.services.warmup import WarmupService
+from tests.test_numpy_vector_db import _food
+
+
+class _FakeRecommendations:
+    """Records warmed segments instead of retrieving and calling the LLM."""
+    
+    def __init__(self):
+        foods = [_food("a", "牛肉面"), _food("b", "紫米粥", "南区食堂")]
+        self.rag_service = SimpleNamespace(
+            vector_db=SimpleNamespace(get_all_foods=lambda: foods),
+            retrieve_relevant_foods_batch=self.retrieve
+        )
+        self.warmed = []
+    
+    async def retrieve(self, requests, n_results=20):
+        return [[] for _ in requests]
+    
+    async def warm_segment(self, meal_type, preferences):
+        self.warmed.append((meal_type, preferences))
+
+
+@pytest.mark.asyncio
+async def test_warm_includes_top_preferences_and_skips_users_without_them(tmp_path, monkeypatch):
+    """Users created without preferences don't break the top-preferences segments."""
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    db = UserDatabase(f"sqlite+aiosqlite:///{tmp_path / 'users.db'}")
+    await db.init_db()
+    custom = UserPreferences(goal=FitnessGoal.GAIN_MUSCLE, dietary_restrictions=["素食"])
+    await db.create_user(User(user_id="new", username="新用户"))
+    await db.create_user(User(user_id="u1", username="u1", preferences=custom))
+    await db.create_user(User(user_id="u2", username="u2", preferences=custom))
+    
+    async def user_db():
+        return db
+    
+    recommendations = _FakeRecommendations()
+    monkeypatch.setattr(warmup, "get_user_db", user_db)
+    monkeypatch.setattr(warmup, "get_recommendation_service", lambda: recommendations)
+    try:
+        top = await db.get_top_preferences()
+        warmed = await WarmupService().warm("午餐")
+    finally:
+        await db.close()
+    
+    assert top == [custom]
+    # No-preference segment, goal x (all canteens + each canteen), plus the custom one
+    assert warmed == len(recommendations.warmed) == 1 + len(FitnessGoal) * 3 + 1
+    assert ("午餐", custom) in recommendations.warmed
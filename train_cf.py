@@ -0,0 +1,46 @@
+"""Script to train the collaborative filtering model from food history."""
+import asyncio
+import time
+from app.config import get_settings
+from app.database import get_user_db
+from app.services.collaborative import CFModel, build_rating_matrix, train_als
+
+
+async def train():
+    """Train ALS factors on all food history and save them for online scoring."""
+    settings = get_settings()
+    print("🧮 Training collaborative filtering model...")
+    
+    user_db = await get_user_db()
+    ratings = await user_db.get_ratings()
+    await user_db.close()
+    
+    preference, confidence, user_ids, item_ids = build_rating_matrix(ratings)
+    if not user_ids:
+        print("⚠️  No food history yet, nothing to train")
+        return
+    print(f"📦 {len(ratings)} history rows, {len(user_ids)} users x {len(item_ids)} foods")
+    
+    started = time.perf_counter()
+    user_factors, item_factors = train_als(
+        preference,
+        confidence,
+        factors=settings.cf_factors,
+        regularization=settings.cf_regularization,
+        alpha=settings.cf_alpha,
+        iterations=settings.cf_iterations
+    )
+    print(f"⏱️  Trained in {time.perf_counter() - started:.1f}s")
+    
+    CFModel(
+        user_ids=user_ids,
+        item_ids=item_ids,
+        user_factors=user_factors,
+        item_factors=item_factors,
+        trained_at=time.time()
+    ).save(settings.cf_model_path)
+    print(f"✅ Saved factors to {settings.cf_model_path}")
+
+
+if __name__ == "__main__":
+    asyncio.run(train())